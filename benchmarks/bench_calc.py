@@ -0,0 +1,396 @@
+"""
+Benchmarks for the PyCalc-Tk hot paths.
+
+Covers the evaluate pipeline stage by stage (rewrite, parenthesis balancing,
+compile, execute, format), the expression-building methods, the display
+updates, sampling and drawing a graph, vector/matrix operations, the
+numerical solvers and tables of values. The calculators run headless on the
+virtual widgets from calc_headless, so no display is needed.
+
+Each benchmark reports ops/sec and per-op latency percentiles. Results are
+written as JSON so runs from two commits can be compared directly.
+
+Usage:
+    python benchmarks/bench_calc.py                       # print JSON
+    python benchmarks/bench_calc.py -o bench_output.json
+    python benchmarks/bench_calc.py --compare old.json    # show the change per benchmark
+"""
+import argparse
+import gc
+import itertools
+import json
+import math
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calc_bignum import decimal_string  # noqa: E402
+from calc_engine import (CalcEngine, DEFAULT_NAMES, close_parentheses, format_result,  # noqa: E402
+                         load_numpy, prepare_expression)
+from calc_headless import VirtualWidget, create_calculator, use_virtual_widgets  # noqa: E402
+
+# A representative expression as typed on the keypad (note the open parenthesis)
+EXPRESSION = "12*(3+4.5)/sqrt(16)+π*2-log(100)+sin(π/6"
+# A long pasted/macro-generated entry for the full-string scans
+LONG_EXPRESSION = "(1+2)*" * 300 + "(3"
+# Ten x² / +/- presses on a function result, as the display builds them
+NESTED_SQUARE = "sin(π/7)"
+for _press in range(10):
+    NESTED_SQUARE = f"-({NESTED_SQUARE})" if _press % 3 == 2 else f"({NESTED_SQUARE})**2"
+# A macro repeating one piece, evaluated in 'x' (as when graphing it)
+REPEATED_MACRO = "+".join(["(sin(x)+cos(x)*2)**2"] * 50)
+
+# Target duration of a single timed sample
+SAMPLE_TIME = 0.002
+
+
+def _calibrate(func):
+    """Number of calls per sample so that one sample takes about SAMPLE_TIME."""
+    batch = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(batch):
+            func()
+        if time.perf_counter() - start >= SAMPLE_TIME or batch >= 1 << 20:
+            return batch
+        batch *= 2
+
+
+def _percentile(ordered, fraction):
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def measure(func, duration=0.3):
+    """Time 'func' repeatedly for about 'duration' seconds and summarize."""
+    func()  # warm caches and lazy setup
+    batch = _calibrate(func)
+    per_op = []
+    calls = 0
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline or len(per_op) < 5:
+            start = time.perf_counter_ns()
+            for _ in range(batch):
+                func()
+            per_op.append((time.perf_counter_ns() - start) / batch)
+            calls += batch
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    total_ns = sum(per_op) * batch
+    per_op.sort()
+    return {
+        "ops_per_sec": round(calls / (total_ns / 1e9), 1),
+        "p50_us": round(_percentile(per_op, 0.50) / 1000, 3),
+        "p90_us": round(_percentile(per_op, 0.90) / 1000, 3),
+        "p99_us": round(_percentile(per_op, 0.99) / 1000, 3),
+        "samples": len(per_op),
+        "batch": batch,
+    }
+
+
+# --- Benchmark Definitions ---
+
+def evaluate_benchmarks():
+    """The evaluate pipeline, one stage at a time, plus end-to-end variants."""
+    engine = CalcEngine()
+    uncached = CalcEngine(cache_size=0, result_cache_size=0)
+    source = prepare_expression(EXPRESSION)
+    compiled = engine.compile(source)
+    value = engine.call(compiled)
+    names = dict(DEFAULT_NAMES)
+    # Compiles every time, but keeps the memo of folded calls
+    recompiling = CalcEngine(cache_size=0, result_cache_size=0)
+    macro = engine.compile(REPEATED_MACRO, ("x",))
+
+    def eval_baseline():
+        # What evaluate() did before the engine: rewrite and eval() every time
+        eval(prepare_expression(EXPRESSION), {"__builtins__": {}}, names)
+
+    return {
+        "evaluate.rewrite": lambda: prepare_expression(EXPRESSION),
+        "evaluate.paren_balance": lambda: close_parentheses(EXPRESSION),
+        "evaluate.compile": lambda: uncached.compile(source),
+        "evaluate.execute": lambda: engine.call(compiled),
+        "evaluate.format": lambda: format_result(value),
+        "evaluate.full_uncached": lambda: engine.calculate(EXPRESSION, use_cache=False),
+        "evaluate.full_cached": lambda: engine.calculate(EXPRESSION),
+        "evaluate.eval_baseline": eval_baseline,
+        "evaluate.nested_square": lambda: recompiling.calculate(NESTED_SQUARE),
+        "evaluate.repeated_macro": lambda: macro(0.3),
+    }
+
+
+def ui_benchmarks(variant):
+    """Expression-building methods and display updates on a headless calculator."""
+    calculator, master = create_calculator(variant)
+    prefix = f"{variant}.ui."
+
+    def add_to_expression():
+        # Digits and '(' exercise the smart-multiplication checks
+        if len(calculator.current) > 500:
+            calculator.current.clear()
+        calculator.add_to_expression("7")
+        calculator.add_to_expression("(")
+
+    def handle_parentheses_long():
+        # Keystrokes at the end of a long entry: cost should not grow with its length
+        if len(calculator.current) > 2 * len(LONG_EXPRESSION):
+            calculator.current_expression = LONG_EXPRESSION
+        calculator.handle_parentheses()
+        calculator.add_to_expression("1")
+
+    def add_operator_long():
+        # Finishing entries onto a long total_expression
+        if len(calculator.total) > 2 * len(LONG_EXPRESSION):
+            calculator.total_expression = LONG_EXPRESSION
+        calculator.add_to_expression("2")
+        calculator.add_operator("+")
+
+    def backspace_long():
+        if len(calculator.current) < len(LONG_EXPRESSION) // 2:
+            calculator.current_expression = LONG_EXPRESSION
+        calculator.backspace()
+
+    def toggle_sign():
+        calculator.current_expression = "12*(3+4)"
+        calculator.toggle_sign()
+
+    # Display updates are measured with a long entry and total on screen
+    display, display_master = create_calculator(variant)
+    display.current_expression = LONG_EXPRESSION
+    display.total_expression = LONG_EXPRESSION
+
+    def update_label():
+        # Alternate the entry so every redraw really changes the label
+        display.current.append("1") if len(display.current) % 2 else display.current.pop()
+        display.update_label()
+        display.renderer.flush()
+
+    def update_total_label():
+        display.update_total_label()
+        display.renderer.flush()
+
+    def typing_burst():
+        # Auto-repeat / paste: 20 keystrokes arrive before the next frame
+        calculator.current.clear()
+        for _ in range(20):
+            calculator.add_to_expression("7")
+
+    def evaluate():
+        calculator.total_expression = ""
+        calculator.current_expression = EXPRESSION
+        calculator.evaluate()
+
+    benchmarks = {
+        prefix + "add_to_expression": add_to_expression,
+        prefix + "handle_parentheses_long": handle_parentheses_long,
+        prefix + "add_operator_long": add_operator_long,
+        prefix + "backspace_long": backspace_long,
+        prefix + "toggle_sign": toggle_sign,
+        prefix + "update_label": update_label,
+        prefix + "update_total_label": update_total_label,
+        prefix + "typing_burst": typing_burst,
+        prefix + "evaluate": evaluate,
+    }
+    return {name: _draining(func, calculator, master) for name, func in benchmarks.items()}
+
+
+def _draining(func, calculator, master):
+    def run():
+        func()
+        # Draw the frame the operation produced, then drop the preview timers
+        # so the virtual event queue does not grow
+        calculator.renderer.flush()
+        master._pending.clear()
+    return run
+
+
+def plot_benchmarks():
+    """Sampling and drawing a graph; empty when NumPy is missing."""
+    if load_numpy() is None:
+        return {}
+    from calc_plot import CurveSampler, PlotView
+
+    use_virtual_widgets()
+    engine = CalcEngine()
+    # A 100k-sample curve (8 tiles of 12,500) on a headless canvas
+    view = PlotView(VirtualWidget(), engine)
+    view.show("sin(x)*x")
+    view.sampler = CurveSampler(engine, "sin(x)*x", samples_per_tile=12500)
+    view.draw()
+
+    def pan_frame():
+        # One frame of a drag; a new tile scrolls in every few frames
+        view.pan(3, 0)
+        view.draw()
+
+    return {
+        "plot.sample_view_cold": lambda: CurveSampler(engine, "tan(x)").samples(-10, 10),
+        "plot.pan_frame_100k": pan_frame,
+    }
+
+
+def matrix_benchmarks():
+    """Vector and matrix expressions, on the pure-Python path and (if installed) NumPy."""
+    import calc_matrix
+    from array import array
+
+    engine = CalcEngine()
+    rows = ", ".join("[" + ", ".join(str((i * 7 + j * 3) % 11 + (i == j) * 20)
+                                     for j in range(24)) + "]" for i in range(24))
+    literal = engine.compile(f"[{rows}]")
+    matrix = engine.call(literal)
+    benchmarks = {
+        "matrix.literal_24x24": lambda: engine.call(literal),
+        "matrix.elementwise_24x24": lambda: matrix * 2 + matrix,
+        "matrix.matmul_24x24": lambda: matrix @ matrix,
+        "matrix.solve_24x24": lambda: calc_matrix.solve(matrix, matrix),
+        "matrix.det_24x24": lambda: calc_matrix.det(matrix),
+    }
+    if load_numpy() is not None:
+        big = calc_matrix.Matrix((96, 96), array("d", range(96 * 96)))
+        benchmarks["matrix.matmul_96x96_numpy"] = lambda: big @ big
+    return benchmarks
+
+
+def solver_benchmarks():
+    """Complete solves, uncached: each makes tens to thousands of calls of its function."""
+    engine = CalcEngine()
+    benchmarks = {}
+    for name, expression in (("root_bracket", "root(cos(x) - x, 0, 1)"),
+                             ("root_newton", "root(x**3 - 2*x - 5, 2)"),
+                             ("integrate_smooth", "integrate(math.exp(-x**2), 0, math.inf)"),
+                             ("integrate_singular", "integrate(1/sqrt(x), 0, 1)"),
+                             ("diff_complex_step", "diff(x**3 - 2*x, 1.5)"),
+                             ("diff_ridders", "diff(sin(x), 1.5)")):
+        benchmarks[f"solve.{name}"] = (
+            lambda expression=expression: engine.calculate(expression, use_cache=False))
+    return benchmarks
+
+
+def symbol_benchmarks():
+    """A long formula typed out vs called as a user function, for a new argument each time."""
+    engine = CalcEngine()
+    formula = "sqrt({x}**2 + 1) * sin({x}) / (1 + math.exp(-{x})) + log({x}**2 + 1) * cos({x})**2"
+    engine.symbols.define("f(x) = " + formula.format(x="x"))
+    engine.symbols.define("k = 2")
+    engine.symbols.define("g(x) = f(x) + k*x")
+    counter = itertools.count(1)
+    return {
+        "symbols.retyped_formula": lambda: engine.calculate(formula.format(x=next(counter))),
+        "symbols.user_function": lambda: engine.calculate(f"f({next(counter)})"),
+        # One dependent function recompiled, the rest of the caches kept
+        "symbols.redefine_variable": lambda: engine.symbols.define(f"k = {next(counter)}"),
+    }
+
+
+def bignum_benchmarks():
+    """Showing a million-digit result, and writing it out in full for a copy."""
+    value = 2 ** 3321928  # 1,000,000 digits
+    backend = CalcEngine().backend
+    return {
+        "bignum.format_1M_digits": lambda: backend.format(value),
+        "bignum.full_1M_digits": lambda: decimal_string(value),
+    }
+
+
+def table_benchmarks():
+    """Scrolling a 100-million-row table, and streaming a table to a file."""
+    import io
+    from calc_table import Table, TableView, write_binary, write_csv
+
+    use_virtual_widgets()
+    engine = CalcEngine()
+    view = TableView(VirtualWidget(), engine)
+    view.show("sin(x)*x")
+    view.set_range(0, 1e8, 1)
+    positions = itertools.cycle(range(0, 10 ** 8, 7919 * 1013))
+    chunk = Table(engine, "sin(x)*x", 0, 65535, 1)
+
+    def jump():
+        view.offset = next(positions)
+        view.draw()
+
+    return {
+        "table.scroll_100M_rows": jump,
+        "table.csv_64k_rows": lambda: write_csv(chunk, io.StringIO()),
+        "table.binary_64k_rows": lambda: write_binary(chunk, io.BytesIO()),
+    }
+
+
+def run_all(duration, selected=None):
+    benchmarks = evaluate_benchmarks()
+    for variant in ("v1", "v2"):
+        benchmarks.update(ui_benchmarks(variant))
+    benchmarks.update(plot_benchmarks())
+    benchmarks.update(matrix_benchmarks())
+    benchmarks.update(solver_benchmarks())
+    benchmarks.update(symbol_benchmarks())
+    benchmarks.update(bignum_benchmarks())
+    benchmarks.update(table_benchmarks())
+
+    results = {}
+    for name, func in benchmarks.items():
+        if selected and not any(part in name for part in selected):
+            continue
+        results[name] = measure(func, duration)
+        print(f"{name:40s} {results[name]['ops_per_sec']:>14,.0f} ops/s", file=sys.stderr)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "duration_per_benchmark": duration,
+        },
+        "benchmarks": results,
+    }
+
+
+def compare(old, new):
+    """Print the ops/sec change for every benchmark present in both reports."""
+    print(f"{'benchmark':40s} {'old ops/s':>14s} {'new ops/s':>14s} {'change':>9s}")
+    for name, result in new["benchmarks"].items():
+        before = old["benchmarks"].get(name)
+        if before is None:
+            continue
+        change = result["ops_per_sec"] / before["ops_per_sec"] - 1
+        print(f"{name:40s} {before['ops_per_sec']:>14,.0f} {result['ops_per_sec']:>14,.0f} "
+              f"{change:>+8.1%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark PyCalc-Tk hot paths.")
+    parser.add_argument("-o", "--output", help="write the JSON report to this file")
+    parser.add_argument("--compare", metavar="OLD_JSON",
+                        help="compare against an earlier report")
+    parser.add_argument("--duration", type=float, default=0.3,
+                        help="seconds per benchmark (default %(default)s)")
+    parser.add_argument("-k", dest="selected", action="append",
+                        help="only run benchmarks whose name contains this (repeatable)")
+    args = parser.parse_args(argv)
+
+    report = run_all(args.duration, args.selected)
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(text + "\n")
+    elif not args.compare:
+        print(text)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as handle:
+            compare(json.load(handle), report)
+    return 0
+
+
+# --- Main Execution ---
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""
+Cold-start report for PyCalc-Tk.
+
+Every sample is a fresh interpreter, so nothing is already imported or
+cached in memory. Measured for each calculator:
+
+- import: importing the calculator script (engine, history, preview, ...)
+- headless: building a ScientificCalculator on the virtual widgets
+- process: wall time of the whole subprocess, interpreter start included
+
+With a display (or --gui), the real window is also started with
+PYCALC_STARTUP set. That run reports its own stages, from the script's first
+line to the first frame on screen: imports, tk (creating the Tk root),
+widgets and first_frame.
+
+Usage:
+    python benchmarks/bench_startup.py                 # print JSON
+    python benchmarks/bench_startup.py -n 20 -o startup.json
+    python benchmarks/bench_startup.py --gui           # also time the real window
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from calc_headless import CALCULATOR_FILES  # noqa: E402
+from calc_ui import STARTUP_ENV, STARTUP_EXIT_ENV  # noqa: E402
+
+# Run in the child: time the import and the headless build, print them as JSON
+_HEADLESS_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import calc_headless
+module = calc_headless.load_calculator({variant!r})
+imported = time.perf_counter()
+calc_headless.create_calculator({variant!r})
+built = time.perf_counter()
+print(json.dumps({{"import": imported - start, "headless": built - imported,
+                  "tkinter": "_tkinter" in sys.modules, "numpy": "numpy" in sys.modules}}))
+"""
+
+
+def _median_ms(samples):
+    return round(statistics.median(samples) * 1000, 3)
+
+
+def _environment():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    env["PYCALC_HISTORY"] = ":memory:"
+    env.pop("PYCALC_SESSION", None)
+    return env
+
+
+def time_headless(variant, repeat):
+    """Median import / build / process times over 'repeat' fresh interpreters."""
+    env = _environment()
+    timings = {"import": [], "headless": [], "process": []}
+    loaded = {}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", _HEADLESS_PROBE.format(variant=variant)],
+                                env=env, cwd=ROOT, check=True, capture_output=True,
+                                text=True).stdout
+        timings["process"].append(time.perf_counter() - start)
+        sample = json.loads(output.splitlines()[-1])
+        timings["import"].append(sample["import"])
+        timings["headless"].append(sample["headless"])
+        loaded = {"tkinter_loaded": sample["tkinter"], "numpy_loaded": sample["numpy"]}
+    result = {f"{name}_ms": _median_ms(samples) for name, samples in timings.items()}
+    result.update(loaded)
+    return result
+
+
+def time_gui(variant, repeat):
+    """Median of the calculator's own startup report (needs a display)."""
+    env = _environment()
+    env[STARTUP_EXIT_ENV] = "1"
+    reports = []
+    with tempfile.TemporaryDirectory() as folder:
+        env[STARTUP_ENV] = path = os.path.join(folder, "startup.jsonl")
+        for _ in range(repeat):
+            subprocess.run([sys.executable, CALCULATOR_FILES[variant]], env=env, cwd=ROOT,
+                           check=True, timeout=60)
+        with open(path, encoding="utf-8") as handle:
+            reports = [json.loads(line) for line in handle]
+    stages = {stage: _median_ms([report["stages_ms"][stage] / 1000 for report in reports])
+              for stage in reports[0]["stages_ms"]}
+    return {"stages_ms": stages,
+            "total_ms": _median_ms([report["total_ms"] / 1000 for report in reports])}
+
+
+def run_all(repeat, gui):
+    results = {}
+    for variant in sorted(CALCULATOR_FILES):
+        results[f"headless_{variant}"] = time_headless(variant, repeat)
+        if gui:
+            results[f"gui_{variant}"] = time_gui(variant, repeat)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure PyCalc-Tk cold-start time.")
+    parser.add_argument("-n", "--repeat", type=int, default=10,
+                        help="fresh interpreters per measurement (default %(default)s)")
+    parser.add_argument("--gui", action="store_true", default=None,
+                        help="also start the real window (default: when $DISPLAY is set)")
+    parser.add_argument("-o", "--output", help="write the JSON report to this file")
+    args = parser.parse_args(argv)
+    gui = args.gui if args.gui is not None else bool(os.environ.get("DISPLAY"))
+
+    report = run_all(args.repeat, gui)
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+# --- Main Execution ---
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""
+Load test for calc_server.
+
+Opens several connections, keeps up to --pipeline requests in flight on each,
+and measures the time from sending each request to reading its reply.
+Reports throughput and p50/p90/p99/max latency as JSON, like bench_calc.py.
+
+Without --port or --unix an in-process server is started on a free port.
+
+Usage:
+    python benchmarks/load_calc_server.py                          # in-process server
+    python benchmarks/load_calc_server.py --port 8765 -c 16 -n 5000
+    python benchmarks/load_calc_server.py --unix /tmp/pycalc.sock --json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calc_server import LOCALHOST, CalcServer  # noqa: E402
+
+
+def make_expressions(count, seed=1):
+    """A reproducible mix of calculator expressions."""
+    rng = random.Random(seed)
+    templates = ("{a}+{b}*{c}", "sqrt({a})*{b}-{c}/7", "sin({a}/{b})+cos({c})",
+                 "({a}+{b})**2/{c}", "log({a}*{b})+π*{c}", "math.factorial({s})/{b}")
+    return [rng.choice(templates).format(a=rng.randint(1, 9999), b=rng.randint(1, 999),
+                                         c=rng.randint(1, 99), s=rng.randint(1, 60))
+            for _ in range(count)]
+
+
+def _percentile(ordered, fraction):
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def _connect(args):
+    if args.unix:
+        return await asyncio.open_unix_connection(args.unix)
+    return await asyncio.open_connection(LOCALHOST, args.port)
+
+
+async def _run_connection(args, expressions, latencies):
+    """Send args.requests requests with at most args.pipeline outstanding."""
+    reader, writer = await _connect(args)
+    window = asyncio.Semaphore(args.pipeline)
+    sent = deque()  # send times of outstanding requests; replies come back in order
+
+    async def send():
+        for number in range(args.requests):
+            await window.acquire()
+            expression = expressions[number % len(expressions)]
+            if args.json:
+                line = json.dumps({"id": number, "expr": expression})
+            else:
+                line = expression
+            sent.append(time.perf_counter())
+            writer.write(line.encode("utf-8") + b"\n")
+            await writer.drain()
+        writer.write_eof()
+
+    sender = asyncio.create_task(send())
+    for _ in range(args.requests):
+        if not await reader.readline():
+            raise ConnectionError("server closed the connection early")
+        latencies.append(time.perf_counter() - sent.popleft())
+        window.release()
+    await sender
+    writer.close()
+    await writer.wait_closed()
+
+
+async def run_load(args):
+    server = None
+    if not args.port and not args.unix:
+        server = CalcServer(workers=args.workers)
+        args.port = await server.start_tcp(0)
+    try:
+        rng = random.Random(2)
+        latencies = []
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            _run_connection(args, rng.sample(args.expressions, len(args.expressions)), latencies)
+            for _ in range(args.connections)))
+        elapsed = time.perf_counter() - start
+    finally:
+        if server is not None:
+            await server.close()
+
+    latencies.sort()
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "connections": args.connections,
+            "requests_per_connection": args.requests,
+            "pipeline": args.pipeline,
+            "distinct_expressions": len(args.expressions),
+            "protocol": "json" if args.json else "line",
+            "server": "in-process" if server is not None else (args.unix or f"port {args.port}"),
+        },
+        "results": {
+            "requests": len(latencies),
+            "seconds": round(elapsed, 3),
+            "requests_per_sec": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(_percentile(latencies, 0.50) * 1000, 3),
+            "p90_ms": round(_percentile(latencies, 0.90) * 1000, 3),
+            "p99_ms": round(_percentile(latencies, 0.99) * 1000, 3),
+            "max_ms": round(latencies[-1] * 1000, 3),
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test a calc_server instance.")
+    parser.add_argument("--port", type=int, help="server port on 127.0.0.1")
+    parser.add_argument("--unix", metavar="PATH", help="server Unix socket")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="worker processes for the in-process server")
+    parser.add_argument("-c", "--connections", type=int, default=8,
+                        help="concurrent connections (default %(default)s)")
+    parser.add_argument("-n", "--requests", type=int, default=2000,
+                        help="requests per connection (default %(default)s)")
+    parser.add_argument("-p", "--pipeline", type=int, default=16,
+                        help="requests in flight per connection (default %(default)s)")
+    parser.add_argument("--distinct", type=int, default=5000,
+                        help="distinct expressions; fewer means more cache hits "
+                             "(default %(default)s)")
+    parser.add_argument("--json", action="store_true", help="use the JSON protocol")
+    parser.add_argument("-o", "--output", help="write the JSON report to this file")
+    args = parser.parse_args(argv)
+    args.expressions = make_expressions(args.distinct)
+
+    report = asyncio.run(run_load(args))
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
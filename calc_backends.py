@@ -0,0 +1,294 @@
+"""
+Numeric backends for PyCalc-Tk.
+
+The expression grammar is the same for every backend; a backend decides what
+the numbers are. It supplies:
+
+- how numeric literals are converted,
+- how float results from the math, matrix and solver functions are taken in,
+- the values of the function names (sqrt, sin, ...),
+- how long '+'/'-' and '*'/'/' chains are reduced,
+- and how results are formatted.
+
+FloatBackend is the fast default and matches the original eval() behaviour.
+DecimalBackend computes with decimal.Decimal at a configurable precision, and
+FractionBackend keeps +, -, *, / and integer powers exact with
+fractions.Fraction. Values are passed between steps as numbers and never
+converted through strings.
+
+Exact results too large to show in full (2**1000000) are formatted in
+scientific notation from an approximation, never converted to decimal in
+full (see calc_bignum).
+"""
+import decimal
+import math
+import operator
+from contextlib import nullcontext
+from decimal import Decimal
+from fractions import Fraction
+
+from calc_bignum import Abbreviated, is_huge
+
+# Default significant digits for DecimalBackend
+DEFAULT_PRECISION = 50
+
+# Largest Fraction part (in bits) sqrt() tries to take an exact root of; the
+# integer square root is quadratic, and a single C call the budget can't stop
+EXACT_ROOT_BITS = 1 << 16
+
+_OPERATORS = {"+": operator.add, "-": operator.sub, "*": operator.mul, "/": operator.truediv}
+
+
+def fold(ops, terms):
+    """Apply 'ops' left to right: fold('+-', (a, b, c)) == a + b - c."""
+    total = terms[0]
+    for op, term in zip(ops, terms[1:]):
+        total = _OPERATORS[op](total, term)
+    return total
+
+
+def plain_number(value):
+    """A backend number as an int when it is integral, else as a float; other values unchanged.
+
+    Used for the arguments of functions that compute in float (math.factorial
+    and math.gcd only take ints).
+    """
+    if isinstance(value, Fraction):
+        return value.numerator if value.denominator == 1 else float(value)
+    if isinstance(value, Decimal):
+        if value.is_finite() and value == value.to_integral_value():
+            return int(value)
+        return float(value)
+    return value
+
+
+def _pairwise(values, combine):
+    """Reduce with a balanced tree so operand sizes grow evenly."""
+    values = list(values)
+    while len(values) > 1:
+        paired = [combine(values[i], values[i + 1]) for i in range(0, len(values) - 1, 2)]
+        if len(values) % 2:
+            paired.append(values[-1])
+        values = paired
+    return values[0]
+
+
+class FloatBackend:
+    """Python floats and ints; the calculator's original arithmetic."""
+
+    name = "float"
+    converts_literals = False
+
+    def functions(self):
+        """Overrides for the whitelisted names (none: the math module is used)."""
+        return {}
+
+    def literal(self, text):
+        """The number a literal's source text stands for, as Python reads it."""
+        return int(text) if text.isdigit() else float(text)
+
+    def from_float(self, value):
+        """A float result of a math, matrix or solver function, as this backend's number."""
+        return value
+
+    def context(self):
+        return nullcontext()
+
+    def sum(self, ops, terms):
+        return fold(ops, terms)
+
+    def product(self, ops, terms):
+        return fold(ops, terms)
+
+    def format(self, result):
+        """Format a numeric result the way the display shows it."""
+        if is_huge(result):
+            return Abbreviated(result)
+        if isinstance(result, (int, float)):
+            if abs(result) < 1e15:  # Avoid sci-notation for large integers
+                if result == int(result):
+                    result = int(result)
+                else:
+                    # Round to 10 decimal places for clean display
+                    result = round(result, 10)
+        return str(result)
+
+
+class DecimalBackend(FloatBackend):
+    """decimal.Decimal arithmetic at a fixed number of significant digits."""
+
+    name = "decimal"
+    converts_literals = True
+
+    def __init__(self, precision=DEFAULT_PRECISION):
+        self.precision = precision
+        self._context = decimal.Context(prec=precision, traps=[
+            decimal.InvalidOperation, decimal.DivisionByZero, decimal.Overflow])
+        with decimal.localcontext(self._context):
+            self.pi = self._compute_pi()
+            self.e = Decimal(1).exp()
+
+    def functions(self):
+        return {
+            "sqrt": lambda x: Decimal(x).sqrt(),
+            "log10": lambda x: Decimal(x).log10(),
+            "pi": self.pi,
+            "e": self.e,
+            "sin": self._sin,
+            "cos": self._cos,
+            "tan": lambda x: self._sin(x) / self._cos(x),
+        }
+
+    def literal(self, text):
+        return Decimal(text)
+
+    def from_float(self, value):
+        # Read from the float's repr: Decimal(0.1) would keep the binary error digits
+        if isinstance(value, float):
+            return Decimal(repr(value))
+        return value
+
+    def context(self):
+        return decimal.localcontext(self._context)
+
+    def format(self, result):
+        if not isinstance(result, Decimal):
+            return super().format(result)
+        if not result.is_finite():
+            return str(result)
+        result = result.normalize(self._context)
+        if -self.precision < result.adjusted() < self.precision:
+            # Plain digits (no exponent) while they fit in the precision
+            return format(result, "f")
+        return str(result)
+
+    # --- Series (evaluated with guard digits, then rounded to the context) ---
+
+    def _compute_pi(self):
+        """Pi to the current precision (recipe from the decimal docs)."""
+        ctx = decimal.getcontext()
+        ctx.prec += 2
+        three = Decimal(3)
+        lasts, t, s, n, na, d, da = 0, three, 3, 1, 0, 0, 24
+        while s != lasts:
+            lasts = s
+            n, na = n + na, na + 8
+            d, da = d + da, da + 32
+            t = (t * n) / d
+            s += t
+        ctx.prec -= 2
+        return +s
+
+    def _sin(self, x):
+        x = Decimal(x)
+        with decimal.localcontext() as ctx:
+            ctx.prec += 2
+            x = x.remainder_near(2 * self.pi)
+            i, lasts, s, fact, num, sign = 1, 0, x, 1, x, 1
+            while s != lasts:
+                lasts = s
+                i += 2
+                fact *= i * (i - 1)
+                num *= x * x
+                sign *= -1
+                s += num / fact * sign
+        return +s
+
+    def _cos(self, x):
+        x = Decimal(x)
+        with decimal.localcontext() as ctx:
+            ctx.prec += 2
+            x = x.remainder_near(2 * self.pi)
+            i, lasts, s, fact, num, sign = 0, 0, 1, 1, 1, 1
+            while s != lasts:
+                lasts = s
+                i += 2
+                fact *= i * (i - 1)
+                num *= x * x
+                sign *= -1
+                s += num / fact * sign
+        return +s
+
+
+class FractionBackend(FloatBackend):
+    """Exact rational arithmetic with fractions.Fraction.
+
+    +, -, *, / and integer powers stay exact. sqrt is exact for perfect
+    squares; other irrational functions and constants, and the solvers'
+    approximations, stay floats (a Fraction read from 2.8284271247461903
+    would only look exact).
+    """
+
+    name = "fraction"
+    converts_literals = True
+
+    def functions(self):
+        return {"sqrt": self._sqrt}
+
+    def literal(self, text):
+        return Fraction(text)
+
+    def sum(self, ops, terms):
+        if not all(isinstance(term, (int, Fraction)) for term in terms):
+            return fold(ops, terms)
+        # Add numerators that share a denominator as plain ints, then combine
+        # the few distinct denominators pairwise
+        by_denominator = {}
+        for op, term in zip("+" + ops, terms):
+            term = Fraction(term)
+            numerator = term.numerator if op == "+" else -term.numerator
+            by_denominator[term.denominator] = by_denominator.get(term.denominator, 0) + numerator
+        return _pairwise((Fraction(n, d) for d, n in by_denominator.items()), operator.add)
+
+    def product(self, ops, terms):
+        if not all(isinstance(term, (int, Fraction)) for term in terms):
+            return fold(ops, terms)
+        # One big numerator over one big denominator, each built as a balanced tree
+        numerators, denominators = [], []
+        for op, term in zip("*" + ops, terms):
+            term = Fraction(term)
+            if op == "*":
+                numerators.append(term.numerator)
+                denominators.append(term.denominator)
+            else:
+                if term == 0:
+                    raise ZeroDivisionError("division by zero")
+                numerators.append(term.denominator)
+                denominators.append(term.numerator)
+        return Fraction(_pairwise(numerators, operator.mul), _pairwise(denominators, operator.mul))
+
+    def format(self, result):
+        if isinstance(result, Fraction):
+            if is_huge(result):
+                return Abbreviated(result)
+            if result.denominator == 1:
+                return str(result.numerator)
+            return f"{result.numerator}/{result.denominator}"
+        return super().format(result)
+
+    @staticmethod
+    def _sqrt(x):
+        x = Fraction(x)
+        if x >= 0 and max(x.numerator.bit_length(), x.denominator.bit_length()) <= EXACT_ROOT_BITS:
+            root_n, root_d = math.isqrt(x.numerator), math.isqrt(x.denominator)
+            if root_n * root_n == x.numerator and root_d * root_d == x.denominator:
+                return Fraction(root_n, root_d)
+        return math.sqrt(x)
+
+
+BACKENDS = {
+    "float": FloatBackend,
+    "decimal": DecimalBackend,
+    "fraction": FractionBackend,
+}
+
+
+def make_backend(name="float", precision=DEFAULT_PRECISION):
+    """Create a backend by name ('float', 'decimal' or 'fraction')."""
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"unknown backend: {name!r}") from None
+    if backend_class is DecimalBackend:
+        return backend_class(precision)
+    return backend_class()
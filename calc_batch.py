@@ -0,0 +1,224 @@
+"""
+Headless batch evaluation for PyCalc-Tk.
+
+Reads expressions one per line from a file or stdin and writes one result per
+line, using exactly the same rules as the calculator's '=' button. Blank input
+lines give blank output lines, so results line up with their input. Input is
+streamed, so memory use stays constant regardless of file size. Never imports
+tkinter.
+
+Large batches can be spread over several processes with ParallelEvaluator,
+which sends chunks of lines to a reusable process pool and returns results in
+input order. Other pools (calc_server's) can run the same workers with
+init_worker() and evaluate_chunk().
+
+Usage:
+    python calc_batch.py expressions.txt -o results.txt
+    cat expressions.txt | python calc_batch.py
+    python calc_batch.py big.txt -o results.txt --workers 32 --chunk-size 5000
+"""
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from calc_backends import BACKENDS, DEFAULT_PRECISION, make_backend
+from calc_budget import BUDGET_ERROR_TEXT, BudgetExceeded
+from calc_engine import CalcEngine
+
+# Printed in place of a result when an expression cannot be evaluated
+ERROR_TEXT = "Error"
+
+# Expressions sent to a worker process in one task
+DEFAULT_CHUNK_SIZE = 2000
+
+# Engine used by each worker process (created once per process)
+_worker_engine = None
+
+
+def evaluate_line(engine, line):
+    """Evaluate one input line and return the display string ('Error' on failure, '' if blank)."""
+    expression = line.strip()
+    if not expression:
+        return ""
+    try:
+        return engine.calculate(expression)
+    except BudgetExceeded:
+        return BUDGET_ERROR_TEXT
+    except Exception:
+        return ERROR_TEXT
+
+
+def iter_results(lines, engine=None):
+    """Yield (expression, result) pairs for every line, lazily (blank lines give ('', ''))."""
+    engine = engine or CalcEngine()
+    for line in lines:
+        expression = line.strip()
+        yield expression, evaluate_line(engine, expression)
+
+
+# --- Parallel Evaluation ---
+
+def init_worker(backend, precision):
+    """Give each worker process its own engine and compile cache.
+
+    Used as the pool initializer here and by calc_server.
+    """
+    global _worker_engine
+    _worker_engine = CalcEngine(backend=make_backend(backend, precision))
+
+
+def evaluate_chunk(expressions):
+    """Evaluate a list of expressions inside a worker set up by init_worker()."""
+    engine = _worker_engine
+    return [evaluate_line(engine, expression) for expression in expressions]
+
+
+def _chunked(lines, size):
+    """Yield lists of up to 'size' stripped lines."""
+    expressions = (line.strip() for line in lines)
+    while True:
+        chunk = list(islice(expressions, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ParallelEvaluator:
+    """Evaluates large batches on a reusable process pool, preserving input order."""
+
+    def __init__(self, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, max_pending=None,
+                 backend="float", precision=DEFAULT_PRECISION):
+        if workers is not None and workers < 1:
+            raise ValueError("workers must be at least 1")
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.backend = backend
+        self.precision = precision
+        # Bound the chunks in flight so streaming input stays in constant memory
+        self.max_pending = max_pending or self.workers * 2
+        self._executor = None
+
+    def _pool(self):
+        """Start the worker pool on first use and keep it for later batches."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 initializer=init_worker,
+                                                 initargs=(self.backend, self.precision))
+        return self._executor
+
+    def iter_results(self, lines):
+        """Yield (expression, result) pairs in input order, like iter_results()."""
+        pool = self._pool()
+        pending = deque()
+        for chunk in _chunked(lines, self.chunk_size):
+            pending.append((chunk, pool.submit(evaluate_chunk, chunk)))
+            if len(pending) >= self.max_pending:
+                chunk, future = pending.popleft()
+                yield from zip(chunk, future.result())
+        while pending:
+            chunk, future = pending.popleft()
+            yield from zip(chunk, future.result())
+
+    def map(self, expressions):
+        """Yield the result for each expression, in order."""
+        for _, result in self.iter_results(expressions):
+            yield result
+
+    def evaluate(self, expressions):
+        """Evaluate a sequence of expressions and return the list of results."""
+        return list(self.map(expressions))
+
+    def close(self):
+        """Shut down the worker pool."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def run_batch(infile, outfile, echo=False, engine=None, evaluator=None):
+    """Stream expressions from 'infile' to 'outfile'. Returns (lines, seconds).
+
+    Pass a ParallelEvaluator as 'evaluator' to spread the work over processes.
+    """
+    count = 0
+    start = time.perf_counter()
+    write = outfile.write
+    results = evaluator.iter_results(infile) if evaluator else iter_results(infile, engine)
+    for expression, result in results:
+        if echo and expression:
+            write(f"{expression}\t{result}\n")
+        else:
+            write(result + "\n")
+        count += 1
+    return count, time.perf_counter() - start
+
+
+def _build_parser():
+    parser = argparse.ArgumentParser(description="Evaluate calculator expressions in bulk.")
+    parser.add_argument("input", nargs="?", default="-",
+                        help="file with one expression per line ('-' for stdin)")
+    parser.add_argument("-o", "--output", default="-",
+                        help="file to write results to ('-' for stdout)")
+    parser.add_argument("--echo", action="store_true",
+                        help="write 'expression<TAB>result' instead of the result only")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="worker processes to use (0 = one per CPU, default 1)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="expressions per worker task (default %(default)s)")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="float",
+                        help="numeric backend (default %(default)s)")
+    parser.add_argument("--precision", type=int, default=DEFAULT_PRECISION,
+                        help="significant digits for the decimal backend (default %(default)s)")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="do not report throughput on stderr")
+    return parser
+
+
+def main(argv=None):
+    parser = _build_parser()
+    args = parser.parse_args(argv)
+    if args.workers < 0:
+        parser.error("--workers must be 0 (one per CPU) or more")
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+
+    infile = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    outfile = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    engine = evaluator = None
+    if args.workers != 1:
+        evaluator = ParallelEvaluator(args.workers or None, chunk_size=args.chunk_size,
+                                      backend=args.backend, precision=args.precision)
+    else:
+        engine = CalcEngine(backend=make_backend(args.backend, args.precision))
+    try:
+        count, elapsed = run_batch(infile, outfile, echo=args.echo, engine=engine,
+                                   evaluator=evaluator)
+    finally:
+        if evaluator is not None:
+            evaluator.close()
+        if infile is not sys.stdin:
+            infile.close()
+        if outfile is not sys.stdout:
+            outfile.close()
+
+    if not args.quiet:
+        rate = count / elapsed if elapsed > 0 else float("inf")
+        print(f"{count} lines in {elapsed:.3f}s ({rate:,.0f} lines/sec)", file=sys.stderr)
+    return 0
+
+
+# --- Main Execution ---
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+"""
+Display of huge exact results for PyCalc-Tk.
+
+str() of an int takes time quadratic in its number of digits, and since
+Python 3.11 it refuses ints of more than 4300 digits
+(sys.get_int_max_str_digits()). The display shows about 20 characters
+either way. So an int result larger than EXACT_BITS, or a Fraction with
+such a numerator or denominator, is shown in scientific notation,
+'9.900656229e+301029' for 2**1000000. Getting there costs microseconds at
+any size:
+
+- approximate() takes the top 128 bits of the number and multiplies them
+  by the matching power of two in 40-digit Decimal arithmetic. The power is
+  computed by repeated squaring, so the result keeps about 35 correct
+  digits. Its exponent is the decimal exponent of the number, and its
+  first digits are the leading digits.
+- digit_count() and leading_digits() use the same approximation. They
+  fall back to exact integer arithmetic only when the answer depends on
+  digits beyond the approximation, which means the number is within 1e-30
+  of a power of ten or of a digit boundary.
+
+The display text is an Abbreviated string. It acts as plain text
+everywhere, and its full() method gives every digit on demand. The
+calculators call it when a result is copied. decimal_string() converts by
+divide and conquer: the number is split in halves with bit shifts, the
+halves are converted recursively, and the results are joined by Decimal
+multiplication with cached powers of two. libmpdec multiplies large
+numbers with a number-theoretic transform, so the conversion is
+subquadratic where str() is quadratic.
+"""
+import decimal
+from decimal import Decimal
+from fractions import Fraction
+
+# Ints up to this size are shown in full: str() takes microseconds below it
+EXACT_BITS = 3000
+
+# Characters an abbreviated result may take (the v2 display shows 20)
+SUMMARY_WIDTH = 20
+
+# Significant digits shown when the exponent leaves room for them
+SIGNIFICANT_DIGITS = 10
+
+# Bits of the number kept by approximate()
+_TOP_BITS = 128
+
+# Pieces this small are converted by Decimal(int) directly
+_SPLIT_BITS = 3000
+
+# Distance from a digit boundary within which the approximation can't decide
+_TOLERANCE = Decimal("1e-30")
+
+_APPROXIMATE = decimal.Context(prec=40, Emax=decimal.MAX_EMAX, Emin=decimal.MIN_EMIN)
+_EXACT = decimal.Context(prec=decimal.MAX_PREC, Emax=decimal.MAX_EMAX, Emin=decimal.MIN_EMIN,
+                         traps=[decimal.Inexact])
+
+
+def is_huge(value):
+    """Whether 'value' is an exact number too large to show in full."""
+    if isinstance(value, int):
+        return value.bit_length() > EXACT_BITS
+    if isinstance(value, Fraction):
+        return max(value.numerator.bit_length(), value.denominator.bit_length()) > EXACT_BITS
+    return False
+
+
+def approximate(n):
+    """|n| (an int) as a Decimal with about 35 correct significant digits."""
+    n = abs(n)
+    shift = max(0, n.bit_length() - _TOP_BITS)
+    return _APPROXIMATE.multiply(Decimal(n >> shift), _APPROXIMATE.power(2, shift))
+
+
+def _approximate_value(value):
+    if isinstance(value, Fraction):
+        return _APPROXIMATE.divide(approximate(value.numerator), approximate(value.denominator))
+    return approximate(value)
+
+
+def scientific(value, width=SUMMARY_WIDTH):
+    """An int or Fraction in scientific notation, in at most about 'width' characters."""
+    if not value:
+        return "0"
+    approx = _approximate_value(value)
+    sign = "-" if value < 0 else ""
+    exponent_text = f"e{approx.adjusted():+d}"
+    digits = max(1, min(SIGNIFICANT_DIGITS, width - len(sign) - len(exponent_text) - 1))
+    rounded = _APPROXIMATE.copy()
+    rounded.prec = digits
+    rounded = rounded.plus(approx)
+    exponent = rounded.adjusted()
+    mantissa = format(rounded.scaleb(-exponent), "f")
+    if "." in mantissa:
+        mantissa = mantissa.rstrip("0").rstrip(".")
+    return f"{sign}{mantissa}e{exponent:+d}"
+
+
+def digit_count(n):
+    """Number of decimal digits of the int 'n' (its sign not counted)."""
+    n = abs(n)
+    if n.bit_length() <= EXACT_BITS:
+        return len(str(n))
+    approx = approximate(n)
+    exponent = approx.adjusted()
+    mantissa = approx.scaleb(-exponent)
+    if mantissa - 1 < _TOLERANCE:
+        boundary = exponent
+    elif 10 - mantissa < _TOLERANCE:
+        boundary = exponent + 1
+    else:
+        return exponent + 1
+    # Too close to a power of ten to tell from the approximation
+    return boundary + 1 if n >= 10 ** boundary else boundary
+
+
+def leading_digits(n, count=SIGNIFICANT_DIGITS):
+    """The first 'count' decimal digits of the int 'n', exactly (not rounded)."""
+    n = abs(n)
+    if n.bit_length() <= EXACT_BITS:
+        return str(n)[:count]
+    digits = digit_count(n)
+    scaled = _APPROXIMATE.scaleb(approximate(n), count - digits)
+    head = int(scaled)
+    fraction = scaled - head
+    if _TOLERANCE * 10 ** count < fraction < 1 - _TOLERANCE * 10 ** count:
+        return str(head)
+    # The next digits are all 0s or 9s as far as the approximation goes
+    return str(n // 10 ** (digits - count))
+
+
+def decimal_string(n):
+    """Every digit of the int 'n', converted by divide and conquer."""
+    if n.bit_length() <= EXACT_BITS:
+        return str(n)
+    powers = {}
+
+    def convert(value, width):
+        if width <= _SPLIT_BITS:
+            return Decimal(value)
+        half = width >> 1
+        power = powers.get(half)
+        if power is None:
+            power = powers[half] = _EXACT.power(2, half)
+        return _EXACT.add(_EXACT.multiply(convert(value >> half, width - half), power),
+                          convert(value & ((1 << half) - 1), half))
+
+    sign = "-" if n < 0 else ""
+    n = abs(n)
+    return sign + format(convert(n, n.bit_length()), "f")
+
+
+def full_text(value):
+    """An int or Fraction written out in full, as the backends would show it."""
+    if isinstance(value, Fraction) and value.denominator != 1:
+        return f"{decimal_string(value.numerator)}/{decimal_string(value.denominator)}"
+    return decimal_string(int(value))
+
+
+class Abbreviated(str):
+    """Display text for a number too long to show; full() gives every digit."""
+
+    def __new__(cls, value, width=SUMMARY_WIDTH):
+        text = super().__new__(cls, scientific(value, width))
+        text.value = value
+        text._full = None
+        return text
+
+    def resized(self, width):
+        """The same number abbreviated to at most about 'width' characters."""
+        text = Abbreviated(self.value, width)
+        text._full = self._full
+        return text
+
+    def full(self):
+        """The number written out in full, computed on the first call."""
+        if self._full is None:
+            self._full = full_text(self.value)
+        return self._full
+
+    def __reduce__(self):
+        # Sent between processes as the plain display text, not the number
+        return str, (str(self),)
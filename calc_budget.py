@@ -0,0 +1,356 @@
+"""
+Evaluation budgets for PyCalc-Tk.
+
+A whitelist alone does not stop '9**9**9**9' or a deeply nested paste from
+pinning a core and eating memory. The engine therefore checks each expression
+against an EvalBudget: the source length, AST depth and node count are checked
+at compile time. At run time, the arithmetic operators, flattened chains and
+the integer functions in 'math' are routed through guards that estimate the
+size of the result and the work of computing it before doing so, and that
+check a wall-clock deadline.
+
+The deadline alone is not enough: one big-integer operation is a single C
+call that holds the GIL until it returns, so a division, gcd or square root
+of multi-million-bit numbers would run for seconds past it. Their cost is
+estimated from the operand sizes (in bit operations, for the quadratic
+algorithms CPython uses) and refused up front when over 'max_work'.
+
+The same checks stop an evaluation whose result is no longer wanted, such as
+a live preview overtaken by more typing (Guard.cancellable).
+"""
+import ast
+import math
+import threading
+import time
+from contextlib import contextmanager
+from fractions import Fraction
+
+from calc_backends import plain_number
+
+# Integer functions reached as math.<name> that get a size or work guard
+GUARDED_MATH_FUNCTIONS = ("factorial", "comb", "perm", "gcd", "lcm", "isqrt")
+
+# Operators routed through a guard, by the guard's name
+_GUARDED_OPS = {ast.Pow: "_pow", ast.Mult: "_mul", ast.FloorDiv: "_floordiv", ast.Mod: "_mod"}
+# Only slow on Fractions, so only guarded for the backends that make them
+_EXACT_GUARDED_OPS = {**_GUARDED_OPS, ast.Div: "_div", ast.Add: "_add", ast.Sub: "_sub"}
+
+# Shown instead of "Error" when an expression is over budget
+BUDGET_ERROR_TEXT = "Too complex"
+
+_LOG2_E = 1 / math.log(2)
+
+
+class BudgetExceeded(ArithmeticError):
+    """Raised when an expression is too large, too deep or too slow to evaluate."""
+
+
+class EvaluationCancelled(Exception):
+    """Raised inside an evaluation whose result is no longer wanted (see Guard.cancellable)."""
+
+
+class EvalBudget:
+    """Limits applied to every expression an engine compiles and runs."""
+
+    __slots__ = ("time_limit", "max_pow_bits", "max_work", "max_depth", "max_nodes",
+                 "max_length")
+
+    def __init__(self, time_limit=2.0, max_pow_bits=1 << 22, max_work=1 << 38, max_depth=500,
+                 max_nodes=5000, max_length=20000):
+        self.time_limit = time_limit        # seconds per evaluation (None = no limit)
+        self.max_pow_bits = max_pow_bits    # largest integer result, in bits
+        self.max_work = max_work            # most bit operations in one big-integer step
+        self.max_depth = max_depth          # deepest allowed AST nesting
+        self.max_nodes = max_nodes          # most AST nodes in one expression
+        self.max_length = max_length        # longest source text, in characters
+
+
+def check_source(source, budget):
+    """Reject source text that is too long to be worth parsing."""
+    if len(source) > budget.max_length:
+        raise BudgetExceeded(f"expression longer than {budget.max_length} characters")
+
+
+def guarded(node, synthetic, exact=False):
+    """Return the guarded replacement for 'node', or None if it needs no guard.
+
+    'exact' is true for backends whose literals are exact numbers. Calls
+    created here are recorded in 'synthetic' (id -> number of leading helper
+    arguments) so the engine does not check them against the whitelist.
+    """
+    operators = _EXACT_GUARDED_OPS if exact else _GUARDED_OPS
+    if isinstance(node, ast.BinOp) and type(node.op) in operators:
+        name = operators[type(node.op)]
+        call = ast.Call(func=ast.copy_location(ast.Name(id=name, ctx=ast.Load()), node),
+                        args=[node.left, node.right], keywords=[])
+        synthetic[id(call)] = 0
+        return ast.copy_location(call, node)
+    if (isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name)
+            and node.value.id == "math" and node.attr in GUARDED_MATH_FUNCTIONS):
+        return ast.copy_location(ast.Name(id="_" + node.attr, ctx=ast.Load()), node)
+    return None
+
+
+def _is_int(value):
+    return type(value) is int
+
+
+def _exact_int(value):
+    """'value' as an int if it is an integral int or Fraction, else None."""
+    if type(value) is int:
+        return value
+    if isinstance(value, Fraction) and value.denominator == 1:
+        return value.numerator
+    return None
+
+
+def _bits(value):
+    """Size in bits of an exact number (int or Fraction); None for anything else."""
+    if type(value) is int:
+        return value.bit_length()
+    if isinstance(value, Fraction):
+        return max(value.numerator.bit_length(), value.denominator.bit_length())
+    return None
+
+
+def _parts(value):
+    """(numerator bits, denominator bits) of an exact number; None for anything else.
+
+    An integer's denominator counts as 0 bits: nothing is ever reduced by it.
+    """
+    if type(value) is int:
+        return value.bit_length(), 0
+    if isinstance(value, Fraction):
+        return value.numerator.bit_length(), value.denominator.bit_length() - 1
+    return None
+
+
+def _pow_bits(base, power):
+    """Bit length of base ** power for an exact base and a positive power."""
+    if isinstance(base, Fraction):
+        base = max(abs(base.numerator), base.denominator)
+    return abs(power) * math.log2(abs(base)) + 1
+
+
+def _division_work(left, right):
+    """Bit operations for left // right or left % right on exact numbers.
+
+    Long division of an n-bit by an m-bit integer costs about (n - m) * m;
+    Fractions divide cross products and then reduce the remainder.
+    """
+    a, b = _parts(left), _parts(right)
+    if a is None or b is None:
+        return 0
+    dividend, divisor = a[0] + b[1], b[0] + a[1]
+    return max(dividend - divisor, 0) * divisor + divisor * (a[1] + b[1])
+
+
+def _fraction_work(op, left, right):
+    """Bit operations spent in the gcds of a Fraction +, -, * or /.
+
+    Integers and Fractions with denominator 1 are cheap except under '/',
+    which reduces by the gcd of the numerators.
+    """
+    a, b = _parts(left), _parts(right)
+    if a is None or b is None or not (isinstance(left, Fraction) or isinstance(right, Fraction)):
+        return 0
+    if op == "*":
+        return a[0] * b[1] + b[0] * a[1]
+    if op == "/":
+        return a[0] * b[0] + a[1] * b[1]
+    # '+' and '-': the gcd of the denominators, then of the new numerator with it
+    return a[1] * b[1] + max(a[0] + b[1], b[0] + a[1]) * min(a[1], b[1])
+
+
+def _chain_work(ops, terms):
+    """Bit operations spent reducing a flattened chain of Fractions.
+
+    A product is built as one numerator over one denominator, reduced by
+    their gcd; a sum adds the numerators over each distinct denominator and
+    then combines those.
+    """
+    if not any(isinstance(term, Fraction) for term in terms):
+        return 0
+    parts = [_parts(term) for term in terms]
+    if None in parts:
+        return 0
+    if ops[:1] in ("*", "/"):
+        ops = "*" + ops
+        numerator = sum(p[1] if op == "/" else p[0] for op, p in zip(ops, parts))
+        denominator = sum(p[0] if op == "/" else p[1] for op, p in zip(ops, parts))
+        return numerator * denominator
+    denominators = {term.denominator for term in terms if isinstance(term, Fraction)}
+    return (sum(p[0] + p[1] for p in parts)
+            * sum(denominator.bit_length() - 1 for denominator in denominators))
+
+
+class Guard:
+    """Runtime checks for one engine; the deadline and cancel flag are tracked per thread."""
+
+    def __init__(self, budget, backend):
+        self.budget = budget
+        self.backend = backend
+        self._local = threading.local()
+
+    def namespace(self):
+        """Names the guarded tree refers to."""
+        return {"_pow": self.pow, "_mul": self.mul, "_div": self.div,
+                "_floordiv": self.floordiv, "_mod": self.mod, "_add": self.add, "_sub": self.sub,
+                "_sum": self.sum, "_prod": self.prod,
+                "_factorial": self.factorial, "_comb": self.comb, "_perm": self.perm,
+                "_gcd": self.gcd, "_lcm": self.lcm, "_isqrt": self.isqrt}
+
+    def run(self, function, *args):
+        """Call a compiled function under the wall-clock budget."""
+        limit = self.budget.time_limit
+        if limit is None:
+            return function(*args)
+        start = time.perf_counter()
+        outer = getattr(self._local, "deadline", None)
+        self._local.deadline = start + limit if outer is None else min(outer, start + limit)
+        try:
+            result = function(*args)
+        finally:
+            self._local.deadline = outer
+        if time.perf_counter() - start > limit:
+            raise BudgetExceeded(f"evaluation took longer than {limit}s")
+        return result
+
+    @contextmanager
+    def cancellable(self, cancelled):
+        """Stop evaluations in this thread at their next check once 'cancelled' is set.
+
+        'cancelled' is a threading.Event, set from any thread; the evaluation
+        then raises EvaluationCancelled.
+        """
+        outer = getattr(self._local, "cancelled", None)
+        self._local.cancelled = cancelled
+        try:
+            yield
+        finally:
+            self._local.cancelled = outer
+
+    def _check_time(self):
+        deadline = getattr(self._local, "deadline", None)
+        if deadline is not None and time.perf_counter() > deadline:
+            raise BudgetExceeded(f"evaluation took longer than {self.budget.time_limit}s")
+        cancelled = getattr(self._local, "cancelled", None)
+        if cancelled is not None and cancelled.is_set():
+            raise EvaluationCancelled("evaluation cancelled")
+
+    def _check_bits(self, bits):
+        if bits > self.budget.max_pow_bits:
+            raise BudgetExceeded(f"result would exceed {self.budget.max_pow_bits} bits")
+
+    def _check_work(self, work):
+        if work > self.budget.max_work:
+            raise BudgetExceeded("a single step would take too long")
+
+    # --- Guarded operations ---
+
+    def pow(self, base, exponent):
+        self._check_time()
+        bits = _bits(base)
+        power = _exact_int(exponent)
+        if bits and power and (power > 0 or not _is_int(base)):
+            self._check_bits(_pow_bits(base, power))
+        return base ** exponent
+
+    def mul(self, left, right):
+        left_bits, right_bits = _bits(left), _bits(right)
+        if left_bits is not None and right_bits is not None:
+            self._check_time()
+            self._check_bits(left_bits + right_bits - 1)
+            self._check_work(_fraction_work("*", left, right))
+        return left * right
+
+    def div(self, left, right):
+        self._check_work(_fraction_work("/", left, right))
+        return left / right
+
+    def floordiv(self, left, right):
+        self._check_time()
+        self._check_work(_division_work(left, right))
+        return left // right
+
+    def mod(self, left, right):
+        self._check_time()
+        self._check_work(_division_work(left, right))
+        return left % right
+
+    def add(self, left, right):
+        self._check_work(_fraction_work("+", left, right))
+        return left + right
+
+    def sub(self, left, right):
+        self._check_work(_fraction_work("-", left, right))
+        return left - right
+
+    def sum(self, ops, *terms):
+        """A flattened chain such as a + b - c + ..., reduced by the backend."""
+        self._check_time()
+        self._check_work(_chain_work(ops, terms))
+        return self.backend.sum(ops, terms)
+
+    def prod(self, ops, *terms):
+        """A flattened chain such as a * b / c * ..., reduced by the backend."""
+        self._check_time()
+        # The result can't have more bits than all exact operands together
+        self._check_bits(sum(_bits(term) or 0 for term in terms))
+        self._check_work(_chain_work(ops, terms))
+        return self.backend.product(ops, terms)
+
+    # Integral Decimal and Fraction arguments are passed on as ints, which
+    # the math functions require
+
+    def factorial(self, n):
+        self._check_time()
+        n = plain_number(n)
+        if _is_int(n) and n > 2:
+            self._check_bits(math.lgamma(n + 1) * _LOG2_E)
+        return math.factorial(n)
+
+    def comb(self, n, k):
+        self._check_time()
+        n, k = plain_number(n), plain_number(k)
+        if _is_int(n) and _is_int(k) and 0 < k < n:
+            k = min(k, n - k)
+            self._check_bits((math.lgamma(n + 1) - math.lgamma(k + 1)
+                              - math.lgamma(n - k + 1)) * _LOG2_E)
+        return math.comb(n, k)
+
+    def perm(self, n, k=None):
+        self._check_time()
+        n, k = plain_number(n), plain_number(k)
+        if _is_int(n) and n > 2:
+            kept = n if k is None else min(k, n)
+            if _is_int(kept) and kept > 0:
+                self._check_bits((math.lgamma(n + 1) - math.lgamma(n - kept + 1)) * _LOG2_E)
+        return math.perm(n, k)
+
+    def gcd(self, *integers):
+        self._check_time()
+        integers = [plain_number(n) for n in integers]
+        sizes = [_bits(n) for n in integers if _is_int(n)]
+        # Each step is a gcd of the running result (never larger) with the next
+        self._check_work(sum(min(sizes[:index]) * size
+                             for index, size in enumerate(sizes) if index))
+        return math.gcd(*integers)
+
+    def lcm(self, *integers):
+        self._check_time()
+        integers = [plain_number(n) for n in integers]
+        sizes = [_bits(n) for n in integers if _is_int(n)]
+        # Each step takes a gcd of the running result (at most all the bits
+        # so far) with the next
+        self._check_bits(sum(sizes))
+        self._check_work(sum(sum(sizes[:index]) * size
+                             for index, size in enumerate(sizes) if index))
+        return math.lcm(*integers)
+
+    def isqrt(self, n):
+        self._check_time()
+        n = plain_number(n)
+        if _is_int(n):
+            self._check_work(_bits(n) ** 2 // 4)
+        return math.isqrt(n)
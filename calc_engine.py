@@ -0,0 +1,868 @@
+"""
+Expression engine for PyCalc-Tk.
+
+Expressions are parsed once with ``ast``, checked against a whitelist of
+syntax and names, and compiled into a plain Python function. Compiled
+expressions are cached, so evaluating the same text again skips parsing and
+compilation entirely. The engine has no dependency on tkinter.
+
+When NumPy is installed, an expression in 'x' can also be evaluated over a
+whole array in one vectorized pass with CalcEngine.evaluate_array(). NumPy
+is only imported the first time that happens; importing it costs more than
+starting the rest of the calculator.
+
+List literals are vectors and matrices ('[[1, 2], [3, 4]]'), with '@' for
+the matrix product and dot, matmul, transpose, det, inv and solve among the
+default names (see calc_matrix).
+
+root, integrate and diff take a function of x as their first argument
+('integrate(sin(x), 0, pi)'). It is compiled once, as a float expression of
+its own, and the solver calls the compiled function directly (see calc_solve).
+
+Every expression is also held to an EvalBudget (see calc_budget), so a
+pathological input fails fast with BudgetExceeded instead of hanging.
+
+The arithmetic itself comes from a numeric backend (see calc_backends):
+float by default, or Decimal / Fraction for high-precision and exact work.
+Long '+'/'-' and '*'/'/' chains are flattened into a single call, so the
+backend can reduce thousands of terms in one pass. Before compiling, constant
+subtrees are folded (pure calls memoized per engine) and repeated subtrees are
+computed once (see calc_optimize).
+
+Users can add variables and functions of their own ('f(x) = x**2') through
+CalcEngine.symbols (see calc_symbols). Each compiled expression and cached
+result is indexed by the user names it uses, so a redefinition drops only
+those.
+
+An engine may be used by several threads (see calc_shared): the caches
+and the symbol table are guarded by locks, which are only held for lookups
+and updates, never while an expression is parsed, folded or evaluated.
+Several engines can also share a SharedCache, which holds the compiled
+expressions and results that use no user-defined names, while each engine
+keeps its own definitions and everything that depends on them.
+
+With a calc_profile.Profiler in CalcEngine.profiler, calculate() times each
+of its stages (rewrite, compile, execute, format); without one it takes no
+timings at all.
+"""
+import ast
+import functools
+import math
+import re
+import threading
+import time
+import types
+from collections import OrderedDict
+
+from calc_backends import FloatBackend, fold, plain_number
+from calc_bignum import Abbreviated
+from calc_budget import BudgetExceeded, EvalBudget, Guard, check_source, guarded
+from calc_matrix import MATRIX_FUNCTIONS, make_matrix, matrix_literal
+from calc_optimize import FOLD_CACHE_SIZE, eliminate_common_subexpressions, fold_constants
+from calc_solve import SOLVER_FUNCTIONS, SOLVER_VARIABLE, solver_call
+from calc_symbols import SymbolTable
+
+# Names available to expressions (mirrors ScientificCalculator.allowed_names)
+DEFAULT_NAMES = {
+    "math": math,
+    "sqrt": math.sqrt,
+    "log10": math.log10,
+    "pi": math.pi,
+    "e": math.e,
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan
+}
+DEFAULT_NAMES.update(MATRIX_FUNCTIONS)
+DEFAULT_NAMES.update(SOLVER_FUNCTIONS)
+
+
+@functools.lru_cache(maxsize=None)
+def load_numpy():
+    """NumPy, imported on first use, or None when it isn't installed."""
+    try:
+        import numpy
+    except ImportError:  # NumPy is optional; evaluate_array() falls back to math
+        return None
+    return numpy
+
+
+def numpy_names():
+    """NumPy equivalents of DEFAULT_NAMES, used when evaluating over arrays."""
+    np = load_numpy()
+    if np is None:
+        return {}
+    return {
+        "sqrt": np.sqrt,
+        "log10": np.log10,
+        "pi": np.pi,
+        "e": np.e,
+        "sin": np.sin,
+        "cos": np.cos,
+        "tan": np.tan
+    }
+
+# Number of compiled expressions kept per engine
+COMPILE_CACHE_SIZE = 4096
+
+# Number of formatted results kept per engine (0 disables the result cache)
+RESULT_CACHE_SIZE = 1024
+
+# Syntax that may appear in a calculator expression
+_ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Call, ast.Name, ast.Load,
+    ast.Constant, ast.Attribute, ast.List,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.MatMult,
+    ast.UAdd, ast.USub,
+)
+
+# Chains with at least this many operands are reduced by the backend in one call
+CHAIN_MIN_TERMS = 8
+_SUM_OPS = {ast.Add: "+", ast.Sub: "-"}
+_PRODUCT_OPS = {ast.Mult: "*", ast.Div: "/"}
+
+_FLOAT_BACKEND = FloatBackend()
+
+# Source position given to the nodes wrapped around a parsed expression
+_LOCATION = {"lineno": 1, "col_offset": 0, "end_lineno": 1, "end_col_offset": 0}
+
+# 'log' typed on its own means log10 (but leave 'log10' alone)
+_LOG_RE = re.compile(r"\blog\b")
+
+# Whitespace runs; only those between two word/number characters are significant
+_SPACE_RE = re.compile(r"\s+")
+_WORD_CHARS = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_.")
+
+
+class ExpressionError(ValueError):
+    """Raised when an expression uses syntax or names outside the whitelist."""
+
+
+def close_parentheses(expression):
+    """Append any closing parentheses the expression is missing."""
+    missing = expression.count('(') - expression.count(')')
+    if missing > 0:
+        expression += ')' * missing
+    return expression
+
+
+def prepare_expression(expression):
+    """Turn display text into evaluable source: symbols, 'log' and open parentheses."""
+    expression = expression.replace('π', 'pi')
+    expression = _LOG_RE.sub('log10', expression)
+    return close_parentheses(expression)
+
+
+def normalize_expression(source):
+    """Canonical form of prepared source, used as the result-cache key."""
+    source = source.strip()
+    if not _SPACE_RE.search(source):
+        return source
+
+    def collapse(match):
+        # Keep one space where dropping it would merge tokens ('1 2' is not '12')
+        before = source[match.start() - 1]
+        after = source[match.end()]
+        return " " if before in _WORD_CHARS and after in _WORD_CHARS else ""
+
+    return _SPACE_RE.sub(collapse, source)
+
+
+def format_result(result):
+    """Format a numeric result the way the display shows it."""
+    return _FLOAT_BACKEND.format(result)
+
+
+def _chain_kind(node):
+    """The chain table a BinOp belongs to, or None."""
+    if isinstance(node, ast.BinOp):
+        for symbols in (_SUM_OPS, _PRODUCT_OPS):
+            if type(node.op) in symbols:
+                return symbols
+    return None
+
+
+def _flattened(node, synthetic):
+    """Return a _sum/_prod call for a long chain rooted at 'node', else None.
+
+    'a + b - c + d ...' parses as a left-nested tree as deep as it is long;
+    as a call it is flat, compiles quickly and can be reduced by the backend
+    in one pass.
+    """
+    symbols = _chain_kind(node)
+    if symbols is None:
+        return None
+    root = node
+    ops, terms = [], []
+    while _chain_kind(node) is symbols:
+        ops.append(symbols[type(node.op)])
+        terms.append(node.right)
+        node = node.left
+    terms.append(node)
+    if len(terms) < CHAIN_MIN_TERMS:
+        return None
+    ops.reverse()
+    terms.reverse()
+    name = "_sum" if symbols is _SUM_OPS else "_prod"
+    call = ast.Call(func=ast.copy_location(ast.Name(id=name, ctx=ast.Load()), root),
+                    args=[ast.copy_location(ast.Constant(value="".join(ops)), root)] + terms,
+                    keywords=[])
+    synthetic[id(call)] = 1
+    return ast.copy_location(call, root)
+
+
+def _literal_text(lines, node):
+    """Source text of a single-line literal node (repr of its value as a fallback)."""
+    if node.lineno == node.end_lineno and 0 < node.lineno <= len(lines):
+        return lines[node.lineno - 1][node.col_offset:node.end_col_offset].decode("utf-8")
+    return repr(node.value)
+
+
+def _fold_call(ops, *terms):
+    """Float reduction of a flattened chain (used by vectorized expressions)."""
+    return fold(ops, terms)
+
+
+def _backend_call(function, backend):
+    """Wrap a function computing in float for an exact backend.
+
+    Backend numbers go in as ints when integral (math.factorial(5)) and as
+    floats otherwise; float results come back as backend numbers.
+    """
+    @functools.wraps(function)
+    def wrapper(*args):
+        return backend.from_float(function(*[plain_number(arg) for arg in args]))
+    return wrapper
+
+
+def _backend_module(module, backend, pure):
+    """A stand-in for 'module' (math) whose functions and constants go through the backend.
+
+    The backend's own versions (math.sqrt, math.pi under Decimal) are used
+    where it has them; wrappers of functions in 'pure' are added to it.
+    """
+    overrides = backend.functions()
+    attributes = {}
+    for name, value in vars(module).items():
+        if name.startswith("_"):
+            continue
+        if name in overrides:
+            value = overrides[name]
+        elif callable(value):
+            wrapper = _backend_call(value, backend)
+            if value in pure:
+                pure.add(wrapper)
+            value = wrapper
+        elif isinstance(value, float):
+            value = backend.from_float(value)
+        attributes[name] = value
+    return types.SimpleNamespace(**attributes)
+
+
+def _scalar_or_nan(function, value):
+    """Call a compiled function, mapping arithmetic failures to nan."""
+    try:
+        return float(function(value))
+    except (ArithmeticError, ValueError, TypeError):
+        return math.nan
+
+
+class CompiledExpression:
+    """A validated, compiled expression that can be called repeatedly."""
+
+    __slots__ = ("source", "variables", "function", "uses")
+
+    def __init__(self, source, variables, function, uses=frozenset()):
+        self.source = source
+        self.variables = variables
+        self.function = function
+        self.uses = uses  # the user-defined names it depends on
+
+    def __call__(self, *args):
+        return self.function(*args)
+
+    def __repr__(self):
+        return f"CompiledExpression({self.source!r}, variables={self.variables!r})"
+
+
+class ShownResult(str):
+    """Display text of a result that keeps the number it shows as 'value'."""
+
+    def __new__(cls, text, value):
+        shown = super().__new__(cls, text)
+        shown.value = value
+        return shown
+
+    def __reduce__(self):
+        # Sent between processes as the plain display text, like Abbreviated
+        return str, (str(self),)
+
+
+def _shown(text, value):
+    """calculate()'s result: 'text' carrying 'value' (Abbreviated text already does)."""
+    return text if isinstance(text, Abbreviated) else ShownResult(text, value)
+
+
+class ResultCache:
+    """Bounded LRU memo of display results, including failed evaluations."""
+
+    def __init__(self, capacity=RESULT_CACHE_SIZE):
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return (found, is_error, value) for 'key', refreshing its position."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, False, None
+            self.hits += 1
+            self._entries.move_to_end(key)
+        return (True,) + entry
+
+    def put(self, key, value, is_error=False):
+        """Store a result (or the exception it raised), evicting the oldest entry."""
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (is_error, value)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def discard_errors(self):
+        """Drop the cached failures, keeping the results."""
+        with self._lock:
+            for key in [key for key, (is_error, value) in self._entries.items() if is_error]:
+                del self._entries[key]
+
+    def clear(self):
+        """Drop all entries (the counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Counters as a dict, e.g. for logging."""
+        with self._lock:
+            return {"size": len(self._entries), "capacity": self.capacity,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SharedCache:
+    """Compiled expressions and results shared by engines with the same whitelist.
+
+    Only expressions that use no user-defined names go here; they mean the
+    same in every engine. The engines also share the cache's budget, backend
+    and guard, since a compiled function calls the guard it was compiled with.
+    """
+
+    def __init__(self, cache_size=COMPILE_CACHE_SIZE, result_cache_size=RESULT_CACHE_SIZE,
+                 budget=None, backend=None):
+        self.cache_size = cache_size
+        self.results = ResultCache(result_cache_size)
+        self.budget = budget or EvalBudget()
+        self.backend = backend or _FLOAT_BACKEND
+        self.guard = Guard(self.budget, self.backend)
+        self._compiled = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """The CompiledExpression cached under 'key', or None."""
+        with self._lock:
+            compiled = self._compiled.get(key)
+            if compiled is not None:
+                self._compiled.move_to_end(key)
+            return compiled
+
+    def put(self, key, compiled):
+        with self._lock:
+            self._compiled[key] = compiled
+            if len(self._compiled) > self.cache_size:
+                self._compiled.popitem(last=False)
+
+    def __len__(self):
+        return len(self._compiled)
+
+
+class CalcEngine:
+    """Compiles and evaluates calculator expressions against a fixed set of names."""
+
+    def __init__(self, names=None, cache_size=COMPILE_CACHE_SIZE,
+                 result_cache_size=RESULT_CACHE_SIZE, budget=None, backend=None,
+                 fold_cache_size=FOLD_CACHE_SIZE, shared_cache=None):
+        self.names = dict(DEFAULT_NAMES if names is None else names)
+        self._builtin_names = frozenset(self.names)
+        self.cache_size = cache_size
+        self.result_cache = ResultCache(result_cache_size)
+        # Work shared with other engines (see SharedCache); its budget and backend apply
+        self.shared_cache = shared_cache
+        if shared_cache is not None:
+            self.budget, self.backend = shared_cache.budget, shared_cache.backend
+            self.guard = shared_cache.guard
+        else:
+            self.budget = budget or EvalBudget()
+            self.backend = backend or _FLOAT_BACKEND
+            self.guard = Guard(self.budget, self.backend)
+        # Globals for compiled functions: the whitelist, the guards and no builtins
+        self._namespace = {"__builtins__": {}}
+        self._namespace.update(self.names)
+        self._namespace.update(self.guard.namespace())
+        self._namespace["_matrix"] = make_matrix
+        # Same names with NumPy ufuncs swapped in, for evaluate_array(); built
+        # on first use so NumPy is never imported by engines that don't need it
+        self._vector_namespace = None
+        # The whitelist with float arithmetic, for functions handed to the
+        # solvers under the exact backends; also built on first use
+        self._float_namespace = None
+        # The backend's versions of sqrt, pi, ... for everything else
+        for name, value in self.backend.functions().items():
+            if name in self.names:
+                self._namespace[name] = value
+        # Functions whose calls may be computed at compile time, and the
+        # memo of their results shared by all expressions
+        self._pure = {value for value in vars(math).values() if callable(value)}
+        self._pure.update(value for value in self._namespace.values()
+                          if callable(value) and value not in self.names.values())
+        if self.backend.converts_literals:
+            # The math, matrix and solver functions work in float: they are
+            # given ints and floats, and their results come back as backend numbers
+            overrides = self.backend.functions()
+            for name, value in self.names.items():
+                if name in overrides:
+                    continue
+                if isinstance(value, types.ModuleType):
+                    value = _backend_module(value, self.backend, self._pure)
+                elif callable(value):
+                    wrapper = _backend_call(value, self.backend)
+                    if value in self._pure:
+                        self._pure.add(wrapper)
+                    value = wrapper
+                elif isinstance(value, float):
+                    value = self.backend.from_float(value)
+                self._namespace[name] = value
+        self.fold_cache = ResultCache(fold_cache_size)
+        self._compiled = OrderedDict()
+        # Held while the compile cache, its indexes, the lazily built
+        # namespaces or the symbol table change (re-entrant: defining a
+        # symbol compiles its body)
+        self.lock = threading.RLock()
+        # User variables and functions, and the compile and result cache keys
+        # that depend on each of them
+        self.symbols = SymbolTable(self)
+        self._compiled_using = {}
+        self._results_using = {}
+        # Bumped by invalidate(), so work begun before a redefinition isn't cached after it
+        self._generation = 0
+        # Stage timings for calculate() (see calc_profile); None when not profiling
+        self.profiler = None
+
+    def _vector_names(self):
+        with self.lock:
+            if self._vector_namespace is None:
+                # evaluate_array() always computes in float, so the backend's
+                # functions are swapped back for the plain whitelist
+                namespace = dict(self._namespace)
+                namespace.update(self.names)
+                namespace["_sum"] = namespace["_prod"] = _fold_call
+                for name, value in numpy_names().items():
+                    if name in self.names:
+                        namespace[name] = value
+                        if callable(value):
+                            self._pure.add(value)
+                self._pure.add(_fold_call)
+                self._vector_namespace = namespace
+                # Set first: user functions are compiled against the namespace itself
+                for symbol in self.symbols:
+                    namespace[symbol.name] = symbol.version(self, "vector")
+            return self._vector_namespace
+
+    def _float_names(self):
+        with self.lock:
+            if self._float_namespace is None:
+                namespace = dict(self._namespace)
+                namespace.update(self.names)
+                namespace["_sum"] = namespace["_prod"] = _fold_call
+                self._pure.add(_fold_call)
+                self._float_namespace = namespace
+                for symbol in self.symbols:
+                    namespace[symbol.name] = symbol.version(self, "float")
+            return self._float_namespace
+
+    # --- User Symbols ---
+
+    def _bind_symbol(self, symbol, old=None):
+        """Make a user definition visible to expressions compiled from now on."""
+        if old is not None:
+            self._unbind_symbol(old)
+        name = symbol.name
+        self.names[name] = self._namespace[name] = symbol.value
+        if symbol.pure and symbol.is_function:
+            self._pure.add(symbol.value)
+        if self._vector_namespace is not None:
+            self._vector_namespace[name] = symbol.version(self, "vector")
+        if self._float_namespace is not None:
+            self._float_namespace[name] = symbol.version(self, "float")
+
+    def _unbind_symbol(self, symbol):
+        for namespace in (self.names, self._namespace, self._vector_namespace,
+                          self._float_namespace):
+            if namespace is not None:
+                namespace.pop(symbol.name, None)
+        self._pure.discard(symbol.value)
+        for value in symbol._versions.values():
+            self._pure.discard(value)
+
+    def invalidate(self, names):
+        """Drop the compiled expressions and cached results that use any of 'names'."""
+        with self.lock:
+            self._generation += 1
+            for name in names:
+                for key in self._compiled_using.pop(name, ()):
+                    self._compiled.pop(key, None)
+                for key in self._results_using.pop(name, ()):
+                    self.result_cache.discard(key)
+
+    # --- Compilation ---
+
+    def compile(self, source, variables=(), vectorized=False, floats=False):
+        """Return a CompiledExpression for 'source', reusing a cached one when possible.
+
+        With 'vectorized', names resolve to their NumPy equivalents; with
+        'floats', the expression computes in float whatever the backend.
+        """
+        variables = tuple(variables)
+        key = (source, variables, vectorized, floats)
+        with self.lock:
+            compiled = self._compiled.get(key)
+            if compiled is not None:
+                self._compiled.move_to_end(key)
+                return compiled
+            generation = self._generation
+        if self.shared_cache is not None:
+            compiled = self.shared_cache.get(key)
+            if compiled is not None:
+                return compiled
+
+        tree, functions = self._parse(source, variables)
+        uses = self.symbols.used_in(tree) if self.symbols else frozenset()
+        if vectorized:
+            namespace = self._vector_names()
+        elif not self.backend.converts_literals:
+            namespace = self._namespace
+        elif floats:
+            namespace = self._float_names()
+        else:
+            namespace = self._bind_literals(tree, source.strip())
+        if functions:
+            # The solvers' function arguments, each compiled (and cached) on its own
+            namespace = dict(namespace)
+            for body, name in functions.items():
+                body = self.compile(body, (SOLVER_VARIABLE,), floats=True)
+                namespace[name] = body.function
+                uses |= body.uses
+        namespace = self._optimize(tree, variables, namespace, vectorized)
+        function = self._build_function(tree, variables, namespace)
+        compiled = CompiledExpression(source, variables, function, uses)
+
+        if not uses and self.shared_cache is not None:
+            self.shared_cache.put(key, compiled)
+            return compiled
+        with self.lock:
+            if uses and generation != self._generation:
+                return compiled  # a name it uses may have changed meanwhile
+            for name in uses:
+                self._compiled_using.setdefault(name, set()).add(key)
+            self._compiled[key] = compiled
+            if len(self._compiled) > self.cache_size:
+                self._compiled.popitem(last=False)
+        return compiled
+
+    def _parse(self, source, variables):
+        """Parse 'source', then check and rewrite it in a single top-down pass.
+
+        Each original node is checked against the whitelist and the budget's
+        depth and size limits. Along the way, long operator chains are
+        flattened and expensive operations are routed through the guards.
+
+        Returns the tree and {source: name} for the solvers' function
+        arguments, which the rewrite has replaced with those names.
+        """
+        check_source(source, self.budget)
+        try:
+            tree = ast.parse(source.strip(), mode="eval")
+        except SyntaxError as exc:
+            raise ExpressionError(f"invalid expression: {source!r}") from exc
+        except (RecursionError, MemoryError) as exc:
+            raise BudgetExceeded("expression is nested too deeply") from exc
+
+        max_depth, max_nodes = self.budget.max_depth, self.budget.max_nodes
+        synthetic = {}
+        functions = {}
+        stack = [(tree, 1)]
+        count = 0
+        while stack:
+            node, depth = stack.pop()
+            count += 1
+            if count > max_nodes:
+                raise BudgetExceeded(f"expression has more than {max_nodes} nodes")
+            if depth > max_depth:
+                raise BudgetExceeded(f"expression nested deeper than {max_depth}")
+
+            skip = synthetic.get(id(node))
+            # Helper calls made by the rewrite: only their real operands are visited
+            fields = node._fields if skip is None else ("args",)
+            for field in fields:
+                value = getattr(node, field, None)
+                if isinstance(value, list):
+                    for index in range(skip or 0, len(value)):
+                        value[index] = self._visit(value[index], variables, synthetic,
+                                                   functions, stack, depth)
+                elif isinstance(value, ast.AST):
+                    child = self._visit(value, variables, synthetic, functions, stack, depth)
+                    if child is not value:
+                        setattr(node, field, child)
+        return tree, functions
+
+    def _visit(self, node, variables, synthetic, functions, stack, depth):
+        """Check one original node, rewrite it if needed, and queue it for its children."""
+        self._check_node(node, variables)
+        replacement = (_flattened(node, synthetic)
+                       or guarded(node, synthetic, self.backend.converts_literals)
+                       or matrix_literal(node, synthetic)
+                       or solver_call(node, synthetic, self.names, functions))
+        if replacement is not None:
+            node = replacement
+        stack.append((node, depth + 1))
+        return node
+
+    def _bind_literals(self, tree, source):
+        """Swap numeric literals for backend numbers, exact from their source text.
+
+        Returns the namespace for this one expression, holding the converted
+        values as _k0, _k1, ...
+        """
+        namespace = dict(self._namespace)
+        count = 0
+        # AST column offsets count UTF-8 bytes; split once rather than per literal
+        lines = [line.encode("utf-8") for line in source.splitlines()]
+        for node in ast.walk(tree):
+            for field, value in ast.iter_fields(node):
+                items = value if isinstance(value, list) else [value]
+                for index, item in enumerate(items):
+                    if not (isinstance(item, ast.Constant) and isinstance(item.value, (int, float))
+                            and not isinstance(item.value, bool)):
+                        continue
+                    text = _literal_text(lines, item)
+                    name = f"_k{count}"
+                    count += 1
+                    namespace[name] = self.backend.literal(text)
+                    replacement = ast.copy_location(ast.Name(id=name, ctx=ast.Load()), item)
+                    if isinstance(value, list):
+                        value[index] = replacement
+                    else:
+                        setattr(node, field, replacement)
+        return namespace
+
+    def _optimize(self, tree, variables, namespace, vectorized):
+        """Fold constants and share repeated subtrees; returns the namespace to compile with."""
+        if vectorized:
+            # Folding calls the NumPy functions on scalars; keep their warnings quiet
+            context = load_numpy().errstate(all="ignore")
+        else:
+            context = self.backend.context()
+        with context:
+            folded = self.guard.run(fold_constants, tree, variables, namespace,
+                                    self.fold_cache, self._pure)
+        if folded:
+            namespace = dict(namespace)
+            namespace.update(folded)
+        eliminate_common_subexpressions(tree)
+        return namespace
+
+    def _check_node(self, node, variables):
+        """Reject any node that a calculator expression should not contain."""
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ExpressionError(f"unsupported syntax: {type(node).__name__}")
+        if isinstance(node, ast.Name):
+            if node.id not in self.names and node.id not in variables:
+                raise ExpressionError(f"unknown name: {node.id}")
+        elif isinstance(node, ast.Attribute):
+            # Only plain attributes of whitelisted modules, e.g. math.factorial
+            if (not isinstance(node.value, ast.Name) or node.attr.startswith("_")
+                    or not isinstance(self.names.get(node.value.id), type(math))):
+                raise ExpressionError(f"unsupported attribute: {node.attr}")
+        elif isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float, complex)):
+                raise ExpressionError(f"unsupported constant: {node.value!r}")
+        elif isinstance(node, ast.Call):
+            if node.keywords:
+                raise ExpressionError("keyword arguments are not supported")
+
+    def _build_function(self, tree, variables, namespace):
+        """Wrap the expression body in a lambda and compile it once."""
+        arguments = ast.arguments(
+            posonlyargs=[], args=[ast.arg(arg=name, **_LOCATION) for name in variables],
+            vararg=None, kwonlyargs=[], kw_defaults=[], kwarg=None, defaults=[])
+        wrapper = ast.Expression(body=ast.Lambda(args=arguments, body=tree.body, **_LOCATION))
+        try:
+            code = compile(wrapper, "<calc>", "eval")
+        except RecursionError as exc:
+            raise BudgetExceeded("expression is nested too deeply") from exc
+        return eval(code, namespace)
+
+    # --- Evaluation ---
+
+    def call(self, compiled, *args):
+        """Call a compiled expression under the engine's time budget and backend context."""
+        with self.backend.context():
+            return self.guard.run(compiled, *args)
+
+    def evaluate(self, source):
+        """Evaluate evaluable source text and return the raw numeric result."""
+        return self.call(self.compile(source))
+
+    def calculate(self, full_expression, use_cache=True):
+        """Evaluate display text the way the '=' button does and return the display string.
+
+        The string's 'value' is the number it shows. Results (and errors) are
+        memoized by normalized expression; pass use_cache=False to always
+        evaluate.
+        """
+        if self.profiler is not None:
+            return self._calculate_profiled(full_expression, use_cache)
+        source = prepare_expression(full_expression)
+        if not use_cache:
+            result = self.evaluate(source)
+            return _shown(self.backend.format(result), result)
+
+        key = normalize_expression(source)
+        found, is_error, value = self._cached_result(key)
+        if found:
+            if is_error:
+                raise value.with_traceback(None)
+            return value
+        generation = self._generation
+        compiled = None
+        try:
+            compiled = self.compile(source)
+            result = self.call(compiled)
+            value = _shown(self.backend.format(result), result)
+        except Exception as exc:
+            self._remember(key, exc, compiled, generation, is_error=True)
+            raise
+        self._remember(key, value, compiled, generation)
+        return value
+
+    def _cached_result(self, key):
+        """(found, is_error, value) from this engine's result cache, then the shared one."""
+        found = self.result_cache.get(key)
+        if not found[0] and self.shared_cache is not None:
+            return self.shared_cache.results.get(key)
+        return found
+
+    def _remember(self, key, value, compiled, generation, is_error=False):
+        """Cache a result, indexed by the user names its expression uses."""
+        if compiled is not None and not compiled.uses:
+            if self.shared_cache is not None and not is_error:
+                # Means the same in every engine sharing the cache
+                self.shared_cache.results.put(key, value)
+            else:
+                self.result_cache.put(key, value, is_error)
+            return
+        with self.lock:
+            # A name it uses (or, failing to compile, lacked) may have changed meanwhile
+            if generation != self._generation:
+                return
+            self.result_cache.put(key, value, is_error)
+            for name in compiled.uses if compiled is not None else ():
+                self._results_using.setdefault(name, set()).add(key)
+
+    def _calculate_profiled(self, full_expression, use_cache):
+        """calculate(), with each stage timed into self.profiler."""
+        profiler, clock = self.profiler, time.perf_counter
+        started = clock()
+        try:
+            source = prepare_expression(full_expression)
+            key = normalize_expression(source) if use_cache else None
+            rewritten = clock()
+            profiler.record("rewrite", rewritten - started)
+            if use_cache:
+                found, is_error, value = self._cached_result(key)
+                if found:
+                    profiler.count("result_cache_hits")
+                    if is_error:
+                        raise value.with_traceback(None)
+                    return value
+            generation = self._generation
+            compiled = None
+            try:
+                compiled = self.compile(source)
+                compiled_at = clock()
+                profiler.record("compile", compiled_at - rewritten)
+                result = self.call(compiled)
+                executed = clock()
+                profiler.record("execute", executed - compiled_at)
+                value = _shown(self.backend.format(result), result)
+                profiler.record("format", clock() - executed)
+            except Exception as exc:
+                profiler.count("errors")
+                if use_cache:
+                    self._remember(key, exc, compiled, generation, is_error=True)
+                raise
+            if use_cache:
+                self._remember(key, value, compiled, generation)
+            return value
+        finally:
+            profiler.record("calculate", clock() - started)
+
+    def evaluate_array(self, expression, values, variable="x"):
+        """Evaluate an expression in 'variable' for every item of 'values'.
+
+        Uses one vectorized NumPy pass and returns an ndarray when NumPy is
+        available; otherwise loops with the scalar math functions and returns a
+        list. Points where the expression is undefined give nan (NumPy may
+        give inf for a division by zero). Expressions using functions that
+        take no arrays (math.floor, math.factorial) fall back to the loop,
+        still returning an ndarray.
+        """
+        source = prepare_expression(expression)
+        np = load_numpy()
+        if np is None:
+            function = self.compile(source, (variable,))
+            return [_scalar_or_nan(function, value) for value in values]
+
+        function = self.compile(source, (variable,), vectorized=True)
+        values = np.asarray(values, dtype=float)
+        with np.errstate(all="ignore"):
+            try:
+                result = function(values)
+            except TypeError:
+                # A scalar-only function was handed the array; whole numbers
+                # are passed as ints, which math.factorial requires
+                function = self.compile(source, (variable,), floats=True)
+                return np.array([_scalar_or_nan(function, int(value) if value.is_integer() else value)
+                                 for value in values.tolist()])
+        # Expressions without the variable evaluate to a single number
+        return np.broadcast_to(np.asarray(result, dtype=float), values.shape).copy()
+
+    def clear_cache(self):
+        """Drop this engine's compiled expressions and cached results (not shared ones)."""
+        with self.lock:
+            self._compiled.clear()
+            self._compiled_using.clear()
+            self._results_using.clear()
+        self.result_cache.clear()
+        self.fold_cache.clear()
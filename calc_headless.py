@@ -0,0 +1,165 @@
+"""
+Headless stand-ins for the tkinter pieces the calculators use.
+
+Lets benchmarks and scripted runs build a real ScientificCalculator (from
+calci.py or 'calci v2.py') without a display. Widgets just remember their
+options, and the master keeps 'after' callbacks in a queue that is run
+explicitly with run_pending().
+"""
+import importlib
+import importlib.util
+import itertools
+import os
+import sys
+import types
+
+from calc_history import HISTORY_ENV
+from calc_shared import CALCULATOR_FILES
+from calc_symbols import SYMBOLS_ENV
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Headless calculators keep their history and definitions in memory unless told otherwise
+os.environ.setdefault(HISTORY_ENV, ":memory:")
+os.environ.setdefault(SYMBOLS_ENV, ":memory:")
+
+
+class VirtualInterpreter:
+    """Stands in for the Tcl interpreter behind 'widget.tk'; remembers the calls made."""
+
+    def __init__(self):
+        self.calls = []
+
+    def call(self, *args):
+        self.calls.append(args)
+        return ""
+
+
+class VirtualWidget:
+    """Accepts any widget call; remembers options passed to the constructor and config()."""
+
+    def __init__(self, master=None, **options):
+        self.master = master
+        self.options = dict(options)
+        self.config_calls = 0
+        self.bindings = {}  # sequence -> callbacks
+        # Shared by every widget under one master, as Tk's is
+        self.tk = master.tk if isinstance(master, VirtualWidget) else VirtualInterpreter()
+
+    def config(self, **options):
+        self.config_calls += 1
+        self.options.update(options)
+
+    configure = config
+
+    def cget(self, key):
+        return self.options.get(key)
+
+    def bindtags(self, tags=None):
+        if tags is None:
+            return self.options.get("bindtags", ())
+        self.options["bindtags"] = tuple(tags)
+
+    def bind(self, sequence, func=None, add=None):
+        callbacks = self.bindings.setdefault(sequence, [])
+        if not add:
+            callbacks.clear()
+        callbacks.append(func)
+        return f"{id(func)}{sequence}"
+
+    def destroy(self):
+        # Like Tk, <Destroy> also reaches the bindings of the widget's root window
+        event = types.SimpleNamespace(widget=self)
+        root = self
+        while isinstance(root.master, VirtualWidget):
+            root = root.master
+        for widget in {self: None, root: None}:
+            for callback in widget.bindings.get("<Destroy>", ()):
+                callback(event)
+
+    @property
+    def text(self):
+        return self.options.get("text", "")
+
+    def __getattr__(self, name):
+        # pack, grid, unbind, rowconfigure, ... are accepted and ignored
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: None
+
+
+class VirtualMaster(VirtualWidget):
+    """A root window whose 'after' callbacks run only when asked to."""
+
+    def __init__(self):
+        super().__init__()
+        self._ids = itertools.count(1)
+        self._pending = {}
+
+    def after(self, delay_ms, callback=None, *args):
+        after_id = f"after#{next(self._ids)}"
+        self._pending[after_id] = (callback, args)
+        return after_id
+
+    def after_idle(self, callback, *args):
+        return self.after(0, callback, *args)
+
+    def after_cancel(self, after_id):
+        self._pending.pop(after_id, None)
+
+    def run_pending(self, limit=10000):
+        """Run queued callbacks (including ones they schedule) up to 'limit' calls."""
+        calls = 0
+        while self._pending and calls < limit:
+            after_id = next(iter(self._pending))
+            callback, args = self._pending.pop(after_id)
+            if callback is not None:
+                callback(*args)
+            calls += 1
+        return calls
+
+
+# Module-like namespace exposing the names the calculators read from 'tk'
+virtual_tk = types.SimpleNamespace(
+    Tk=VirtualMaster, Frame=VirtualWidget, Label=VirtualWidget, Button=VirtualWidget,
+    Canvas=VirtualWidget, Listbox=VirtualWidget, Scrollbar=VirtualWidget,
+    Toplevel=VirtualWidget, Entry=VirtualWidget,
+    E="e", W="w", N="n", S="s", NW="nw", NE="ne", SW="sw", SE="se", RIGHT="right", LEFT="left", END="end", BOTH="both",
+    VERTICAL="vertical", HORIZONTAL="horizontal", Y="y", X="x",
+)
+
+_loaded = {}
+_WIDGET_MODULES = ("calc_history_view", "calc_plot", "calc_profile", "calc_symbols_view",
+                   "calc_table")
+
+
+def load_calculator(variant="v2"):
+    """Import a calculator script as a module whose 'tk' is the virtual one."""
+    module = _loaded.get(variant)
+    if module is not None:
+        return module
+
+    path = CALCULATOR_FILES[variant]
+    spec = importlib.util.spec_from_file_location(f"calci_{variant}", path)
+    module = importlib.util.module_from_spec(spec)
+    if _HERE not in sys.path:
+        sys.path.insert(0, _HERE)
+    # The scripts import tkinter lazily (calc_ui), so this never loads Tcl/Tk
+    spec.loader.exec_module(module)
+    module.tk = virtual_tk
+    use_virtual_widgets()
+    _loaded[variant] = module
+    return module
+
+
+def use_virtual_widgets():
+    """Make the helper modules that build their own widgets use the virtual ones."""
+    for name in _WIDGET_MODULES:
+        importlib.import_module(name).tk = virtual_tk
+
+
+def create_calculator(variant="v2"):
+    """Build a ScientificCalculator on a VirtualMaster. Returns (calculator, master)."""
+    master = VirtualMaster()
+    calculator = load_calculator(variant).ScientificCalculator(master)
+    return calculator, master
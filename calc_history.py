@@ -0,0 +1,243 @@
+"""
+Persistent calculation history for PyCalc-Tk.
+
+Every evaluation is recorded as (expression, result, timestamp, elapsed time)
+in an SQLite database, by default ~/.pycalc-tk/history.sqlite3. Set the
+PYCALC_HISTORY environment variable to use another file, or ':memory:' to
+keep history for the session only.
+
+record() only puts the entry on a queue. A background thread writes queued
+entries in batches, one transaction per batch, so '=' never waits for the
+disk. The same thread opens the database, so creating a HistoryStore doesn't
+either, and the calculator's first frame isn't held up by SQLite.
+
+Lookups stay fast on millions of entries:
+
+- Browsing newest-first goes by row id.
+- Prefix search uses an index on the expression.
+- Substring search uses an FTS5 trigram index, when SQLite provides one.
+"""
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+# Environment variable overriding where history is kept
+HISTORY_ENV = "PYCALC_HISTORY"
+DEFAULT_HISTORY_PATH = os.path.join(os.path.expanduser("~"), ".pycalc-tk", "history.sqlite3")
+
+# Most entries written in one transaction
+BATCH_SIZE = 200
+# Default number of results returned by search()
+SEARCH_LIMIT = 200
+# Shortest substring the trigram index can look up
+_TRIGRAM_MIN = 3
+# Sorts after every character, for prefix ranges
+_MAX_CHAR = "\U0010ffff"
+
+HistoryEntry = namedtuple("HistoryEntry", "id expression result created elapsed")
+
+_COLUMNS = "id, expression, result, created, elapsed"
+_STOP = object()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    expression TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created REAL NOT NULL,
+    elapsed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_expression ON history (expression);
+"""
+
+_TRIGRAM_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS history_text USING fts5 (
+    expression, content='history', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS history_text_insert AFTER INSERT ON history BEGIN
+    INSERT INTO history_text (rowid, expression) VALUES (new.id, new.expression);
+END;
+"""
+
+
+def history_path():
+    """The history file the calculators use: $PYCALC_HISTORY or the default."""
+    return os.environ.get(HISTORY_ENV) or DEFAULT_HISTORY_PATH
+
+
+class HistoryStore:
+    """An SQLite-backed history with batched background writes.
+
+    Rows are only ever appended, and clear() removes them all, so row ids
+    stay contiguous. That is what lets page() jump to any position of the
+    newest-first list without scanning.
+    """
+
+    def __init__(self, path=None, batch_size=BATCH_SIZE):
+        self.path = path or history_path()
+        self.batch_size = batch_size
+        # One connection shared by the writer thread and readers, under a lock.
+        # It is opened by whichever gets there first, normally the writer.
+        self._db = None
+        self._lock = threading.Lock()
+        self.trigram = None  # whether the trigram index is available, once open
+        self.dropped = 0  # entries lost to write errors
+
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="calc-history",
+                                        daemon=True)
+        self._writer.start()
+        self._closed = False
+        atexit.register(self.close)
+
+    def _connection(self):
+        """The database, opened and set up on first use. Call with the lock held."""
+        if self._db is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self.trigram = self._create_schema(db)
+            self._db = db
+        return self._db
+
+    def _create_schema(self, db):
+        """Create the tables; returns whether the trigram index is available."""
+        if self.path != ":memory:":
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(_SCHEMA)
+        try:
+            db.executescript(_TRIGRAM_SCHEMA)
+        except sqlite3.OperationalError:
+            # SQLite without FTS5 or the trigram tokenizer: substring search scans
+            return False
+        return True
+
+    # --- Writing ---
+
+    def record(self, expression, result, elapsed, created=None):
+        """Queue one evaluation for writing; returns immediately."""
+        if created is None:
+            created = time.time()
+        self._queue.put((expression, result, created, elapsed))
+
+    def flush(self):
+        """Block until every queued entry has been written."""
+        self._queue.join()
+
+    def close(self):
+        """Write what is queued, stop the writer thread and close the database."""
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        self._queue.put(_STOP)
+        self._writer.join()
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+
+    def _write_loop(self):
+        """Writer thread: take whatever has queued up and write it as one batch."""
+        with self._lock:
+            try:
+                self._connection()
+            except sqlite3.Error:
+                pass  # retried, and reported, by the first write or read
+        while True:
+            batch = [self._queue.get()]
+            while batch[-1] is not _STOP and len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is _STOP
+            entries = batch[:-1] if stop else batch
+            if entries:
+                self._write(entries)
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _write(self, entries):
+        with self._lock:
+            try:
+                db = self._connection()
+                db.execute("BEGIN")
+                db.executemany(
+                    "INSERT INTO history (expression, result, created, elapsed) "
+                    "VALUES (?, ?, ?, ?)", entries)
+                db.execute("COMMIT")
+            except sqlite3.Error:
+                # History must never take the calculator down; count what was lost
+                if self._db is not None and self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+                self.dropped += len(entries)
+
+    def clear(self):
+        """Delete all history."""
+        self.flush()
+        with self._lock:
+            db = self._connection()
+            db.execute("BEGIN")
+            db.execute("DELETE FROM history")
+            if self.trigram:
+                db.execute("INSERT INTO history_text (history_text) VALUES ('delete-all')")
+            db.execute("COMMIT")
+
+    # --- Reading ---
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [HistoryEntry(*row) for row in self._connection().execute(sql, params)]
+
+    def _has_trigram(self):
+        with self._lock:
+            self._connection()
+            return self.trigram
+
+    def _id_range(self):
+        with self._lock:
+            # Separate subqueries: each is a single index lookup, together they'd scan
+            return self._connection().execute("SELECT (SELECT min(id) FROM history), "
+                                              "(SELECT max(id) FROM history)").fetchone()
+
+    def __len__(self):
+        low, high = self._id_range()
+        return 0 if high is None else high - low + 1
+
+    def page(self, offset, limit):
+        """Entries 'offset' to 'offset + limit' of the newest-first list."""
+        low, high = self._id_range()
+        if high is None:
+            return []
+        return self._query(f"SELECT {_COLUMNS} FROM history WHERE id BETWEEN ? AND ? "
+                           "ORDER BY id DESC", (max(low, high - offset - limit + 1),
+                                                high - offset))
+
+    def latest(self, limit=1):
+        """The most recent entries, newest first."""
+        return self.page(0, limit)
+
+    def search(self, text, prefix=False, limit=SEARCH_LIMIT):
+        """Newest entries whose expression starts with (prefix=True) or contains 'text'."""
+        if not text:
+            return self.latest(limit)
+        if prefix:
+            return self._query(f"SELECT {_COLUMNS} FROM history "
+                               "WHERE expression >= ? AND expression < ? "
+                               "ORDER BY id DESC LIMIT ?", (text, text + _MAX_CHAR, limit))
+        if len(text) >= _TRIGRAM_MIN and self._has_trigram():
+            phrase = '"' + text.replace('"', '""') + '"'
+            return self._query(f"SELECT {_COLUMNS} FROM history WHERE id IN ("
+                               "SELECT rowid FROM history_text WHERE history_text MATCH ? "
+                               "ORDER BY rowid DESC LIMIT ?) ORDER BY id DESC",
+                               (phrase, limit))
+        # Too short for the trigram index: scan newest-first until 'limit' matches
+        return self._query(f"SELECT {_COLUMNS} FROM history WHERE instr(expression, ?) > 0 "
+                           "ORDER BY id DESC LIMIT ?", (text, limit))
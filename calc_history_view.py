@@ -0,0 +1,166 @@
+"""
+History browser window for PyCalc-Tk.
+
+The list is virtualized. The Listbox only ever holds the rows that fit on
+screen, and scrolling (scrollbar, mouse wheel or arrow keys) fetches just the
+next page from the HistoryStore. Opening the window costs the same with ten
+entries as with ten million.
+
+Typing in the search box filters by substring; start the text with '^' to
+match expressions by prefix instead. Double-click or Enter puts the selected
+expression back into the calculator.
+"""
+from calc_history import SEARCH_LIMIT
+from calc_ui import tk
+
+# Rows shown (and fetched) at a time
+VISIBLE_ROWS = 15
+# Quiet period after typing in the search box before querying
+SEARCH_DELAY_MS = 150
+# Search text starting with this matches by prefix
+PREFIX_MARK = "^"
+
+
+class HistoryWindow:
+    """A Toplevel listing past calculations, newest first."""
+
+    def __init__(self, master, store, on_pick, rows=VISIBLE_ROWS, bg="#282c34", fg="#FFFFFF",
+                 font=("Arial", 14)):
+        self.store = store
+        self.on_pick = on_pick
+        self.rows = rows
+        self.offset = 0
+        self.results = None  # search results, or None while browsing everything
+        self._shown = []
+        self._search_id = None
+
+        self.window = tk.Toplevel(master, bg=bg)
+        self.window.title("History")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        self.search_entry = tk.Entry(self.window, bg=bg, fg=fg, insertbackground=fg, font=font)
+        self.search_entry.pack(fill="x", padx=8, pady=(8, 4))
+        self.search_entry.bind("<KeyRelease>", self._on_search_key)
+
+        body = tk.Frame(self.window, bg=bg)
+        body.pack(expand=True, fill="both", padx=8)
+        self.listbox = tk.Listbox(body, height=rows, width=40, bg=bg, fg=fg, font=font,
+                                  activestyle="none", borderwidth=0, highlightthickness=0)
+        self.scrollbar = tk.Scrollbar(body, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill="y")
+        self.listbox.pack(side=tk.LEFT, expand=True, fill="both")
+
+        self.status_label = tk.Label(self.window, text="", anchor=tk.W, bg=bg, fg=fg)
+        self.status_label.pack(fill="x", padx=8, pady=(4, 8))
+
+        self.listbox.bind("<Double-Button-1>", self._pick)
+        self.listbox.bind("<Return>", self._pick)
+        self.listbox.bind("<Up>", lambda event: self._step(-1))
+        self.listbox.bind("<Down>", lambda event: self._step(1))
+        for widget in (self.listbox, self.window):
+            widget.bind("<MouseWheel>", self._on_wheel)
+            widget.bind("<Button-4>", lambda event: self.scroll(-3))
+            widget.bind("<Button-5>", lambda event: self.scroll(3))
+
+        self.refresh()
+        self.search_entry.focus_set()
+
+    # --- Data ---
+
+    def _total(self):
+        return len(self.store) if self.results is None else len(self.results)
+
+    def _fetch(self, offset, count):
+        if self.results is None:
+            return self.store.page(offset, count)
+        return self.results[offset:offset + count]
+
+    def refresh(self):
+        """Re-read the visible page (e.g. after new calculations were recorded)."""
+        total = self._total()
+        self.offset = max(0, min(self.offset, total - self.rows))
+        self._shown = self._fetch(self.offset, self.rows)
+
+        self.listbox.delete(0, tk.END)
+        for entry in self._shown:
+            self.listbox.insert(tk.END, f"{entry.expression} = {entry.result}")
+
+        if total:
+            self.scrollbar.set(self.offset / total,
+                               min(1.0, (self.offset + len(self._shown)) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        if self.results is None:
+            self.status_label.config(text=f"{total:,} calculations")
+        else:
+            more = "+" if total >= SEARCH_LIMIT else ""
+            self.status_label.config(text=f"{total:,}{more} matches")
+
+    # --- Scrolling ---
+
+    def scroll(self, rows):
+        """Move the visible page by 'rows' (negative scrolls toward newer entries)."""
+        self.offset += rows
+        self.refresh()
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.offset = int(float(amount) * self._total())
+            self.refresh()
+        elif action == "scroll":
+            self.scroll(int(amount) * (self.rows if unit == "pages" else 1))
+
+    def _on_wheel(self, event):
+        self.scroll(-3 if event.delta > 0 else 3)
+
+    def _step(self, direction):
+        """Arrow keys: move the selection, scrolling the page at its edges."""
+        selection = self.listbox.curselection()
+        index = (selection[0] if selection else -1) + direction
+        if index < 0 or index >= len(self._shown):
+            self.scroll(direction)
+            index = max(0, min(index, len(self._shown) - 1))
+        self.listbox.selection_clear(0, tk.END)
+        self.listbox.selection_set(index)
+        self.listbox.see(index)
+        return "break"
+
+    # --- Search ---
+
+    def _on_search_key(self, event):
+        if self._search_id is not None:
+            self.window.after_cancel(self._search_id)
+        self._search_id = self.window.after(SEARCH_DELAY_MS, self._search)
+
+    def _search(self):
+        self._search_id = None
+        text = self.search_entry.get()
+        if not text:
+            self.results = None
+        elif text.startswith(PREFIX_MARK):
+            self.results = self.store.search(text[len(PREFIX_MARK):], prefix=True)
+        else:
+            self.results = self.store.search(text)
+        self.offset = 0
+        self.refresh()
+
+    # --- Actions ---
+
+    def _pick(self, event=None):
+        selection = self.listbox.curselection()
+        if selection and selection[0] < len(self._shown):
+            self.on_pick(self._shown[selection[0]].expression)
+
+    def lift(self):
+        self.window.deiconify()
+        self.window.lift()
+        self.refresh()
+
+    def exists(self):
+        return self.window is not None
+
+    def close(self):
+        if self._search_id is not None:
+            self.window.after_cancel(self._search_id)
+        self.window.destroy()
+        self.window = None
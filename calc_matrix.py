@@ -0,0 +1,359 @@
+"""
+Vectors and matrices for PyCalc-Tk.
+
+A list literal in an expression becomes a Matrix: '[1, 2, 3]' is a vector,
+'[[1, 2], [3, 4]]' a 2x2 matrix. Values are float64, stored row-major in one
+contiguous array('d'), never as nested lists of Python floats.
+
+Operators follow NumPy: '+', '-', '*', '/' and '**' work element by element
+(or with a scalar) and '@' is the matrix product. The functions dot, matmul,
+transpose, det, inv and solve are added to the calculator's names.
+
+When NumPy is installed, large products and the det/inv/solve factorizations
+run on NumPy views of the same buffers. Otherwise, and for small sizes where
+NumPy's call overhead dominates, a pure-Python version runs:
+
+- Products are blocked: a band of columns of the right operand, stored
+  transposed so each column is contiguous, stays in cache while every row of
+  the left operand sweeps over it.
+- Each dot product and each row operation is a single C-level pass
+  (math.sumprod, or map() with operator.mul) over memoryview slices of the
+  buffers, with no Python loop per element.
+"""
+import ast
+import math
+import operator
+from array import array
+from itertools import repeat
+
+from calc_backends import FloatBackend
+
+# Columns of the right operand handled together by the blocked product
+BLOCK_SIZE = 64
+
+# Multiply-adds from which products and factorizations go to NumPy
+NUMPY_MIN_WORK = 32 * 32 * 32
+
+_FORMAT = FloatBackend().format
+
+try:
+    _dot = math.sumprod  # Python 3.12+
+except AttributeError:
+    def _dot(left, right):
+        return sum(map(operator.mul, left, right))
+
+
+def _numpy(work):
+    """NumPy if it is installed and 'work' is large enough to be worth it, else None."""
+    if work < NUMPY_MIN_WORK:
+        return None
+    # Imported here: the engine imports this module
+    from calc_engine import load_numpy
+    return load_numpy()
+
+
+def _is_scalar(value):
+    return isinstance(value, (int, float)) or (
+        not isinstance(value, Matrix) and hasattr(value, "__float__"))
+
+
+class Matrix:
+    """A dense float64 vector (shape (n,)) or matrix (shape (rows, cols))."""
+
+    __slots__ = ("shape", "data")
+
+    def __init__(self, shape, data):
+        self.shape = shape
+        self.data = data  # array('d'), row-major
+
+    @property
+    def rows(self):
+        return self.shape[0] if len(self.shape) == 2 else 1
+
+    @property
+    def cols(self):
+        return self.shape[-1]
+
+    def _view(self, np):
+        """The buffer as a NumPy array (no copy)."""
+        return np.frombuffer(self.data, dtype=float).reshape(self.shape)
+
+    @classmethod
+    def _from_numpy(cls, result):
+        if result.ndim == 0:
+            return float(result)
+        return cls(result.shape, array("d", result.astype(float).tobytes()))
+
+    def _row_views(self):
+        view, cols = memoryview(self.data), self.cols
+        return [view[start:start + cols] for start in range(0, len(self.data), cols)]
+
+    # --- Element-wise Operators ---
+
+    def _elementwise(self, op, other, swapped=False):
+        if isinstance(other, Matrix):
+            if other.shape != self.shape:
+                raise ValueError(f"shapes {self.shape} and {other.shape} do not match")
+            values = other.data
+        elif _is_scalar(other):
+            values = repeat(float(other))
+        else:
+            return NotImplemented
+        if swapped:
+            return Matrix(self.shape, array("d", map(op, values, self.data)))
+        return Matrix(self.shape, array("d", map(op, self.data, values)))
+
+    def __add__(self, other):
+        return self._elementwise(operator.add, other)
+
+    def __radd__(self, other):
+        return self._elementwise(operator.add, other, swapped=True)
+
+    def __sub__(self, other):
+        return self._elementwise(operator.sub, other)
+
+    def __rsub__(self, other):
+        return self._elementwise(operator.sub, other, swapped=True)
+
+    def __mul__(self, other):
+        return self._elementwise(operator.mul, other)
+
+    def __rmul__(self, other):
+        return self._elementwise(operator.mul, other, swapped=True)
+
+    def __truediv__(self, other):
+        return self._elementwise(operator.truediv, other)
+
+    def __rtruediv__(self, other):
+        return self._elementwise(operator.truediv, other, swapped=True)
+
+    def __pow__(self, other):
+        return self._elementwise(operator.pow, other)
+
+    def __rpow__(self, other):
+        return self._elementwise(operator.pow, other, swapped=True)
+
+    def __neg__(self):
+        return Matrix(self.shape, array("d", map(operator.neg, self.data)))
+
+    def __pos__(self):
+        return self
+
+    def __matmul__(self, other):
+        if not isinstance(other, Matrix):
+            return NotImplemented
+        return matmul(self, other)
+
+    # --- Display ---
+
+    def __str__(self):
+        if len(self.shape) == 1:
+            return "[" + ", ".join(map(_FORMAT, self.data)) + "]"
+        return "[" + ", ".join("[" + ", ".join(map(_FORMAT, row)) + "]"
+                               for row in self._row_views()) + "]"
+
+    def __repr__(self):
+        return f"Matrix({self.shape!r}, {self})"
+
+
+def make_matrix(*items):
+    """The value of a list literal: a vector of numbers or a matrix of equal-length vectors."""
+    if not items:
+        raise ValueError("empty vector")
+    if not isinstance(items[0], Matrix):
+        return Matrix((len(items),), array("d", items))
+    width = items[0].shape
+    if len(width) != 1 or any(not isinstance(row, Matrix) or row.shape != width for row in items):
+        raise ValueError("matrix rows must be vectors of the same length")
+    data = array("d")
+    for row in items:
+        data.extend(row.data)
+    return Matrix((len(items), width[0]), data)
+
+
+def matrix_literal(node, synthetic):
+    """Return a make_matrix call for a list literal, or None for any other node.
+
+    The items become the call's arguments, so nested rows are rewritten the
+    same way when the engine visits them.
+    """
+    if not isinstance(node, ast.List):
+        return None
+    call = ast.Call(func=ast.copy_location(ast.Name(id="_matrix", ctx=ast.Load()), node),
+                    args=node.elts, keywords=[])
+    synthetic[id(call)] = 0
+    return ast.copy_location(call, node)
+
+
+def _matrix_argument(value, name):
+    if not isinstance(value, Matrix):
+        raise TypeError(f"{name}() needs a vector or matrix")
+    return value
+
+
+def _square(value, name):
+    _matrix_argument(value, name)
+    if len(value.shape) != 2 or value.shape[0] != value.shape[1]:
+        raise ValueError(f"{name}() needs a square matrix")
+    return value.shape[0]
+
+
+# --- Products ---
+
+def _transposed(data, rows, cols):
+    """Row-major data of the transpose: each column taken with one strided slice."""
+    result = array("d")
+    for col in range(cols):
+        result.extend(data[col::cols])
+    return result
+
+
+def _product(left, rows, inner, right, cols):
+    """rows x inner times inner x cols, blocked over the columns of 'right'."""
+    columns = memoryview(_transposed(right, inner, cols))
+    columns = [columns[start:start + inner] for start in range(0, cols * inner, inner)]
+    view = memoryview(left)
+    left_rows = [view[start:start + inner] for start in range(0, rows * inner, inner)]
+    result = array("d", bytes(8 * rows * cols))
+    for first in range(0, cols, BLOCK_SIZE):
+        block = columns[first:first + BLOCK_SIZE]
+        for row, values in enumerate(left_rows):
+            start = row * cols + first
+            result[start:start + len(block)] = array("d", [_dot(values, column)
+                                                           for column in block])
+    return result
+
+
+def matmul(left, right):
+    """Matrix product with NumPy's rules for vectors ('@' in expressions)."""
+    _matrix_argument(left, "matmul")
+    _matrix_argument(right, "matmul")
+    rows, inner = (left.shape if len(left.shape) == 2 else (1, left.shape[0]))
+    inner_right, cols = (right.shape if len(right.shape) == 2 else (right.shape[0], 1))
+    if inner != inner_right:
+        raise ValueError(f"shapes {left.shape} and {right.shape} are not aligned")
+    shape = tuple(size for size, keep in ((rows, len(left.shape) == 2),
+                                          (cols, len(right.shape) == 2)) if keep)
+    if not shape:
+        return _dot(left.data, right.data)
+    np = _numpy(rows * inner * cols)
+    if np is not None:
+        return Matrix._from_numpy(left._view(np) @ right._view(np))
+    return Matrix(shape, _product(left.data, rows, inner, right.data, cols))
+
+
+def dot(left, right):
+    """Dot product of two vectors (the matrix product for anything else)."""
+    if (isinstance(left, Matrix) and isinstance(right, Matrix)
+            and len(left.shape) == len(right.shape) == 1):
+        if left.shape != right.shape:
+            raise ValueError(f"shapes {left.shape} and {right.shape} do not match")
+        return _dot(left.data, right.data)
+    return matmul(left, right)
+
+
+def transpose(value):
+    """Swap rows and columns (a vector is returned unchanged)."""
+    _matrix_argument(value, "transpose")
+    if len(value.shape) == 1:
+        return value
+    rows, cols = value.shape
+    return Matrix((cols, rows), _transposed(value.data, rows, cols))
+
+
+# --- Factorizations ---
+
+def _eliminate(rows, size, name, reduce=False):
+    """Gaussian elimination with partial pivoting on a list of row arrays, in place.
+
+    Returns the determinant of the leading size x size block. With 'reduce',
+    carries on to reduced row echelon form (Gauss-Jordan), leaving the
+    solution in the columns after the first 'size'; a singular matrix then
+    raises ZeroDivisionError.
+    """
+    determinant = 1.0
+    for col in range(size):
+        pivot = max(range(col, size), key=lambda row: abs(rows[row][col]))
+        if rows[pivot][col] == 0.0:
+            if reduce:
+                raise ZeroDivisionError(f"{name}(): matrix is singular")
+            return 0.0
+        if pivot != col:
+            rows[col], rows[pivot] = rows[pivot], rows[col]
+            determinant = -determinant
+        top = rows[col]
+        determinant *= top[col]
+        # Columns left of 'col' are already zero below (and, reducing, above) the diagonal
+        tail = memoryview(top)[col:]
+        for row in range(col + 1 if not reduce else 0, size):
+            if row == col:
+                continue
+            values = rows[row]
+            factor = values[col] / top[col]
+            if factor:
+                values[col:] = array("d", map(operator.sub, memoryview(values)[col:],
+                                              map(operator.mul, tail, repeat(factor))))
+    if reduce:
+        for row in range(size):
+            rows[row] = array("d", map(operator.truediv, rows[row], repeat(rows[row][row])))
+    return determinant
+
+
+def _augmented(matrix, extra, extra_cols):
+    """Rows of 'matrix' with the rows of 'extra' appended, as separate arrays."""
+    size = matrix.shape[0]
+    rows = []
+    for row in range(size):
+        values = matrix.data[row * size:(row + 1) * size]
+        values.extend(extra[row * extra_cols:(row + 1) * extra_cols])
+        rows.append(values)
+    return rows
+
+
+def det(value):
+    """Determinant of a square matrix."""
+    size = _square(value, "det")
+    np = _numpy(size ** 3)
+    if np is not None:
+        return float(np.linalg.det(value._view(np)))
+    return _eliminate(_augmented(value, array("d"), 0), size, "det")
+
+
+def solve(matrix, rhs):
+    """x with matrix @ x == rhs, for a vector or matrix right-hand side."""
+    size = _square(matrix, "solve")
+    _matrix_argument(rhs, "solve")
+    if rhs.shape[0] != size:
+        raise ValueError(f"shapes {matrix.shape} and {rhs.shape} are not aligned")
+    np = _numpy(size ** 3)
+    if np is not None:
+        return Matrix._from_numpy(np.linalg.solve(matrix._view(np), rhs._view(np)))
+    extra_cols = rhs.shape[1] if len(rhs.shape) == 2 else 1
+    rows = _augmented(matrix, rhs.data, extra_cols)
+    _eliminate(rows, size, "solve", reduce=True)
+    data = array("d")
+    for row in rows:
+        data.extend(row[size:])
+    return Matrix(rhs.shape, data)
+
+
+def inv(value):
+    """Inverse of a square matrix."""
+    size = _square(value, "inv")
+    np = _numpy(size ** 3)
+    if np is not None:
+        return Matrix._from_numpy(np.linalg.inv(value._view(np)))
+    identity = array("d", bytes(8 * size * size))
+    identity[::size + 1] = array("d", repeat(1.0, size))
+    return solve(value, Matrix((size, size), identity))
+
+
+# Names added to the calculator's whitelist
+MATRIX_FUNCTIONS = {
+    "dot": dot,
+    "matmul": matmul,
+    "transpose": transpose,
+    "det": det,
+    "inv": inv,
+    "solve": solve,
+}
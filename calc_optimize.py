@@ -0,0 +1,281 @@
+"""
+Compile-time optimization of calculator expressions.
+
+The calculator builds expressions by wrapping what is already on the display:
+x² turns 'expr' into '(expr)**2', +/- turns it into '-(expr)', and macros
+paste the same pieces again and again. Two passes run over the checked and
+rewritten tree before the engine compiles it:
+
+- fold_constants() evaluates every subtree that does not depend on a
+  variable and puts its value in its place. Calls to pure functions (sin,
+  sqrt, the '**' and '*' guards, ...) are memoized by function and argument
+  values in a cache the engine shares between expressions, so pressing x²
+  again only computes the one new square.
+- eliminate_common_subexpressions() hashes what is left bottom up and
+  computes each distinct subtree once: the first occurrence is bound to a
+  temporary with ':=' and later ones read the temporary.
+
+An expression then costs time in proportion to its distinct
+subexpressions rather than to its length.
+"""
+import ast
+import numbers
+import operator
+from decimal import Decimal
+
+from calc_budget import BudgetExceeded
+
+# Number of memoized pure calls kept per engine
+FOLD_CACHE_SIZE = 4096
+
+# Folded integers and fractions larger than this stay in the code, so the
+# compile cache never holds on to huge numbers
+FOLD_MAX_BITS = 1 << 16
+
+_UNARY = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+_BINARY = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+           ast.Div: operator.truediv, ast.FloorDiv: operator.floordiv,
+           ast.Mod: operator.mod, ast.Pow: operator.pow}
+
+# Values that compile() accepts in an ast.Constant
+_PLAIN_TYPES = (int, float, complex)
+
+# Fields holding subexpressions, for each node type a checked tree can contain
+_EXPRESSION_FIELDS = {
+    ast.Expression: ("body",), ast.BinOp: ("left", "right"), ast.UnaryOp: ("operand",),
+    ast.Call: ("func", "args"), ast.Attribute: ("value",), ast.NamedExpr: ("value",),
+    ast.Constant: (), ast.Name: (),
+}
+
+_UNKNOWN = object()
+
+
+def _children(node):
+    """(field, index, child) for each expression directly below 'node'."""
+    for field in _EXPRESSION_FIELDS[type(node)]:
+        value = getattr(node, field)
+        if type(value) is list:
+            for index, item in enumerate(value):
+                yield field, index, item
+        else:
+            yield field, None, value
+
+
+def _replace(parent, field, index, node):
+    if index is None:
+        setattr(parent, field, node)
+    else:
+        getattr(parent, field)[index] = node
+
+
+def _postorder(tree):
+    """Every expression node of 'tree', children before their parent."""
+    stack = [(tree, False)]
+    while stack:
+        node, ready = stack.pop()
+        fields = _EXPRESSION_FIELDS[type(node)]
+        if ready or not fields:
+            yield node
+            continue
+        stack.append((node, True))
+        for field in fields:
+            value = getattr(node, field)
+            if type(value) is list:
+                stack.extend([(child, False) for child in value])
+            else:
+                stack.append((value, False))
+
+
+def value_key(value):
+    """Hashable key telling apart values that compare equal but behave differently.
+
+    0.0 == -0.0 and Decimal('1') == Decimal('1.0'), but atan2() and the
+    display treat them differently.
+    """
+    if isinstance(value, float):
+        return type(value), value.hex()
+    if isinstance(value, complex):
+        return type(value), value.real.hex(), value.imag.hex()
+    if isinstance(value, Decimal):
+        return Decimal, str(value)
+    return type(value), value
+
+
+def _is_number(value):
+    if type(value) in _PLAIN_TYPES:
+        return True
+    return isinstance(value, numbers.Number) and not isinstance(value, bool)
+
+
+def _is_operand(value):
+    # Strings are the operator lists passed to the flattened-chain helpers
+    return _is_number(value) or type(value) is str
+
+
+def _too_big(value):
+    if isinstance(value, int):
+        return value.bit_length() > FOLD_MAX_BITS
+    if isinstance(value, numbers.Rational):
+        return max(value.numerator.bit_length(), value.denominator.bit_length()) > FOLD_MAX_BITS
+    return False
+
+
+# --- Constant Folding ---
+
+def fold_constants(tree, variables, namespace, cache, pure):
+    """Replace the constant subtrees of 'tree' with their values, in place.
+
+    Names resolve through 'namespace' unless they are 'variables'; only calls
+    to functions in 'pure' are evaluated, and their results are memoized in
+    'cache' (a ResultCache). A subtree whose evaluation fails is left alone,
+    so the error still happens when the expression is called.
+
+    Returns {name: value} for folded values that can't be written as a
+    Python constant (Decimal, Fraction, NumPy scalars); the caller adds them
+    to the expression's namespace.
+    """
+    known = {}  # id(node) -> value, for constant subtrees
+    bound = {}
+    for node in _postorder(tree):
+        value = _evaluate(node, known, variables, namespace, cache, pure)
+        if value is not _UNKNOWN:
+            known[id(node)] = value
+            continue
+        # 'node' isn't constant: its largest constant subtrees end here
+        for field, index, child in list(_children(node)):
+            value = known.get(id(child), _UNKNOWN)
+            if isinstance(child, (ast.Constant, ast.Name)) or not _is_number(value):
+                continue
+            if type(value) in _PLAIN_TYPES:
+                folded = ast.Constant(value=value)
+            else:
+                name = f"_f{len(bound)}"
+                bound[name] = value
+                folded = ast.Name(id=name, ctx=ast.Load())
+            _replace(node, field, index, ast.copy_location(folded, child))
+    return bound
+
+
+def _evaluate(node, known, variables, namespace, cache, pure):
+    """Value of 'node' if it is constant, given its children's values; else _UNKNOWN."""
+    kind = type(node)
+    if kind is ast.Constant:
+        return node.value
+    if kind is ast.Name:
+        if node.id in variables:
+            return _UNKNOWN
+        return namespace.get(node.id, _UNKNOWN)
+    if kind is ast.Attribute:
+        base = known.get(id(node.value), _UNKNOWN)
+        if base is _UNKNOWN or _is_operand(base):
+            return _UNKNOWN
+        return getattr(base, node.attr, _UNKNOWN)
+
+    if kind is ast.Call:
+        function, operands = known.get(id(node.func)), node.args
+    elif kind is ast.BinOp:
+        function, operands = _BINARY.get(type(node.op)), (node.left, node.right)
+    elif kind is ast.UnaryOp:
+        function, operands = _UNARY.get(type(node.op)), (node.operand,)
+    else:
+        return _UNKNOWN
+    args = []
+    for operand in operands:
+        value = known.get(id(operand), _UNKNOWN)
+        if value is _UNKNOWN or not _is_operand(value):
+            return _UNKNOWN
+        args.append(value)
+
+    if kind is not ast.Call:
+        # Plain operators are cheaper to redo than to look up
+        try:
+            result = function(*args)
+        except (ArithmeticError, ValueError, TypeError):
+            return _UNKNOWN
+        return _UNKNOWN if _too_big(result) else result
+
+    try:
+        if function not in pure:
+            return _UNKNOWN
+        key = (function, tuple(value_key(arg) for arg in args))
+        hash(key)
+    except TypeError:  # an unhashable function or argument
+        return _UNKNOWN
+    found, is_error, result = cache.get(key)
+    if found:
+        return _UNKNOWN if is_error else result
+    try:
+        result = function(*args)
+    except BudgetExceeded:
+        # Over budget, or out of time: not remembered, the limits may change
+        return _UNKNOWN
+    except (ArithmeticError, ValueError, TypeError):
+        cache.put(key, None, is_error=True)
+        return _UNKNOWN
+    if not _is_operand(result) or _too_big(result):
+        return _UNKNOWN
+    cache.put(key, result)
+    return result
+
+
+# --- Common Subexpressions ---
+
+def _shape(node, ids):
+    """Structural key of 'node', given the ids of its children."""
+    kind = type(node)
+    if kind is ast.Constant:
+        return (kind,) + value_key(node.value)
+    if kind is ast.Name:
+        return kind, node.id
+    if kind is ast.Attribute:
+        return kind, ids[id(node.value)], node.attr
+    children = []
+    for field in _EXPRESSION_FIELDS[kind]:
+        value = getattr(node, field)
+        if type(value) is list:
+            children.extend([ids[id(child)] for child in value])
+        else:
+            children.append(ids[id(value)])
+    return kind, type(getattr(node, "op", None)), tuple(children)
+
+
+def eliminate_common_subexpressions(tree):
+    """Compute each repeated subtree of 'tree' once, binding it to _t0, _t1, ...
+
+    Returns the number of temporaries introduced.
+    """
+    if isinstance(tree.body, (ast.Constant, ast.Name)):
+        return 0
+    # Hash-cons bottom up: equal subtrees get equal ids, in linear time
+    ids, table = {}, {}
+    for node in _postorder(tree):
+        ids[id(node)] = table.setdefault(_shape(node, ids), len(table))
+
+    # Top down, in evaluation order: a repeat is not searched any further,
+    # so subtrees repeated only inside it don't need temporaries of their own
+    first = {}  # shape id -> (parent, field, index, node) of its first occurrence
+    repeats = []
+    stack = [(tree, "body", None, tree.body)]
+    while stack:
+        parent, field, index, node = stack.pop()
+        if isinstance(node, (ast.Constant, ast.Name, ast.Attribute)):
+            continue
+        shape = ids[id(node)]
+        if shape in first:
+            repeats.append((parent, field, index, node, shape))
+            continue
+        first[shape] = (parent, field, index, node)
+        stack.extend((node, child_field, child_index, child) for child_field, child_index, child
+                     in reversed(list(_children(node))))
+
+    names = {}
+    for parent, field, index, node, shape in repeats:
+        name = names.setdefault(shape, f"_t{len(names)}")
+        _replace(parent, field, index,
+                 ast.copy_location(ast.Name(id=name, ctx=ast.Load()), node))
+    for shape, name in names.items():
+        parent, field, index, node = first[shape]
+        target = ast.copy_location(ast.Name(id=name, ctx=ast.Store()), node)
+        _replace(parent, field, index,
+                 ast.copy_location(ast.NamedExpr(target=target, value=node), node))
+    return len(names)
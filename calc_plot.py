@@ -0,0 +1,346 @@
+"""
+Function plotting for PyCalc-Tk.
+
+Plots y = f(x) for any calculator expression in 'x', using the engine's
+whitelist and its NumPy-vectorized evaluation (CalcEngine.evaluate_array),
+on a Canvas that takes the place of the display labels.
+
+Sampling works in tiles. The x axis is cut into tiles whose width is a power
+of two, about TILES_PER_VIEW of them across the view. Each tile is sampled
+on its own and cached:
+
+- Panning only samples the tiles that scroll into view.
+- Zooming only samples anything when the tile width changes level. Zooming
+  back to an earlier level finds its tiles still in the cache.
+
+Within a tile, sampling is adaptive. It starts on a uniform grid, then
+repeatedly bisects, in one vectorized pass each time, the segments that are
+much steeper than the rest of the tile or that cross the edge of the
+function's domain.
+
+Drawing never hands Tk more than four points per pixel column (first, min,
+max and last of each column). Each continuous run of the curve is one
+canvas line item whose coordinates are replaced in place on every frame, so
+a 100k-sample curve redraws as fast as a 1k one. Plotting needs NumPy.
+"""
+import math
+from collections import OrderedDict
+
+from calc_engine import load_numpy
+from calc_ui import tk
+
+# Tiles across the view; the tile width is the power of two nearest view/TILES_PER_VIEW
+TILES_PER_VIEW = 8
+# Uniform samples per tile before refinement
+SAMPLES_PER_TILE = 512
+# Bisection passes per tile; each can at most double the samples
+REFINE_PASSES = 4
+# Segments this many times steeper than the tile's median are bisected
+STEEP_FACTOR = 8.0
+# Tiles kept per curve
+TILE_CACHE_SIZE = 512
+
+# Initial view
+DEFAULT_X_RANGE = (-10.0, 10.0)
+# Zoom factor per mouse-wheel step
+ZOOM_STEP = 1.25
+
+
+class PlotError(ValueError):
+    """Raised when an expression can't be plotted."""
+
+
+class CurveSampler:
+    """Samples y = f(x) for one expression, tile by tile, with a cache of tiles."""
+
+    def __init__(self, engine, expression, samples_per_tile=SAMPLES_PER_TILE,
+                 cache_size=TILE_CACHE_SIZE):
+        self.np = load_numpy()
+        if self.np is None:
+            raise PlotError("plotting needs NumPy")
+        self.engine = engine
+        self.expression = expression
+        self.samples_per_tile = samples_per_tile
+        self.cache_size = cache_size
+        self.sampled = 0  # tiles computed (not served from the cache)
+        self._tiles = OrderedDict()
+        # Fail now, with the expression's own error, rather than on every frame
+        try:
+            self._evaluate(self.np.zeros(1))
+        except Exception as exc:
+            raise PlotError(str(exc) or type(exc).__name__) from exc
+
+    def _evaluate(self, xs):
+        return self.engine.evaluate_array(self.expression, xs)
+
+    @staticmethod
+    def tile_level(width):
+        """The tile width, as a power of two, used for a view 'width' wide."""
+        return math.floor(math.log2(width / TILES_PER_VIEW))
+
+    def tile(self, level, index):
+        """(xs, ys) for tile 'index' at 'level', from the cache when possible."""
+        key = (level, index)
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+            return tile
+        tile = self._sample_tile(level, index)
+        self.sampled += 1
+        self._tiles[key] = tile
+        if len(self._tiles) > self.cache_size:
+            self._tiles.popitem(last=False)
+        return tile
+
+    def _sample_tile(self, level, index):
+        np = self.np
+        size = 2.0 ** level
+        xs = np.linspace(index * size, (index + 1) * size, self.samples_per_tile + 1)
+        ys = self._evaluate(xs)
+        for _ in range(REFINE_PASSES):
+            finite = np.isfinite(ys)
+            # Where the domain starts or ends (sqrt, log10, ...)
+            refine = finite[:-1] != finite[1:]
+            steps = np.abs(np.diff(ys))
+            measured = np.isfinite(steps)
+            if measured.any():
+                typical = np.median(steps[measured])
+                refine |= measured & (steps > STEEP_FACTOR * typical) & (steps > 0)
+            where = np.flatnonzero(refine)
+            if not where.size:
+                break
+            middles = (xs[where] + xs[where + 1]) / 2
+            xs = np.insert(xs, where + 1, middles)
+            ys = np.insert(ys, where + 1, self._evaluate(middles))
+        return xs, ys
+
+    def samples(self, x0, x1):
+        """All samples covering x0..x1 (sorted by x), at the level for that width."""
+        np = self.np
+        level = self.tile_level(x1 - x0)
+        size = 2.0 ** level
+        tiles = [self.tile(level, index)
+                 for index in range(math.floor(x0 / size), math.floor(x1 / size) + 1)]
+        xs = np.concatenate([tile[0] for tile in tiles])
+        ys = np.concatenate([tile[1] for tile in tiles])
+        # Trim to the view, keeping one point either side so lines reach the edges
+        start = max(0, int(np.searchsorted(xs, x0)) - 1)
+        stop = int(np.searchsorted(xs, x1, side="right")) + 1
+        return xs[start:stop], ys[start:stop]
+
+
+def decimate(np, px, py):
+    """Reduce a polyline to at most four points per pixel column.
+
+    Keeps each column's first, lowest, highest and last point (the extremes
+    in the order the curve visits them), which draws the same pixels.
+    """
+    columns = np.floor(px).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+    if len(starts) * 4 >= len(px):
+        return px, py
+    ends = np.r_[starts[1:], len(px)] - 1
+    low = np.minimum.reduceat(py, starts)
+    high = np.maximum.reduceat(py, starts)
+    first, last = py[starts], py[ends]
+    rising = last >= first
+    centres = columns[starts] + 0.5
+    out_x = np.stack([px[starts], centres, centres, px[ends]], axis=1).ravel()
+    out_y = np.stack([first, np.where(rising, low, high), np.where(rising, high, low), last],
+                     axis=1).ravel()
+    return out_x, out_y
+
+
+def curve_runs(np, px, py, height):
+    """Split a curve into continuous runs of canvas coordinates.
+
+    A run ends at undefined points and at jumps across the whole view (the
+    two sides of an asymptote such as tan's). Each run is returned as a flat
+    [x0, y0, x1, y1, ...] list, decimated and clipped near the canvas.
+    """
+    finite = np.isfinite(py)
+    above, below = py < -height, py > 2 * height
+    jump = (above[:-1] & below[1:]) | (below[:-1] & above[1:])
+    # Run boundaries: starts where a finite point follows a break, ends before one
+    opens = finite & np.r_[True, ~finite[:-1] | jump]
+    closes = finite & np.r_[~finite[1:] | jump, True]
+    runs = []
+    for start, stop in zip(np.flatnonzero(opens), np.flatnonzero(closes) + 1):
+        if stop - start < 2:
+            continue
+        run_x, run_y = decimate(np, px[start:stop], np.clip(py[start:stop], -height, 2 * height))
+        coordinates = np.empty(2 * len(run_x))
+        coordinates[0::2] = run_x
+        coordinates[1::2] = run_y
+        runs.append(coordinates.tolist())
+    return runs
+
+
+class PlotView:
+    """A Canvas showing y = f(x) in place of the calculator's display labels.
+
+    Drag to pan, use the mouse wheel to zoom around the pointer. Redraws are
+    coalesced with after_idle, so a burst of motion events draws one frame.
+    """
+
+    def __init__(self, master, engine, replaces=(), bg="#282c34", fg="#abb2bf",
+                 line="#e06c75", width=480, height=200):
+        self.master = master
+        self.engine = engine
+        self.replaces = tuple(replaces)  # widgets hidden while the plot is shown
+        self.fg = fg
+        self.line = line
+        self.visible = False
+        self.sampler = None
+        self.x0, self.x1 = DEFAULT_X_RANGE
+        self.y0, self.y1 = DEFAULT_X_RANGE
+        self.points = 0  # samples behind the last frame
+        self.drawn = 0  # points handed to Tk in the last frame
+        self._message = ""
+        self._drag = None
+        self._draw_id = None
+        self._lines = []  # one canvas line per continuous run, reused between frames
+
+        self.canvas = tk.Canvas(master, bg=bg, width=width, height=height, highlightthickness=0)
+        self._x_axis = self.canvas.create_line(0, 0, 0, 0, fill=fg)
+        self._y_axis = self.canvas.create_line(0, 0, 0, 0, fill=fg)
+        self._status = self.canvas.create_text(6, 6, anchor=tk.NW, fill=fg, text="")
+        self.canvas.bind("<ButtonPress-1>", self._on_press)
+        self.canvas.bind("<B1-Motion>", self._on_drag)
+        self.canvas.bind("<MouseWheel>", self._on_wheel)
+        self.canvas.bind("<Button-4>", lambda event: self.zoom(1 / ZOOM_STEP, event.x, event.y))
+        self.canvas.bind("<Button-5>", lambda event: self.zoom(ZOOM_STEP, event.x, event.y))
+        self.canvas.bind("<Configure>", lambda event: self.schedule_draw())
+
+    # --- Showing ---
+
+    def show(self, expression):
+        """Plot 'expression' (in x) over the default view, replacing the labels."""
+        self.x0, self.x1 = DEFAULT_X_RANGE
+        try:
+            self.sampler = CurveSampler(self.engine, expression)
+        except PlotError as exc:
+            self.sampler = None
+            self._message = f"Can't plot: {exc}"
+        else:
+            self._message = f"y = {expression}"
+            self.fit_y()
+        if not self.visible:
+            for widget in self.replaces:
+                widget.pack_forget()
+            self.canvas.pack(expand=True, fill="both")
+            self.visible = True
+        self.draw()
+
+    def hide(self):
+        """Put the labels back."""
+        if self._draw_id is not None:
+            self.master.after_cancel(self._draw_id)
+            self._draw_id = None
+        self.canvas.pack_forget()
+        for widget in self.replaces:
+            widget.pack(expand=True, fill="both")
+        self.visible = False
+
+    def fit_y(self):
+        """Choose the y range to fit most of the curve in the current x range."""
+        np = self.sampler.np
+        _, ys = self.sampler.samples(self.x0, self.x1)
+        ys = ys[np.isfinite(ys)]
+        if ys.size:
+            # Percentiles, so an asymptote doesn't flatten the rest of the curve
+            low, high = np.percentile(ys, [2, 98])
+        else:
+            low = high = 0.0
+        if high - low < 1e-9:
+            low, high = low - 1.0, high + 1.0
+        margin = (high - low) * 0.1
+        self.y0, self.y1 = float(low - margin), float(high + margin)
+
+    # --- Interaction ---
+
+    def pan(self, dx, dy):
+        """Move the view by (dx, dy) pixels."""
+        width, height = self._size()
+        shift_x = dx * (self.x1 - self.x0) / width
+        shift_y = dy * (self.y1 - self.y0) / height
+        self.x0 -= shift_x
+        self.x1 -= shift_x
+        self.y0 += shift_y
+        self.y1 += shift_y
+        self.schedule_draw()
+
+    def zoom(self, factor, px=None, py=None):
+        """Scale the view by 'factor' (< 1 zooms in) around pixel (px, py)."""
+        width, height = self._size()
+        px = width / 2 if px is None else px
+        py = height / 2 if py is None else py
+        x = self.x0 + px * (self.x1 - self.x0) / width
+        y = self.y1 - py * (self.y1 - self.y0) / height
+        self.x0, self.x1 = x + (self.x0 - x) * factor, x + (self.x1 - x) * factor
+        self.y0, self.y1 = y + (self.y0 - y) * factor, y + (self.y1 - y) * factor
+        self.schedule_draw()
+
+    def _on_press(self, event):
+        self._drag = (event.x, event.y)
+
+    def _on_drag(self, event):
+        if self._drag is not None:
+            self.pan(event.x - self._drag[0], event.y - self._drag[1])
+            self._drag = (event.x, event.y)
+
+    def _on_wheel(self, event):
+        self.zoom(1 / ZOOM_STEP if event.delta > 0 else ZOOM_STEP, event.x, event.y)
+
+    # --- Drawing ---
+
+    def _size(self):
+        width, height = self.canvas.winfo_width(), self.canvas.winfo_height()
+        if not width or width <= 1:
+            # Not laid out yet: use the requested size
+            width, height = int(self.canvas.cget("width")), int(self.canvas.cget("height"))
+        return width, height
+
+    def schedule_draw(self):
+        if self.visible and self._draw_id is None:
+            self._draw_id = self.master.after_idle(self.draw)
+
+    def draw(self):
+        """Draw the current view now."""
+        self._draw_id = None
+        width, height = self._size()
+        runs = []
+        self.points = 0
+        if self.sampler is not None:
+            np = self.sampler.np
+            xs, ys = self.sampler.samples(self.x0, self.x1)
+            px = (xs - self.x0) * (width / (self.x1 - self.x0))
+            py = (self.y1 - ys) * (height / (self.y1 - self.y0))
+            runs = curve_runs(np, px, py, height)
+            self.points = len(xs)
+        self.drawn = sum(len(run) for run in runs) // 2
+        self._draw_axes(width, height)
+        self._draw_runs(runs)
+        self.canvas.itemconfigure(
+            self._status, text=f"{self._message}    x {self.x0:.4g} … {self.x1:.4g}    "
+                               f"y {self.y0:.4g} … {self.y1:.4g}")
+
+    def _draw_axes(self, width, height):
+        # Axes sit at x = 0 / y = 0, or are parked off-canvas when out of view
+        row = self.y1 * height / (self.y1 - self.y0)
+        column = -self.x0 * width / (self.x1 - self.x0)
+        row = row if 0 <= row <= height else -10
+        column = column if 0 <= column <= width else -10
+        self.canvas.coords(self._x_axis, 0, row, width, row)
+        self.canvas.coords(self._y_axis, column, 0, column, height)
+
+    def _draw_runs(self, runs):
+        for index, coordinates in enumerate(runs):
+            if index < len(self._lines):
+                self.canvas.coords(self._lines[index], coordinates)
+            else:
+                self._lines.append(self.canvas.create_line(coordinates, fill=self.line,
+                                                           width=2))
+        for item in self._lines[len(runs):]:
+            self.canvas.delete(item)
+        del self._lines[len(runs):]
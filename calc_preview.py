@@ -0,0 +1,150 @@
+"""
+Live result preview for PyCalc-Tk.
+
+Shows what '=' would produce while the user is still typing. Keystrokes are
+debounced with master.after, and evaluation runs on a single background
+thread (or the worker pool of calc_shared panes) so an expensive
+expression never blocks the Tk mainloop. A newer keystroke cancels the job
+in progress: the engine's guards stop it at their next check, so the worker
+is soon free for the new one.
+
+Typing digits only changes the trailing number of the expression, so the
+preview compiles "everything before the number" once as a function of that
+number and just calls it again with each new value, instead of re-parsing
+the whole string on every keystroke.
+"""
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from calc_engine import CalcEngine, format_result, prepare_expression
+
+# Quiet period after the last keystroke before the preview is computed
+PREVIEW_DELAY_MS = 120
+# How often the Tk thread checks whether a background job has finished
+POLL_INTERVAL_MS = 15
+
+# Name standing in for the trailing number in a compiled preview template
+TAIL_NAME = "_tail"
+_TRAILING_NUMBER_RE = re.compile(r"(?<![\w.])(\d+\.?\d*|\.\d+)$")
+
+
+def _parse_number(text):
+    """Parse a trailing literal the way Python source would (int or float)."""
+    return int(text) if text.isdigit() else float(text)
+
+
+class LivePreview:
+    """Debounced, cancellable background evaluation feeding a preview callback."""
+
+    def __init__(self, master, names, on_update, delay_ms=PREVIEW_DELAY_MS, engine=None,
+                 executor=None):
+        self.master = master
+        self.shared = executor is not None
+        if self.shared:
+            # The pane's own engine, in the shared worker pool (see calc_shared)
+            self.engine = engine
+            self._executor = executor
+        else:
+            # A private engine: only the worker thread ever touches it
+            self.engine = CalcEngine(names)
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="calc-preview")
+        self.on_update = on_update
+        self.delay_ms = delay_ms
+        self._after_id = None
+        self._poll_id = None
+        self._future = None
+        self._cancelled = None  # set to stop the running job
+        self._text = ""
+        # User definitions for the worker's engine, and the ones it last applied
+        self._symbols = ()
+        self._applied = ()
+
+    def schedule(self, expression):
+        """Request a preview of 'expression'; called on every keystroke.
+
+        'expression' may also be a function returning the text. It is called
+        only when the delay expires, so fast typing never builds the string.
+        """
+        self.cancel()
+        if not expression:
+            self._show("")
+            return
+        self._after_id = self.master.after(self.delay_ms, self._start, expression)
+
+    def set_symbols(self, definitions):
+        """Use these user definitions (SymbolTable.definitions()) in later previews."""
+        if self.shared:
+            return  # the pane's engine already has them
+        self._symbols = tuple(definitions)
+
+    def cancel(self):
+        """Drop any pending or running preview job."""
+        if self._after_id is not None:
+            self.master.after_cancel(self._after_id)
+            self._after_id = None
+        if self._future is not None:
+            # A job that already started stops at the engine's next check
+            self._future.cancel()
+            self._cancelled.set()
+            self._future = None
+
+    def clear(self):
+        """Cancel any work and blank the preview."""
+        self.cancel()
+        self._show("")
+
+    def _start(self, expression):
+        """Hand the expression to the worker thread and start polling for it."""
+        self._after_id = None
+        if callable(expression):
+            expression = expression()
+        self._cancelled = threading.Event()
+        self._future = self._executor.submit(self._compute, expression, self._cancelled)
+        if self._poll_id is None:
+            self._poll_id = self.master.after(POLL_INTERVAL_MS, self._poll)
+
+    def _poll(self):
+        """Deliver a finished result on the Tk thread."""
+        self._poll_id = None
+        future = self._future
+        if future is None:
+            return
+        if not future.done():
+            self._poll_id = self.master.after(POLL_INTERVAL_MS, self._poll)
+            return
+        self._future = None
+        if not future.cancelled():
+            self._show(future.result())
+
+    def _show(self, text):
+        if text != self._text:
+            self._text = text
+            self.on_update(text)
+
+    # --- Worker Thread ---
+
+    def _compute(self, expression, cancelled):
+        """Return the preview text for 'expression' ('' when there is nothing to show)."""
+        symbols = self._symbols
+        if symbols is not self._applied:
+            self.engine.symbols.sync(symbols)
+            self._applied = symbols
+        try:
+            with self.engine.guard.cancellable(cancelled):
+                function, args = self._compile_incremental(expression)
+                text = format_result(self.engine.call(function, *args))
+        except Exception:
+            return ""
+        # A bare number previews as itself; don't repeat it
+        return "" if text == expression.strip() else text
+
+    def _compile_incremental(self, expression):
+        """Compile the expression with its trailing number lifted out as an argument."""
+        match = _TRAILING_NUMBER_RE.search(expression)
+        # Literals such as '007' are invalid source, so let the full parse report them
+        if match and not (len(match.group()) > 1 and match.group().startswith("0")
+                          and match.group()[1].isdigit()):
+            template = prepare_expression(expression[:match.start()] + TAIL_NAME)
+            return self.engine.compile(template, (TAIL_NAME,)), (_parse_number(match.group()),)
+        return self.engine.compile(prepare_expression(expression)), ()
@@ -0,0 +1,273 @@
+"""
+Hot-path profiling for PyCalc-Tk.
+
+Tells whether a slow response comes from evaluation, string handling or Tk
+redraws. Timings are taken per stage:
+
+    evaluate      '=' in the calculator, start to finish
+    calculate     CalcEngine.calculate(), which is split into:
+      rewrite       display text to source ('π', 'log', parentheses) and cache key
+      compile       parse, check, fold and compile (a dict lookup when cached)
+      execute       running the compiled expression
+      format        the result as display text
+    redraw        one RenderScheduler flush: the label texts update_label()
+                  and friends asked for, and their config() calls
+    key_handler   the calculator's bindings for one key event
+    key_to_paint  a key event until the redraw that shows it
+
+- Profiler keeps the last RING_SIZE timings of each stage in a ring buffer
+  (one preallocated array('d'), nothing allocated per sample), along with
+  lifetime count, total, maximum and a histogram of power-of-two
+  microsecond buckets. Counters count events such as result-cache hits.
+- The engine and the RenderScheduler time themselves only while a profiler
+  is attached (attach()). Detached, which is the default, the cost is one
+  'is None' test per call, and key events go through no extra bindings.
+- ProfileOverlay draws a live summary over the calculator display ('p' in
+  the calculators). Showing it attaches a profiler.
+- PYCALC_PROFILE=path profiles from startup and writes report() as one JSON
+  line to the file when the calculator exits ('-' for stderr).
+"""
+import atexit
+import json
+import os
+import sys
+import time
+from array import array
+
+from calc_ui import tk
+
+# Environment variable naming where to write the report ('-' = stderr)
+PROFILE_ENV = "PYCALC_PROFILE"
+
+# Timings kept per stage for the percentiles
+RING_SIZE = 1024
+
+# Histogram buckets: under 1 µs, then [2**(i-1), 2**i) µs; the last one is open
+HISTOGRAM_BUCKETS = 24
+
+# Stages in the order the overlay and report list them
+STAGES = ("evaluate", "calculate", "rewrite", "compile", "execute", "format",
+          "redraw", "key_handler", "key_to_paint")
+
+# Bind tags put around a window's own while key events are timed
+KEY_START_TAG = "CalcProfileStart"
+KEY_END_TAG = "CalcProfileEnd"
+
+# Overlay refresh interval
+REFRESH_MS = 500
+
+
+class Timings:
+    """Timings of one stage: a ring of recent samples and lifetime aggregates."""
+
+    __slots__ = ("samples", "count", "total", "max", "buckets")
+
+    def __init__(self, capacity=RING_SIZE):
+        self.samples = array("d", bytes(8 * capacity))
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+
+    def add(self, seconds):
+        count = self.count
+        self.samples[count % len(self.samples)] = seconds
+        self.count = count + 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        bucket = int(seconds * 1e6).bit_length()
+        self.buckets[bucket if bucket < HISTOGRAM_BUCKETS else HISTOGRAM_BUCKETS - 1] += 1
+
+    def recent(self):
+        """The samples still in the ring, sorted."""
+        return sorted(self.samples[:min(self.count, len(self.samples))])
+
+    def percentile(self, fraction, recent=None):
+        """Nearest-rank percentile of the recent samples, in seconds."""
+        recent = self.recent() if recent is None else recent
+        if not recent:
+            return 0.0
+        return recent[min(len(recent) - 1, int(fraction * len(recent)))]
+
+    def summary(self):
+        recent = self.recent()
+        histogram = []
+        for bucket, count in enumerate(self.buckets):
+            if count:
+                upper = 1 << bucket if bucket < HISTOGRAM_BUCKETS - 1 else None
+                histogram.append([upper, count])
+        return {
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 3),
+            "mean_ms": round(self.total / self.count * 1000, 4) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 4),
+            "p50_ms": round(self.percentile(0.50, recent) * 1000, 4),
+            "p95_ms": round(self.percentile(0.95, recent) * 1000, 4),
+            "p99_ms": round(self.percentile(0.99, recent) * 1000, 4),
+            # [upper bound in µs (None = no bound), count] for non-empty buckets
+            "histogram_us": histogram,
+        }
+
+
+class Profiler:
+    """Stage timings and event counters for one calculator."""
+
+    def __init__(self, variant=None, capacity=RING_SIZE, path=None):
+        self.variant = variant
+        self.capacity = capacity
+        self.path = path  # where the report is written at exit, if anywhere
+        self.clock = time.perf_counter
+        self.started = self.clock()
+        self.timings = {}  # stage -> Timings
+        self.counters = {}
+        self.on_paint = None  # called after each timed redraw (the overlay)
+        self._key_started = None  # the oldest key event not yet on screen
+        self._handler_started = None
+        self._renderer = None
+
+    def record(self, stage, seconds):
+        """Add one timing of 'stage'."""
+        timings = self.timings.get(stage)
+        if timings is None:
+            timings = self.timings[stage] = Timings(self.capacity)
+        timings.add(seconds)
+
+    def count(self, counter, amount=1):
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def reset(self):
+        """Forget every timing and counter."""
+        self.timings.clear()
+        self.counters.clear()
+        self.started = self.clock()
+
+    # --- Key Events ---
+
+    def _key_start(self, event):
+        now = self._handler_started = self.clock()
+        # Keys handled while a redraw is already pending are shown by that
+        # same redraw, so the oldest of them is the one to time
+        if self._key_started is None or not self._renderer.pending:
+            self._key_started = now
+
+    def _key_end(self, event):
+        if self._handler_started is not None:
+            self.record("key_handler", self.clock() - self._handler_started)
+            self._handler_started = None
+
+    def painted(self):
+        """Called by the RenderScheduler after each redraw."""
+        if self._key_started is not None:
+            self.record("key_to_paint", self.clock() - self._key_started)
+            self._key_started = None
+        if self.on_paint is not None:
+            self.on_paint()
+
+    # --- Reporting ---
+
+    def report(self):
+        """Everything recorded so far, as a JSON-ready dict."""
+        stages = [stage for stage in STAGES if stage in self.timings]
+        stages += sorted(set(self.timings) - set(STAGES))
+        return {
+            "variant": self.variant,
+            "uptime_s": round(self.clock() - self.started, 3),
+            "ring_size": self.capacity,
+            "stages": {stage: self.timings[stage].summary() for stage in stages},
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+    def write(self, path="-"):
+        """Append report() as one JSON line to 'path' ('-' = stderr)."""
+        text = json.dumps(self.report(), sort_keys=True)
+        if path == "-":
+            print(text, file=sys.stderr)
+        else:
+            with open(path, "a", encoding="utf-8") as handle:
+                handle.write(text + "\n")
+
+    def lines(self):
+        """The overlay text: recent p50/p95 and maximum per stage, in milliseconds."""
+        lines = [f"{'stage':<13}{'n':>6}{'p50':>8}{'p95':>8}{'max':>8}"]
+        for stage in STAGES:
+            timings = self.timings.get(stage)
+            if timings is None:
+                continue
+            recent = timings.recent()
+            lines.append(f"{stage:<13}{timings.count:>6}"
+                         f"{timings.percentile(0.50, recent) * 1000:>8.3f}"
+                         f"{timings.percentile(0.95, recent) * 1000:>8.3f}"
+                         f"{timings.max * 1000:>8.3f}")
+        for counter, value in sorted(self.counters.items()):
+            lines.append(f"{counter:<27}{value:>6}")
+        return lines
+
+
+def attach(profiler, master, engine, renderer):
+    """Time 'engine', 'renderer' and the key events of 'master' with 'profiler'.
+
+    attach(None, ...) stops timing them.
+    """
+    tags = tuple(tag for tag in master.bindtags() if tag not in (KEY_START_TAG, KEY_END_TAG))
+    engine.profiler = renderer.profiler = profiler
+    if profiler is None:
+        master.bindtags(tags)
+        return
+    profiler._renderer = renderer
+    master.bind_class(KEY_START_TAG, "<KeyPress>", profiler._key_start)
+    master.bind_class(KEY_END_TAG, "<KeyPress>", profiler._key_end)
+    # The window's own bindings run between the two
+    master.bindtags((KEY_START_TAG,) + tags + (KEY_END_TAG,))
+
+
+def profiler_from_env(variant):
+    """A Profiler writing its report at exit if PYCALC_PROFILE is set, else None."""
+    path = os.environ.get(PROFILE_ENV)
+    if not path:
+        return None
+    profiler = Profiler(variant, path=path)
+    atexit.register(profiler.write, path)
+    return profiler
+
+
+class ProfileOverlay:
+    """A live Profiler summary drawn over the top of the calculator display.
+
+    The text is refreshed at most every REFRESH_MS, after a redraw, so an
+    idle calculator costs nothing.
+    """
+
+    def __init__(self, master, parent, bg="#282c34", fg="#abb2bf"):
+        self.master = master  # the root window, for scheduling
+        self.profiler = None
+        self.visible = False
+        self._refresh_id = None
+        self.label = tk.Label(parent, text="", anchor=tk.NW, justify=tk.LEFT,
+                              bg=bg, fg=fg, font=("Courier", 9))
+
+    def show(self, profiler):
+        """Show the timings of 'profiler', refreshed as it records."""
+        self.profiler = profiler
+        profiler.on_paint = self.schedule
+        self.label.place(x=0, y=0)
+        self.visible = True
+        self.refresh()
+
+    def hide(self):
+        if self._refresh_id is not None:
+            self.master.after_cancel(self._refresh_id)
+            self._refresh_id = None
+        if self.profiler is not None:
+            self.profiler.on_paint = None
+        self.label.place_forget()
+        self.visible = False
+
+    def schedule(self):
+        if self._refresh_id is None:
+            self._refresh_id = self.master.after(REFRESH_MS, self.refresh)
+
+    def refresh(self):
+        self._refresh_id = None
+        if self.visible:
+            self.label.config(text="\n".join(self.profiler.lines()))
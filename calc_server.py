@@ -0,0 +1,286 @@
+"""
+Local evaluation service for PyCalc-Tk.
+
+Serves the calculator's exact semantics (whitelist, 'π' handling, budgets and
+result formatting) over a localhost TCP port or a Unix socket, so other tools
+can use them without embedding Tk. Never imports tkinter.
+
+Protocol: one request per line, answered in order on the same connection.
+
+- A plain line is an expression; the reply is the result line, as '=' would
+  show it ("Error" / "Too complex" on failure).
+- A line starting with '{' is JSON: {"id": ..., "expr": "..."}. The reply is
+  {"id": ..., "result": "...", "ok": true|false}.
+
+Clients may pipeline: send many requests without waiting for replies. Each
+connection has at most max_pipeline requests in flight. Past that the server
+stops reading from it, so a fast client is slowed down by TCP flow control
+instead of growing server memory.
+
+Cached results are answered on the event loop. Everything else is collected
+into batches, split evenly over the workers of a process pool, and
+evaluated off the event loop, which keeps reading and answering cached
+requests meanwhile. A heavy expression still holds up the requests in its
+own batch and keeps its worker busy, for as long as the budget allows.
+
+Usage:
+    python calc_server.py --port 8765
+    python calc_server.py --unix /tmp/pycalc.sock --workers 4
+"""
+import argparse
+import asyncio
+import errno
+import json
+import multiprocessing
+import os
+import stat
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from calc_backends import BACKENDS, DEFAULT_PRECISION
+from calc_batch import ERROR_TEXT, evaluate_chunk, init_worker
+from calc_budget import BUDGET_ERROR_TEXT, EvalBudget
+from calc_engine import RESULT_CACHE_SIZE, ResultCache, normalize_expression
+
+# The service only ever listens on the loopback interface
+LOCALHOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Requests in flight per connection before the server stops reading from it
+MAX_PIPELINE = 64
+# Most expressions sent to a worker in one task
+MAX_BATCH = 256
+# Longest accepted request line, in bytes
+MAX_LINE = EvalBudget().max_length * 4 + 1024
+
+_FAILED = frozenset((ERROR_TEXT, BUDGET_ERROR_TEXT))
+
+
+class CalcServer:
+    """An asyncio server answering calculator requests."""
+
+    def __init__(self, workers=None, max_pipeline=MAX_PIPELINE, backend="float",
+                 precision=DEFAULT_PRECISION, cache_size=RESULT_CACHE_SIZE):
+        # workers=0 evaluates on a single background thread instead of processes
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pipeline = max_pipeline
+        self.backend = backend
+        self.precision = precision
+        self.cache = ResultCache(cache_size)
+        self.requests = 0
+        self.connections = 0
+        self._executor = None
+        self._batch = []  # (expression, future) waiting for the next worker task
+        self._servers = []
+        self._writers = set()  # open connections, closed on shutdown
+
+    # --- Lifecycle ---
+
+    def _pool(self):
+        if self._executor is None:
+            if self.workers:
+                # Spawned, not forked: a forked worker would inherit the open client
+                # sockets and keep them from closing
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn"),
+                    initializer=init_worker, initargs=(self.backend, self.precision))
+            else:
+                self._executor = ThreadPoolExecutor(1, initializer=init_worker,
+                                                    initargs=(self.backend, self.precision))
+        return self._executor
+
+    async def _warm_up(self):
+        # Start the workers before listening, so no client waits for a spawn
+        if self._executor is None:
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*(loop.run_in_executor(self._pool(), evaluate_chunk, [])
+                                   for _ in range(max(1, self.workers))))
+
+    async def start_tcp(self, port=DEFAULT_PORT):
+        """Listen on localhost:'port' (0 picks a free port). Returns the port."""
+        await self._warm_up()
+        server = await asyncio.start_server(self._handle, LOCALHOST, port, limit=MAX_LINE)
+        self._servers.append(server)
+        return server.sockets[0].getsockname()[1]
+
+    async def start_unix(self, path):
+        """Listen on the Unix socket 'path', replacing a stale socket (never any other file)."""
+        try:
+            mode = os.lstat(path).st_mode
+        except FileNotFoundError:
+            pass
+        else:
+            if not stat.S_ISSOCK(mode):
+                raise FileExistsError(errno.EEXIST, "not a socket, refusing to replace it", path)
+            os.unlink(path)
+        await self._warm_up()
+        server = await asyncio.start_unix_server(self._handle, path, limit=MAX_LINE)
+        self._servers.append(server)
+        return path
+
+    async def serve_forever(self):
+        await asyncio.gather(*(server.serve_forever() for server in self._servers))
+
+    async def close(self):
+        for server in self._servers:
+            server.close()
+        for writer in list(self._writers):
+            writer.close()
+        for server in self._servers:
+            await server.wait_closed()
+        self._servers.clear()
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.to_thread(executor.shutdown, cancel_futures=True)
+
+    # --- Evaluation ---
+
+    async def evaluate(self, expression):
+        """The display result for 'expression', from the cache or a worker."""
+        key = normalize_expression(expression)
+        found, _, value = self.cache.get(key)
+        if found:
+            return value
+        future = asyncio.get_running_loop().create_future()
+        if not self._batch:
+            # Everything queued during this loop iteration goes out as one task
+            asyncio.get_running_loop().call_soon(self._dispatch)
+        self._batch.append((expression, future))
+        value = await future
+        self.cache.put(key, value)
+        return value
+
+    def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        batch, self._batch = self._batch, []
+        # One task per worker, so a slow expression delays as few others as possible
+        size = min(MAX_BATCH, -(-len(batch) // max(1, self.workers)))
+        for start in range(0, len(batch), size):
+            chunk = batch[start:start + size]
+            try:
+                task = loop.run_in_executor(self._pool(), evaluate_chunk,
+                                            [expression for expression, _ in chunk])
+            except Exception as exc:
+                # No pool (e.g. shut down or broken): fail these requests, not the loop
+                task = loop.create_future()
+                task.set_exception(exc)
+            task.add_done_callback(lambda task, chunk=chunk: self._deliver(task, chunk))
+
+    @staticmethod
+    def _deliver(task, chunk):
+        if task.cancelled():
+            results = [ERROR_TEXT] * len(chunk)
+        elif task.exception() is not None:
+            # A worker died (e.g. out of memory); fail just these requests
+            results = [ERROR_TEXT] * len(chunk)
+        else:
+            results = task.result()
+        for (_, future), result in zip(chunk, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _reply(self, line):
+        """Evaluate one request line and return the encoded reply."""
+        self.requests += 1
+        if not line.startswith("{"):
+            return (await self.evaluate(line) + "\n").encode("utf-8")
+        try:
+            request = json.loads(line)
+            expression = request["expr"]
+            if not isinstance(expression, str):
+                raise TypeError("'expr' must be a string")
+        except (ValueError, KeyError, TypeError) as exc:
+            reply = {"id": None, "result": ERROR_TEXT, "ok": False,
+                     "error": f"bad request: {exc}"}
+        else:
+            result = await self.evaluate(expression)
+            reply = {"id": request.get("id"), "result": result, "ok": result not in _FAILED}
+        return (json.dumps(reply, ensure_ascii=False) + "\n").encode("utf-8")
+
+    # --- Connections ---
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        self._writers.add(writer)
+        # Replies waiting to be sent, in request order; its size bounds the pipeline
+        pending = asyncio.Queue(self.max_pipeline)
+        sender = asyncio.create_task(self._send(pending, writer))
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):
+                    # Over-long line or a reset connection: stop reading
+                    break
+                if not line:
+                    break
+                text = line.decode("utf-8", "replace").strip()
+                if text:
+                    # Blocks while max_pipeline replies are outstanding
+                    await pending.put(asyncio.ensure_future(self._reply(text)))
+        finally:
+            await pending.put(None)
+            await sender
+            self._writers.discard(writer)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    @staticmethod
+    async def _send(pending, writer):
+        connected = True
+        while True:
+            reply = await pending.get()
+            if reply is None:
+                return
+            if not connected:
+                reply.cancel()
+                continue
+            try:
+                writer.write(await reply)
+                await writer.drain()  # waits only when the client isn't keeping up
+            except ConnectionError:
+                connected = False
+
+
+async def _serve(args):
+    server = CalcServer(args.workers, args.max_pipeline, args.backend, args.precision)
+    if args.unix:
+        await server.start_unix(args.unix)
+        where = args.unix
+    else:
+        where = f"{LOCALHOST}:{await server.start_tcp(args.port)}"
+    print(f"calc_server: listening on {where}", file=sys.stderr)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve calculator evaluations on localhost.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help="TCP port on 127.0.0.1 (default %(default)s)")
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="worker processes (default one per CPU, 0 = one thread)")
+    parser.add_argument("--max-pipeline", type=int, default=MAX_PIPELINE,
+                        help="requests in flight per connection (default %(default)s)")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="float",
+                        help="numeric backend (default %(default)s)")
+    parser.add_argument("--precision", type=int, default=DEFAULT_PRECISION,
+                        help="significant digits for the decimal backend (default %(default)s)")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+    except FileExistsError as exc:
+        parser.error(str(exc))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,336 @@
+"""
+Recorded keypress sessions for PyCalc-Tk: a compact binary format and a
+headless replay engine for auditing.
+
+A session file is laid out as:
+
+    header        32 bytes: magic, version, record size, event count,
+                  string table offset, string count, calculator variant
+    events        event_count fixed-size records of 8 bytes:
+                  event code (u8), 3 pad bytes, string index (u32)
+    string table  u32 length + UTF-8 bytes for each interned string
+
+Every text argument (digits, operators, tokens such as 'sqrt(', and the
+result each '=' produced) is stored once in the string table and referred to
+by index. The event block can therefore be memory-mapped and walked with
+struct.iter_unpack without reading or parsing it as text.
+
+Statistics mode is recorded as well (switching it on and off, adding the
+entry, pasted numbers). Files loaded into it are not: they only feed the
+statistics, never a result '=' shows.
+
+So are the user's variables and functions: the definitions the calculator
+started with (saved from an earlier session, 'ans' included) and the ones
+after every change in the symbols window, each time as the whole list in
+JSON. The replay makes its calculator's definitions match each of them.
+
+Set PYCALC_SESSION to a file path to record the calculator's session there.
+Replay a recording and check every result:
+
+    python calc_session.py replay session.pcs
+    python calc_session.py info session.pcs
+    python calc_session.py dump session.pcs
+"""
+import argparse
+import atexit
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+
+# Environment variable naming the file to record the GUI session into
+SESSION_ENV = "PYCALC_SESSION"
+
+MAGIC = b"PCSN"
+VERSION = 1
+
+# Event codes, one per calculator state-machine entry point
+EVENT_ADD = 1          # add_to_expression(text)
+EVENT_OPERATOR = 2     # add_operator(text)
+EVENT_FUNCTION = 3     # add_function(text)
+EVENT_BACKSPACE = 4    # backspace()
+EVENT_CLEAR = 5        # clear()
+EVENT_EVALUATE = 6     # evaluate(); text is the result it displayed
+EVENT_TOGGLE_SIGN = 7  # toggle_sign()
+EVENT_SQUARE = 8       # square()
+EVENT_SET_ENTRY = 9    # use_history(text)
+EVENT_TOGGLE_STATS = 10  # toggle_stats()
+EVENT_ADD_DATA = 11      # add_data_point(), i.e. '=' or ',' in statistics mode
+EVENT_ADD_DATA_TEXT = 12  # add_data_text(text), e.g. pasted numbers
+EVENT_SYMBOLS = 13       # the user definitions (symbols_text), at start and after changes
+
+EVENT_NAMES = {
+    EVENT_ADD: "add_to_expression", EVENT_OPERATOR: "add_operator",
+    EVENT_FUNCTION: "add_function", EVENT_BACKSPACE: "backspace", EVENT_CLEAR: "clear",
+    EVENT_EVALUATE: "evaluate", EVENT_TOGGLE_SIGN: "toggle_sign", EVENT_SQUARE: "square",
+    EVENT_SET_ENTRY: "use_history", EVENT_TOGGLE_STATS: "toggle_stats",
+    EVENT_ADD_DATA: "add_data_point", EVENT_ADD_DATA_TEXT: "add_data_text",
+    EVENT_SYMBOLS: "symbols",
+}
+# Events whose method takes the string argument
+_TEXT_EVENTS = frozenset((EVENT_ADD, EVENT_OPERATOR, EVENT_FUNCTION, EVENT_SET_ENTRY,
+                          EVENT_ADD_DATA_TEXT))
+
+VARIANTS = {0: None, 1: "v1", 2: "v2"}
+_VARIANT_CODES = {name: code for code, name in VARIANTS.items()}
+
+_HEADER = struct.Struct("<4sHHQQIB3x")
+_RECORD = struct.Struct("<B3xI")
+_LENGTH = struct.Struct("<I")
+
+
+class SessionFormatError(ValueError):
+    """Raised when a file is not a complete session recording."""
+
+
+class NullRecorder:
+    """Stands in for a recorder when nothing is being recorded."""
+
+    def record(self, *args):
+        pass
+
+    def close(self):
+        pass
+
+
+class SessionRecorder:
+    """Streams events to a session file; the string table is written on close()."""
+
+    def __init__(self, path, variant=None):
+        self.path = path
+        self.variant = variant
+        self.count = 0
+        self._strings = {"": 0}
+        self._file = open(path, "wb")
+        # Placeholder header, rewritten with the final counts on close()
+        self._file.write(_HEADER.pack(MAGIC, VERSION, _RECORD.size, 0, 0, 0, 0))
+        self._closed = False
+        atexit.register(self.close)
+
+    def record(self, event, text=None):
+        index = 0
+        if text:
+            index = self._strings.get(text)
+            if index is None:
+                index = self._strings[text] = len(self._strings)
+        self._file.write(_RECORD.pack(event, index))
+        self.count += 1
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        table_offset = self._file.tell()
+        for text in self._strings:  # dicts keep insertion order, which is index order
+            data = text.encode("utf-8")
+            self._file.write(_LENGTH.pack(len(data)))
+            self._file.write(data)
+        self._file.seek(0)
+        self._file.write(_HEADER.pack(MAGIC, VERSION, _RECORD.size, self.count, table_offset,
+                                      len(self._strings),
+                                      _VARIANT_CODES.get(self.variant, 0)))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def symbols_text(table):
+    """What EVENT_SYMBOLS records: every definition in a SymbolTable, as JSON."""
+    return json.dumps(table.definitions(), separators=(",", ":"))
+
+
+def session_recorder(variant):
+    """The recorder the calculators use: a SessionRecorder if PYCALC_SESSION is set."""
+    path = os.environ.get(SESSION_ENV)
+    if not path:
+        return NullRecorder()
+    return SessionRecorder(path, variant)
+
+
+class Session:
+    """A memory-mapped session file."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as handle:
+            self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._read_header()
+            self.strings = self._read_strings()
+        except Exception:
+            self._map.close()
+            raise
+        self._view = memoryview(self._map)
+
+    def _read_header(self):
+        if len(self._map) < _HEADER.size:
+            raise SessionFormatError(f"{self.path}: too short to be a session file")
+        (magic, version, record_size, self.count, self._table_offset, self._string_count,
+         variant) = _HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise SessionFormatError(f"{self.path}: not a session file")
+        if version != VERSION or record_size != _RECORD.size:
+            raise SessionFormatError(f"{self.path}: unsupported version {version}")
+        if self._table_offset == 0:
+            raise SessionFormatError(f"{self.path}: recording was not closed")
+        self.variant = VARIANTS.get(variant)
+
+    def _read_strings(self):
+        # The table is small next to the events, so it is decoded once up front
+        strings = []
+        offset = self._table_offset
+        for _ in range(self._string_count):
+            (length,) = _LENGTH.unpack_from(self._map, offset)
+            offset += _LENGTH.size
+            strings.append(str(self._map[offset:offset + length], "utf-8"))
+            offset += length
+        return strings
+
+    def events(self):
+        """Iterate (event, string index) pairs straight from the mapped file."""
+        end = _HEADER.size + self.count * _RECORD.size
+        return _RECORD.iter_unpack(self._view[_HEADER.size:end])
+
+    def close(self):
+        try:
+            self._view.release()
+            self._map.close()
+        except BufferError:
+            # An events() iterator is still alive; the map is freed along with it
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ReplayResult:
+    """What a replay found: counts and the first few mismatching results."""
+
+    def __init__(self):
+        self.events = 0
+        self.evaluations = 0
+        self.mismatches = []  # (event number, expected, actual)
+        self.mismatch_count = 0
+        self.errors = 0  # events whose method raised, as they would have live
+        self.seconds = 0.0
+
+    @property
+    def ok(self):
+        return self.mismatch_count == 0
+
+
+def replay(path, variant=None, max_mismatches=20):
+    """Drive a headless calculator through a recorded session and check every result."""
+    from calc_headless import create_calculator
+
+    with Session(path) as session:
+        variant = variant or session.variant or "v2"
+        # The replayed calculator must not start recording (possibly over 'path')
+        recording = os.environ.pop(SESSION_ENV, None)
+        try:
+            calculator, _ = create_calculator(variant)
+        finally:
+            if recording is not None:
+                os.environ[SESSION_ENV] = recording
+        # Nothing to show or store while replaying
+        calculator._update_preview = lambda: None
+        calculator.history.close()
+        calculator.history = NullRecorder()
+
+        handlers = {}
+        for event, name in EVENT_NAMES.items():
+            method = getattr(calculator, name, None)
+            if method is not None:
+                handlers[event] = method
+        strings = session.strings
+        result = ReplayResult()
+        start = time.perf_counter()
+        for number, (event, index) in enumerate(session.events()):
+            if event == EVENT_EVALUATE:
+                calculator.evaluate()
+                result.evaluations += 1
+                actual = calculator.current.text
+                if actual != strings[index]:
+                    result.mismatch_count += 1
+                    if len(result.mismatches) < max_mismatches:
+                        result.mismatches.append((number, strings[index], actual))
+                continue
+            if event == EVENT_SYMBOLS:
+                calculator.engine.symbols.sync(json.loads(strings[index]))
+                continue
+            try:
+                method = handlers[event]
+            except KeyError:
+                raise SessionFormatError(
+                    f"event {number}: {EVENT_NAMES.get(event, event)!r} is not supported by "
+                    f"the {variant} calculator") from None
+            try:
+                if event in _TEXT_EVENTS:
+                    method(strings[index])
+                else:
+                    method()
+            except Exception:
+                # Tk reports a failing callback and carries on; so does the replay
+                result.errors += 1
+        result.events = session.count
+        result.seconds = time.perf_counter() - start
+    return result
+
+
+# --- Command Line ---
+
+def _clip(text, size=60):
+    return repr(text) if len(text) <= size else repr(text[:size]) + f"... ({len(text)} chars)"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and replay recorded sessions.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    replay_parser = commands.add_parser("replay", help="replay a session and check its results")
+    replay_parser.add_argument("path")
+    replay_parser.add_argument("--variant", choices=("v1", "v2"),
+                               help="calculator to replay on (default: the recorded one)")
+    info_parser = commands.add_parser("info", help="show a session's header")
+    info_parser.add_argument("path")
+    dump_parser = commands.add_parser("dump", help="print the events as text")
+    dump_parser.add_argument("path")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "replay":
+            result = replay(args.path, args.variant)
+            rate = result.events / result.seconds if result.seconds else 0.0
+            print(f"{result.events:,} events, {result.evaluations:,} evaluations, "
+                  f"{result.mismatch_count:,} mismatches, {result.errors:,} raised "
+                  f"({rate:,.0f} events/s)")
+            for number, expected, actual in result.mismatches:
+                print(f"  event {number}: recorded {_clip(expected)}, replayed {_clip(actual)}")
+            return 0 if result.ok else 1
+
+        with Session(args.path) as session:
+            if args.command == "info":
+                print(f"variant: {session.variant or 'unknown'}")
+                print(f"events:  {session.count:,}")
+                print(f"strings: {len(session.strings):,}")
+            else:
+                for event, index in session.events():
+                    name = EVENT_NAMES.get(event, f"event {event}")
+                    print(f"{name} {session.strings[index]!r}" if index else name)
+    except (OSError, SessionFormatError) as exc:
+        print(f"calc_session: {exc}", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Evaluation work shared by several calculator panes in one process.
+
+Kiosks run several calculator panes (windows) at once, one per user. Built
+with the same SharedEngine, the panes share:
+
+- a SharedCache (see calc_engine): the compiled expressions and results of
+  everything that uses no user-defined names, so '2**0.5' typed in one pane
+  is a cache hit in every other. Its locks are held only for lookups and
+  updates.
+- a pool of worker threads. '=' hands the expression to the pool and the
+  pane polls for the result with 'after', so the shared Tk mainloop, and
+  every other pane, keeps running while an evaluation of many steps
+  computes. Live previews use the same pool.
+
+Everything a user can see stays with their pane: each pane has its own
+CalcEngine with its own variables, functions and 'ans', and its own
+history. Neither is written to disk, so nothing is left for the next user.
+
+Workers in one process share the GIL. Python switches threads between
+bytecodes, but a single big-integer operation is one C call that keeps the
+GIL until it returns, and every pane (the Tk thread included) waits for it.
+The budget (see calc_budget) refuses such a step up front when its result
+or its work would be too large, which keeps each one under about a second:
+that is the longest one pane can freeze the others. Its wall-clock limit
+applies to each evaluation as usual.
+
+Usage:
+    python calc_shared.py               # two v2 panes
+    python calc_shared.py --panes 4 --variant v1 --workers 4
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from calc_engine import CalcEngine, SharedCache
+
+# Worker threads evaluating for all panes
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+# How often a pane checks for its result
+POLL_INTERVAL_MS = 10
+
+# Where panes keep their history and definitions: in memory only
+PRIVATE_PATH = ":memory:"
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Calculator scripts by variant name
+CALCULATOR_FILES = {
+    "v1": os.path.join(_HERE, "calci.py"),
+    "v2": os.path.join(_HERE, "calci v2.py"),
+}
+
+
+class SharedEngine:
+    """Caches and a worker pool for every pane of a process; each pane has its own engine."""
+
+    def __init__(self, workers=DEFAULT_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="calc-shared")
+        self._caches = {}  # whitelist -> SharedCache
+        self._lock = threading.Lock()
+
+    def connect(self, names):
+        """A new CalcEngine for a pane, sharing caches with the panes of the same whitelist."""
+        key = frozenset(names.items())
+        with self._lock:
+            cache = self._caches.get(key)
+            if cache is None:
+                cache = self._caches[key] = SharedCache()
+        return CalcEngine(names, shared_cache=cache)
+
+    def submit(self, engine, expression):
+        """Evaluate display text with a pane's engine in a worker; returns a Future.
+
+        The Tk thread keeps running between the worker's steps, not during
+        one: the budget keeps each step short.
+        """
+        return self.executor.submit(engine.calculate, expression)
+
+    def shutdown(self):
+        """Stop the workers; evaluations not yet started are cancelled."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def when_done(master, future, callback, interval=POLL_INTERVAL_MS):
+    """Call callback(future) on the Tk thread once 'future' has finished."""
+    def poll():
+        if future.done():
+            callback(future)
+        else:
+            master.after(interval, poll)
+
+    master.after(interval, poll)
+
+
+def load_calculator(variant):
+    """Import a calculator script (the file names aren't module names)."""
+    if _HERE not in sys.path:
+        sys.path.insert(0, _HERE)
+    spec = importlib.util.spec_from_file_location(f"calci_{variant}", CALCULATOR_FILES[variant])
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def open_panes(root, module, count, workers=DEFAULT_WORKERS):
+    """Build 'count' calculators sharing one engine: one in 'root', the rest in Toplevels."""
+    shared = SharedEngine(workers)
+    panes = []
+    for index in range(count):
+        window = root if index == 0 else module.tk.Toplevel(root)
+        panes.append(module.ScientificCalculator(window, shared=shared))
+    return shared, panes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Several calculator panes sharing one engine.")
+    parser.add_argument("--panes", type=int, default=2)
+    parser.add_argument("--variant", choices=sorted(CALCULATOR_FILES), default="v2")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    args = parser.parse_args(argv)
+
+    module = load_calculator(args.variant)
+    root = module.tk.Tk()
+    shared, panes = open_panes(root, module, args.panes, args.workers)
+    try:
+        root.mainloop()
+    finally:
+        shared.shutdown()
+
+
+if __name__ == "__main__":
+    main()
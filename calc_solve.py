@@ -0,0 +1,360 @@
+"""
+Numerical solvers for PyCalc-Tk: roots, integrals and derivatives.
+
+In an expression, the first argument of root, integrate and diff is a
+function of x rather than a value:
+
+    root(x**3 - 2*x - 5, 2)          a root near 2 (Newton, then Brent)
+    root(cos(x) - x, 0, 1)           a root in [0, 1] (Brent)
+    integrate(sin(x), 0, pi)         adaptive Gauss-Kronrod (G7/K15)
+    integrate(1/(1 + x**2), -math.inf, math.inf)
+    diff(x**3, 2)                    complex step, or Ridders' extrapolation
+
+The engine compiles that argument once, through its compile cache, into a
+plain float function of x (see solver_call), and the solver calls it
+directly. So the thousands of evaluations a solve makes never rewrite, parse
+or compile anything. The other arguments are ordinary expressions. When they
+are NumPy arrays (a graph of 'diff(sin(x), x)'), the solver runs once per
+element.
+
+The solvers take any Python callable, so they can be used from code as well.
+"""
+import ast
+import functools
+import heapq
+import math
+import sys
+
+# Variable of the functions handed to the solvers
+SOLVER_VARIABLE = "x"
+
+EPSILON = sys.float_info.epsilon
+# Absolute tolerance on a root, for roots at or very near zero
+ROOT_TOLERANCE = 1e-300
+BRENT_ITERATIONS = 1000
+NEWTON_ITERATIONS = 60
+# Steps taken outwards from a single guess when looking for a sign change
+BRACKET_STEPS = 120
+BRACKET_GROWTH = 1.6
+
+INTEGRATE_RELATIVE_TOLERANCE = 1e-10
+INTEGRATE_ABSOLUTE_TOLERANCE = 1e-13
+INTEGRATE_MAX_INTERVALS = 2000
+# An integral that misses the tolerance is still returned within this one
+INTEGRATE_ACCEPT_TOLERANCE = 1e-6
+
+COMPLEX_STEP = 1e-20
+
+# 15-point Kronrod rule and the 7-point Gauss rule embedded in it, on [-1, 1]
+_KRONROD_NODES = (
+    0.991455371120812639206854697526329, 0.949107912342758524526189684047851,
+    0.864864423359769072789712788640926, 0.741531185599394439863864773280788,
+    0.586087235467691130294144845693013, 0.405845151377397166906606412076961,
+    0.207784955007898467600689403773245, 0.0)
+_KRONROD_WEIGHTS = (
+    0.022935322010529224963732008058970, 0.063092092629978553290700663189204,
+    0.104790010322250183839876322541518, 0.140653259715525918745189590510238,
+    0.169004726639267902826583426598550, 0.190350578064785409913256402421014,
+    0.204432940075298892414161999234649, 0.209482141084727828012999174891714)
+_GAUSS_WEIGHTS = {
+    1: 0.129484966168869693270611432679082, 3: 0.279705391489276667901467771423780,
+    5: 0.381830050505118944950369775488975, 7: 0.417959183673469387755102040816327}
+
+_NODES = tuple(-t for t in _KRONROD_NODES[:-1]) + _KRONROD_NODES[::-1]
+_K_WEIGHTS = _KRONROD_WEIGHTS[:-1] + _KRONROD_WEIGHTS[::-1]
+_G_WEIGHTS = tuple(_GAUSS_WEIGHTS.get(index, 0.0) for index in range(7)) + tuple(
+    _GAUSS_WEIGHTS.get(index, 0.0) for index in range(7, -1, -1))
+
+try:
+    _dot = math.sumprod  # Python 3.12+
+except AttributeError:
+    def _dot(left, right):
+        return math.fsum(map(float.__mul__, left, right))
+
+
+def solver_call(node, synthetic, names, functions):
+    """Rewrite a call to a whitelisted solver so its first argument is a function of x.
+
+    The argument's source goes in 'functions' (source -> name) for the
+    engine to compile, and the call refers to it by that name. Returns None
+    for any other node.
+    """
+    if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+            and node.func.id in SOLVER_FUNCTIONS and node.func.id in names and node.args):
+        return None
+    source = ast.unparse(node.args[0])
+    name = functions.setdefault(source, f"_s{len(functions)}")
+    argument = ast.copy_location(ast.Name(id=name, ctx=ast.Load()), node.args[0])
+    call = ast.Call(func=node.func, args=[argument] + node.args[1:], keywords=[])
+    # Only the remaining arguments are checked as part of this expression
+    synthetic[id(call)] = 1
+    return ast.copy_location(call, node)
+
+
+def _pointwise(solver):
+    """Let 'solver' take NumPy arrays for its numeric arguments, one solve per element."""
+    @functools.wraps(solver)
+    def wrapper(function, *args):
+        if not any(getattr(arg, "ndim", 0) for arg in args):
+            return solver(function, *args)
+        # Imported here: the engine imports this module
+        from calc_engine import load_numpy
+        return load_numpy().vectorize(lambda *point: solver(function, *point),
+                                      otypes=[float])(*args)
+    return wrapper
+
+
+def _value(function, x):
+    """function(x) as a float; complex results are errors."""
+    return float(function(x))
+
+
+def _sample(function, x):
+    """function(x), or None where it is undefined."""
+    try:
+        value = _value(function, x)
+    except (ArithmeticError, ValueError, TypeError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+# --- Roots ---
+
+@_pointwise
+def root(function, a, b=None):
+    """A root of 'function': in [a, b], or near the guess 'a'."""
+    a = float(a)
+    if b is not None:
+        b = float(b)
+        return _brent(function, a, b, _value(function, a), _value(function, b))
+    fa = _value(function, a)
+    if fa == 0:
+        return a
+    found = _newton(function, a)
+    if found is not None:
+        return found
+    bracket = _bracket(function, a, fa)
+    if bracket is None:
+        raise ValueError("root(): no sign change found near the guess")
+    return _brent(function, *bracket)
+
+
+def _brent(function, a, b, fa, fb):
+    """Brent's method on [a, b]: inverse quadratic interpolation, secant or bisection."""
+    if fa == 0:
+        return a
+    if fb == 0:
+        return b
+    if (fa > 0) == (fb > 0):
+        raise ValueError("root(): the function has the same sign at both ends")
+    c, fc = a, fa
+    d = e = b - a
+    for _ in range(BRENT_ITERATIONS):
+        if (fb > 0) == (fc > 0):
+            c, fc = a, fa
+            d = e = b - a
+        if abs(fc) < abs(fb):
+            a, b, c = b, c, b
+            fa, fb, fc = fb, fc, fb
+        tolerance = 2 * EPSILON * abs(b) + ROOT_TOLERANCE
+        middle = 0.5 * (c - b)
+        if abs(middle) <= tolerance or fb == 0:
+            return b
+        if abs(e) >= tolerance and abs(fa) > abs(fb):
+            s = fb / fa
+            if a == c:
+                p, q = 2 * middle * s, 1 - s
+            else:
+                q, r = fa / fc, fb / fc
+                p = s * (2 * middle * q * (q - r) - (b - a) * (r - 1))
+                q = (q - 1) * (r - 1) * (s - 1)
+            if p > 0:
+                q = -q
+            else:
+                p = -p
+            if 2 * p < min(3 * middle * q - abs(tolerance * q), abs(e * q)):
+                e, d = d, p / q
+            else:
+                d = e = middle
+        else:
+            d = e = middle
+        a, fa = b, fb
+        b += d if abs(d) > tolerance else math.copysign(tolerance, middle)
+        fb = _value(function, b)
+    raise ValueError("root(): no convergence")
+
+
+def _newton(function, x):
+    """Newton's method from 'x'; None if it does not converge."""
+    slope = _slope_function(function, x)
+    for _ in range(NEWTON_ITERATIONS):
+        fx = _sample(function, x)
+        if fx is None:
+            return None
+        if fx == 0:
+            return x
+        try:
+            step = fx / slope(x)
+        except (ArithmeticError, ValueError, TypeError):
+            return None
+        x -= step
+        if not math.isfinite(x):
+            return None
+        if abs(step) <= 4 * EPSILON * abs(x) + ROOT_TOLERANCE:
+            return x
+    # A multiple root converges slowly; accept it once the value is negligible
+    fx = _sample(function, x)
+    return x if fx is not None and abs(fx) <= EPSILON ** 2 else None
+
+
+def _slope_function(function, x):
+    """The derivative to use in Newton's method: by complex step when 'function' allows."""
+    try:
+        complex_value = function(complex(x, COMPLEX_STEP))
+    except (ArithmeticError, ValueError, TypeError):
+        complex_value = None
+    if isinstance(complex_value, complex):
+        return lambda point: function(complex(point, COMPLEX_STEP)).imag / COMPLEX_STEP
+
+    def central(point):
+        h = EPSILON ** (1 / 3) * max(1.0, abs(point))
+        return (_value(function, point + h) - _value(function, point - h)) / (2 * h)
+    return central
+
+
+def _bracket(function, x, fx):
+    """An interval around 'x' on which 'function' changes sign, searched outwards."""
+    step = 0.01 * max(1.0, abs(x))
+    left = right = x
+    f_left = f_right = fx
+    for _ in range(BRACKET_STEPS):
+        for direction in (-1, 1):
+            point = x + direction * step
+            value = _sample(function, point)
+            if value is None:
+                continue
+            near, f_near = (left, f_left) if direction < 0 else (right, f_right)
+            if f_near is not None and (value > 0) != (f_near > 0):
+                return (point, near, value, f_near) if direction < 0 else (near, point, f_near, value)
+            if direction < 0:
+                left, f_left = point, value
+            else:
+                right, f_right = point, value
+        step *= BRACKET_GROWTH
+    return None
+
+
+# --- Integrals ---
+
+@_pointwise
+def integrate(function, a, b):
+    """Integral of 'function' from a to b; either limit may be infinite."""
+    a, b = float(a), float(b)
+    if a == b:
+        return 0.0
+    if a > b:
+        return -integrate(function, b, a)
+    integrand, a, b = _finite(function, a, b)
+    value, error = _adaptive(integrand, a, b)
+    if error > INTEGRATE_ACCEPT_TOLERANCE * max(1.0, abs(value)) or not math.isfinite(value):
+        raise ValueError("integrate(): no convergence (divergent or too irregular)")
+    return value
+
+
+def _finite(function, a, b):
+    """An integrand and finite limits with the same integral, for infinite limits."""
+    if math.isinf(a) and math.isinf(b):
+        # x = t / (1 - t**2) on (-1, 1)
+        return (lambda t: _value(function, t / (1 - t * t)) * (1 + t * t) / (1 - t * t) ** 2,
+                -1.0, 1.0)
+    if math.isinf(b):
+        # x = a + t / (1 - t) on [0, 1)
+        return lambda t: _value(function, a + t / (1 - t)) / (1 - t) ** 2, 0.0, 1.0
+    if math.isinf(a):
+        # x = b - t / (1 - t) on [0, 1)
+        return lambda t: _value(function, b - t / (1 - t)) / (1 - t) ** 2, 0.0, 1.0
+    return (lambda x: _value(function, x)), a, b
+
+
+def _kronrod(integrand, a, b):
+    """(K15 estimate, |K15 - G7|) on [a, b]."""
+    center, half = 0.5 * (a + b), 0.5 * (b - a)
+    values = [integrand(center + half * node) for node in _NODES]
+    kronrod = half * _dot(_K_WEIGHTS, values)
+    return kronrod, abs(kronrod - half * _dot(_G_WEIGHTS, values))
+
+
+def _adaptive(integrand, a, b):
+    """Globally adaptive G7/K15: always split the interval with the largest error."""
+    value, error = _kronrod(integrand, a, b)
+    heap = [(-error, a, b, value)]
+    total, total_error = value, error
+    while total_error > max(INTEGRATE_ABSOLUTE_TOLERANCE,
+                            INTEGRATE_RELATIVE_TOLERANCE * abs(total)):
+        if len(heap) >= INTEGRATE_MAX_INTERVALS:
+            break
+        negative_error, left, right, value = heapq.heappop(heap)
+        middle = 0.5 * (left + right)
+        if not left < middle < right:
+            # Can't split any further in floating point
+            heapq.heappush(heap, (negative_error, left, right, value))
+            break
+        first, first_error = _kronrod(integrand, left, middle)
+        second, second_error = _kronrod(integrand, middle, right)
+        heapq.heappush(heap, (-first_error, left, middle, first))
+        heapq.heappush(heap, (-second_error, middle, right, second))
+        total += first + second - value
+        total_error += first_error + second_error + negative_error
+    # Sum again exactly; the running totals were only for the stopping test
+    return (math.fsum(item[3] for item in heap), math.fsum(-item[0] for item in heap))
+
+
+# --- Derivatives ---
+
+@_pointwise
+def diff(function, x):
+    """Derivative of 'function' at x."""
+    x = float(x)
+    try:
+        value = function(complex(x, COMPLEX_STEP))
+    except (ArithmeticError, ValueError, TypeError):
+        # Uses real-only functions (math.sin, ...): extrapolate differences
+        return _ridders(function, x)
+    if isinstance(value, complex):
+        # Complex step: exact to rounding, with no cancellation
+        return value.imag / COMPLEX_STEP
+    # The result does not depend on x
+    return 0.0
+
+
+def _ridders(function, x, table_size=10, shrink=1.4, safe=2.0):
+    """Ridders' method: central differences at shrinking h, Richardson-extrapolated."""
+    h = 0.1 * min(abs(x), 1.0) or 0.1
+    factor = shrink * shrink
+    table = [[0.0] * table_size for _ in range(table_size)]
+    table[0][0] = (_value(function, x + h) - _value(function, x - h)) / (2 * h)
+    best, error = table[0][0], math.inf
+    for column in range(1, table_size):
+        h /= shrink
+        table[0][column] = (_value(function, x + h) - _value(function, x - h)) / (2 * h)
+        scale = factor
+        for row in range(1, column + 1):
+            table[row][column] = ((table[row - 1][column] * scale - table[row - 1][column - 1])
+                                  / (scale - 1))
+            scale *= factor
+            estimate_error = max(abs(table[row][column] - table[row - 1][column]),
+                                 abs(table[row][column] - table[row - 1][column - 1]))
+            if estimate_error <= error:
+                best, error = table[row][column], estimate_error
+        if abs(table[column][column] - table[column - 1][column - 1]) >= safe * error:
+            # Higher orders are getting worse: rounding has taken over
+            break
+    return best
+
+
+# Names added to the calculator's whitelist
+SOLVER_FUNCTIONS = {
+    "root": root,
+    "integrate": integrate,
+    "diff": diff,
+}
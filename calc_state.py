@@ -0,0 +1,227 @@
+"""
+Incremental expression state for PyCalc-Tk.
+
+The calculators used to keep what the user typed as plain strings: every
+keystroke copied the whole string, and the parenthesis logic counted '(' and
+')' over all of it. An ExpressionBuffer instead keeps an append-only list of
+the pieces typed so far. It also tracks the parenthesis counts, the length
+and the last character as they change, so each keystroke costs O(1) however
+long the expression gets. The full string is only built when it's needed
+(for the total display or for evaluation).
+"""
+
+# Kinds of the last character typed, as reported by ExpressionBuffer.last_kind
+EMPTY = "empty"
+DIGIT = "digit"
+POINT = "point"
+OPERATOR = "operator"
+OPEN = "open"
+CLOSE = "close"
+CONSTANT = "constant"
+NAME = "name"
+
+_OPERATOR_CHARS = frozenset("+-*/%")
+_CONSTANT_CHARS = frozenset("πe")
+
+
+def char_kind(char):
+    """Classify a single character of an expression."""
+    if not char:
+        return EMPTY
+    if char.isdigit():
+        return DIGIT
+    if char == ".":
+        return POINT
+    if char in _OPERATOR_CHARS:
+        return OPERATOR
+    if char == "(":
+        return OPEN
+    if char == ")":
+        return CLOSE
+    if char in _CONSTANT_CHARS:
+        return CONSTANT
+    return NAME
+
+
+class ExpressionBuffer:
+    """An expression built up by appending pieces, with O(1) bookkeeping per edit."""
+
+    __slots__ = ("_parts", "_length", "_opened", "_closed", "_text", "_joined", "_head")
+
+    def __init__(self, text=""):
+        self._parts = []
+        self._length = 0
+        self._opened = 0
+        self._closed = 0
+        self._text = ""    # the first '_joined' parts, joined
+        self._joined = 0
+        self._head = None  # (size, text) from the last head() call
+        if text:
+            self.append(text)
+
+    # --- Queries ---
+
+    def __len__(self):
+        return self._length
+
+    def __bool__(self):
+        return self._length > 0
+
+    def __str__(self):
+        return self.text
+
+    @property
+    def text(self):
+        """The expression as one string.
+
+        Only the parts appended since the last call are joined, so rebuilding
+        the top display after each operator is a single copy, not a re-join.
+        """
+        if self._joined < len(self._parts):
+            self._text += "".join(self._parts[self._joined:])
+            self._joined = len(self._parts)
+        return self._text
+
+    @property
+    def depth(self):
+        """How many '(' are still waiting for a ')'."""
+        return self._opened - self._closed
+
+    @property
+    def last_char(self):
+        return self._parts[-1][-1] if self._parts else ""
+
+    @property
+    def first_char(self):
+        return self._parts[0][0] if self._parts else ""
+
+    @property
+    def last_kind(self):
+        """Kind of the last character typed (DIGIT, OPERATOR, CLOSE, ...)."""
+        return char_kind(self.last_char)
+
+    def head(self, size):
+        """The first 'size' characters, without building the whole string."""
+        if self._head is not None and self._head[0] == size:
+            return self._head[1]
+        if self._joined == len(self._parts):
+            head = self._text[:size]
+        else:
+            pieces, remaining = [], size
+            for part in self._parts:
+                if remaining <= 0:
+                    break
+                pieces.append(part)
+                remaining -= len(part)
+            head = "".join(pieces)[:size]
+        # Kept until an edit reaches into the first 'size' characters
+        self._head = (size, head)
+        return head
+
+    def startswith(self, prefix):
+        return self.head(len(prefix)) == prefix
+
+    def endswith(self, suffix):
+        if not suffix:
+            return True
+        pieces = []
+        needed = len(suffix)
+        for part in reversed(self._parts):
+            pieces.append(part)
+            needed -= len(part)
+            if needed <= 0:
+                break
+        return "".join(reversed(pieces)).endswith(suffix)
+
+    # --- Edits ---
+
+    def append(self, piece):
+        """Add text at the end."""
+        if not piece:
+            return
+        self._parts.append(piece)
+        self._count(piece, 1)
+
+    def extend(self, other):
+        """Add the contents of another buffer at the end."""
+        if other:
+            self._parts.extend(other._parts)
+            self._edited_end(self._length)
+            self._length += other._length
+            self._opened += other._opened
+            self._closed += other._closed
+
+    def prepend(self, piece):
+        """Add text at the start (used when wrapping or negating an entry)."""
+        if not piece:
+            return
+        self._parts.insert(0, piece)
+        self._head = None
+        self._reset_text()
+        self._count(piece, 1)
+
+    def pop(self):
+        """Remove and return the last character ('' when empty)."""
+        if not self._parts:
+            return ""
+        part = self._parts[-1]
+        char = part[-1]
+        if len(part) > 1:
+            self._parts[-1] = part[:-1]
+        else:
+            self._parts.pop()
+        if self._joined >= len(self._parts):
+            self._reset_text()
+        self._count(char, -1)
+        return char
+
+    def remove_prefix(self, size):
+        """Remove the first 'size' characters."""
+        removed = self.head(size)
+        while size > 0 and self._parts:
+            part = self._parts[0]
+            if len(part) <= size:
+                del self._parts[0]
+                size -= len(part)
+            else:
+                self._parts[0] = part[size:]
+                size = 0
+        self._head = None
+        self._reset_text()
+        self._count(removed, -1)
+
+    def replace_last(self, piece):
+        """Replace the last character with 'piece' (e.g. change '5+' to '5-')."""
+        self.pop()
+        self.append(piece)
+
+    def set(self, text):
+        """Replace the whole contents."""
+        self.clear()
+        if text:
+            # One piece per character, so later backspaces stay O(1)
+            self._parts.extend(text)
+            self._count(text, 1)
+
+    def clear(self):
+        self._parts.clear()
+        self._length = self._opened = self._closed = 0
+        self._head = None
+        self._reset_text()
+
+    def _count(self, piece, sign):
+        before = self._length
+        self._length += sign * len(piece)
+        self._edited_end(min(before, self._length))
+        if "(" in piece or ")" in piece:
+            self._opened += sign * piece.count("(")
+            self._closed += sign * piece.count(")")
+
+    def _edited_end(self, length):
+        """Drop the cached head if an edit at the end started before its size."""
+        if self._head is not None and length < self._head[0]:
+            self._head = None
+
+    def _reset_text(self):
+        self._text = ""
+        self._joined = 0
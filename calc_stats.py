@@ -0,0 +1,539 @@
+"""
+Streaming statistics for PyCalc-Tk.
+
+RunningStats takes a data series in one pass and keeps a fixed amount of
+state however long the series is:
+
+- count, sum (compensated, so millions of small values don't drift),
+  min and max
+- mean and variance by Welford's update; whole chunks are folded in with
+  the pairwise form of the same update, so the per-value work runs in C
+- approximate quantiles (median, quartiles, p90, p99) from a merging
+  t-digest: a bounded set of centroids, small at the tails where accuracy
+  matters most
+
+Values come from typed or pasted text, CSV files or raw binary float64
+files, all read in chunks. StatsMode is the calculator's statistics mode:
+it owns the data, loads files on a background thread and picks what the
+display shows. Never imports tkinter.
+
+Usage:
+    python calc_stats.py data.csv                 # print the summary as JSON
+    python calc_stats.py data.csv --column price
+    python calc_stats.py samples.f64              # raw native float64
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import re
+import sys
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from calc_engine import format_result
+
+# Values handed to RunningStats.update() at a time by the readers
+CHUNK_SIZE = 4096
+
+# t-digest size: about this many centroids at most (larger is more accurate)
+TDIGEST_COMPRESSION = 200
+# Values collected before they are merged into the centroids
+TDIGEST_BUFFER = 4096
+
+# Files read as raw native float64 rather than text
+BINARY_SUFFIXES = (".bin", ".f64", ".dat", ".raw")
+
+# How often the Tk thread checks on a file being loaded
+POLL_INTERVAL_MS = 50
+
+# What statistics mode can show, in the order '=' steps through them
+SUMMARY_FIELDS = (
+    ("mean", "Mean"), ("median", "Median"), ("stdev", "Std dev"), ("variance", "Variance"),
+    ("min", "Min"), ("max", "Max"), ("sum", "Sum"), ("count", "Count"),
+    ("p25", "Q1"), ("p75", "Q3"), ("p90", "P90"), ("p99", "P99"),
+)
+
+# Fields of SUMMARY_FIELDS estimated from the t-digest
+_QUANTILES = {"median": 0.5, "p25": 0.25, "p75": 0.75, "p90": 0.9, "p99": 0.99}
+
+_SEPARATOR_RE = re.compile(r"[\s,;]+")
+
+
+class TDigest:
+    """Approximate quantiles in bounded memory (the merging t-digest).
+
+    Values are buffered, then sorted and merged into centroids (mean,
+    weight). The k1 scale function keeps centroids near the tails small, so
+    p1/p99 stay accurate, while ones near the median absorb many values.
+    With fewer values than about compression / 2, every value keeps its own
+    centroid and quantiles are exact.
+    """
+
+    def __init__(self, compression=TDIGEST_COMPRESSION, buffer_size=TDIGEST_BUFFER):
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._means = []
+        self._weights = []
+        self._buffer = []
+
+    def add(self, value):
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self._buffer.append(value)
+        if len(self._buffer) >= self.buffer_size:
+            self._compress()
+
+    def update(self, values):
+        """Add a chunk of values (a list or array of finite floats)."""
+        if not values:
+            return
+        self.count += len(values)
+        self.min = min(self.min, min(values))
+        self.max = max(self.max, max(values))
+        self._buffer.extend(values)
+        if len(self._buffer) >= self.buffer_size:
+            self._compress()
+
+    def merge(self, other):
+        """Fold another digest's data into this one."""
+        if not other.count:
+            return
+        other._compress()
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(list(zip(other._means, other._weights)))
+
+    def _compress(self, extra=()):
+        if not self._buffer and not extra:
+            return
+        items = list(zip(self._means, self._weights))
+        items.extend((value, 1) for value in self._buffer)
+        items.extend(extra)
+        self._buffer = []
+        items.sort()
+        total = sum(weight for _, weight in items)
+        scale = self.compression / (2 * math.pi)
+
+        means, weights = [], []
+        mean, weight = items[0]
+        merged = 0  # weight of the centroids already closed
+        limit = self._limit(0.0, scale, total)
+        for item_mean, item_weight in items[1:]:
+            proposed = weight + item_weight
+            if merged + proposed <= limit:
+                weight = proposed
+                mean += (item_mean - mean) * item_weight / weight
+            else:
+                means.append(mean)
+                weights.append(weight)
+                merged += weight
+                limit = self._limit(merged / total, scale, total)
+                mean, weight = item_mean, item_weight
+        means.append(mean)
+        weights.append(weight)
+        self._means, self._weights = means, weights
+
+    @staticmethod
+    def _limit(q, scale, total):
+        """Largest cumulative weight the centroid starting at quantile 'q' may reach."""
+        k = scale * math.asin(2 * q - 1) + 1
+        if k >= scale * math.pi / 2:
+            return total
+        return total * (math.sin(k / scale) + 1) / 2
+
+    def quantile(self, p):
+        """Estimated value below which a fraction 'p' of the data lies."""
+        if not self.count:
+            return math.nan
+        self._compress()
+        means, weights = self._means, self._weights
+        if len(means) == 1:
+            return means[0]
+        target = min(max(p, 0.0), 1.0) * self.count
+        # Each centroid's mean sits at the middle of the weight it covers
+        first, last = weights[0] / 2, self.count - weights[-1] / 2
+        if target <= first:
+            return self.min + (means[0] - self.min) * (target / first if first > 0.5 else 1)
+        if target >= last:
+            tail = self.count - last
+            return self.max - (self.max - means[-1]) * ((self.count - target) / tail
+                                                        if tail > 0.5 else 1)
+        position = first
+        for index in range(len(means) - 1):
+            gap = (weights[index] + weights[index + 1]) / 2
+            if position + gap >= target:
+                fraction = (target - position) / gap
+                return means[index] + (means[index + 1] - means[index]) * fraction
+            position += gap
+        return means[-1]
+
+    def __len__(self):
+        """Number of centroids held (the memory in use, give or take the buffer)."""
+        return len(self._means)
+
+
+class RunningStats:
+    """Count, sum, mean, variance, min, max and quantiles of a data series, in one pass."""
+
+    def __init__(self, compression=TDIGEST_COMPRESSION):
+        self.count = 0
+        self.mean = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.skipped = 0  # values the readers could not use (text, nan, inf)
+        self._m2 = 0.0  # sum of squared deviations from the mean
+        self._sum = 0.0
+        self._sum_error = 0.0  # Neumaier compensation for _sum
+        self.digest = TDigest(compression)
+
+    def add(self, value):
+        """Add one finite value (Welford's update)."""
+        value = float(value)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self._add_to_sum(value)
+        self.digest.add(value)
+
+    def update(self, values):
+        """Add a chunk of finite values (a list or array of floats).
+
+        The chunk's own count, mean and squared deviations are computed in C
+        (math.fsum, min, max) and combined with the running totals by the
+        pairwise form of Welford's update. Finite values can still add up to
+        more than a float holds; the sum is then inf, as a running total
+        would be, and the mean is computed from the scaled values instead.
+        """
+        count = len(values)
+        if not count:
+            return
+        try:
+            total = math.fsum(values)
+        except OverflowError:
+            total = sum(values)  # reaches inf rather than raising
+        if math.isfinite(total):
+            mean = total / count
+        else:
+            mean = math.fsum([value / count for value in values])
+        m2 = math.fsum([(value - mean) * (value - mean) for value in values])
+        self._combine(count, mean, m2)
+        self.min = min(self.min, min(values))
+        self.max = max(self.max, max(values))
+        self._add_to_sum(total)
+        self.digest.update(values)
+
+    def merge(self, other):
+        """Fold in another RunningStats, e.g. one filled on a background thread."""
+        if other.count:
+            self._combine(other.count, other.mean, other._m2)
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self._add_to_sum(other._sum)
+            self._add_to_sum(other._sum_error)
+            self.digest.merge(other.digest)
+        self.skipped += other.skipped
+
+    def _combine(self, count, mean, m2):
+        total = self.count + count
+        if not self.count:
+            self.mean, self._m2, self.count = mean, m2, total
+            return
+        delta = mean - self.mean
+        # Weights first, so a delta near the float limit doesn't overflow
+        self.mean += delta * (count / total)
+        self._m2 += m2 + delta * delta * (self.count * count / total)
+        self.count = total
+
+    def _add_to_sum(self, value):
+        total = self._sum + value
+        if not math.isfinite(total):
+            # Overflowed: there is nothing left to compensate
+            self._sum, self._sum_error = total, 0.0
+            return
+        if abs(self._sum) >= abs(value):
+            self._sum_error += (self._sum - total) + value
+        else:
+            self._sum_error += (value - total) + self._sum
+        self._sum = total
+
+    @property
+    def sum(self):
+        return self._sum + self._sum_error
+
+    @property
+    def variance(self):
+        """Sample variance (n - 1 in the denominator); nan below two values."""
+        return self._m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def stdev(self):
+        return math.sqrt(self.variance) if self.count > 1 else math.nan
+
+    def quantile(self, p):
+        return self.digest.quantile(p)
+
+    def field(self, key):
+        """One of SUMMARY_FIELDS by key; nan when there is no data for it."""
+        if key in _QUANTILES:
+            return self.quantile(_QUANTILES[key])
+        if not self.count and key in ("mean", "min", "max"):
+            return math.nan
+        return getattr(self, key)
+
+    def summary(self):
+        """Every field of SUMMARY_FIELDS as {key: number}."""
+        return {key: self.field(key) for key, _ in SUMMARY_FIELDS}
+
+
+# --- Readers ---
+
+def _finite(values, stats):
+    """'values' without nan/inf, counting what was dropped in stats.skipped."""
+    try:
+        if math.isfinite(math.fsum(values)):
+            return values
+    except (OverflowError, ValueError):
+        pass
+    kept = [value for value in values if math.isfinite(value)]
+    stats.skipped += len(values) - len(kept)
+    return kept
+
+
+def _parse_chunk(tokens, stats):
+    values = []
+    for token in tokens:
+        try:
+            value = float(token)
+        except ValueError:
+            stats.skipped += 1
+            continue
+        values.append(value)
+    return _finite(values, stats)
+
+
+def read_text(text, stats, cancelled=None):
+    """Add the numbers in 'text' (separated by spaces, commas, ';' or newlines)."""
+    tokens = [token for token in _SEPARATOR_RE.split(text) if token]
+    for start in range(0, len(tokens), CHUNK_SIZE):
+        if cancelled is not None and cancelled.is_set():
+            return stats
+        stats.update(_parse_chunk(tokens[start:start + CHUNK_SIZE], stats))
+    return stats
+
+
+def _column_index(header, column):
+    try:
+        return header.index(column)
+    except ValueError:
+        raise ValueError(f"no column named {column!r}") from None
+
+
+def read_csv(path, stats, column=None, cancelled=None):
+    """Add one column of a CSV file, a chunk at a time.
+
+    'column' is an index or a header name. By default it is the last column
+    holding a number on the first row that has one (ids and dates tend to
+    come first); a header row is skipped.
+    """
+    if isinstance(column, str) and column.isdigit():
+        column = int(column)
+    with open(path, newline="", encoding="utf-8", errors="replace") as handle:
+        reader = csv.reader(handle)
+        index = column if isinstance(column, int) else None
+        chunk = []
+        for row in reader:
+            if index is None:
+                if column is not None:
+                    # The first row is the header naming the column
+                    index = _column_index(row, column)
+                    continue
+                for position in range(len(row) - 1, -1, -1):
+                    try:
+                        float(row[position])
+                    except ValueError:
+                        continue
+                    index = position
+                    break
+                else:
+                    stats.skipped += bool(row)
+                    continue
+            if index < len(row):
+                chunk.append(row[index])
+            if len(chunk) >= CHUNK_SIZE:
+                if cancelled is not None and cancelled.is_set():
+                    return stats
+                stats.update(_parse_chunk(chunk, stats))
+                chunk = []
+        stats.update(_parse_chunk(chunk, stats))
+    return stats
+
+
+def read_binary(path, stats, typecode="d", cancelled=None):
+    """Add every value of a raw binary file of native floats ('d' or 'f')."""
+    itemsize = array(typecode).itemsize
+    if os.path.getsize(path) % itemsize:
+        raise ValueError(f"{path}: size is not a multiple of {itemsize} bytes")
+    with open(path, "rb") as handle:
+        while True:
+            if cancelled is not None and cancelled.is_set():
+                return stats
+            block = handle.read(CHUNK_SIZE * itemsize)
+            if not block:
+                return stats
+            values = array(typecode)
+            values.frombytes(block)
+            stats.update(_finite(values, stats))
+
+
+def read_file(path, stats, column=None, cancelled=None):
+    """Add the values in 'path': raw float64 for BINARY_SUFFIXES, else CSV/text."""
+    if path.lower().endswith(BINARY_SUFFIXES):
+        return read_binary(path, stats, cancelled=cancelled)
+    return read_csv(path, stats, column, cancelled=cancelled)
+
+
+# --- Statistics Mode ---
+
+class StatsMode:
+    """The calculator's statistics mode: the data so far and what the display shows.
+
+    Values are added one at a time (typed entries) or in bulk (pasted text,
+    files). Files are read on a background thread into a separate
+    RunningStats, merged in when done; the display shows the count so far
+    while loading. '=' with an empty entry steps through SUMMARY_FIELDS.
+    """
+
+    def __init__(self, master, on_change):
+        self.master = master
+        self.on_change = on_change
+        self.stats = RunningStats()
+        self.field = 0  # index into SUMMARY_FIELDS
+        self.error = None  # the last file that failed to load, as a message
+        self._executor = None
+        self._future = None
+        self._loading = None  # RunningStats being filled by the worker
+        self._cancelled = None
+        self._poll_id = None
+
+    @property
+    def loading(self):
+        return self._future is not None
+
+    def add(self, value):
+        """Add one value, e.g. the evaluated entry."""
+        if not math.isfinite(value):
+            raise ValueError(f"not a finite number: {value!r}")
+        self.stats.add(value)
+        self.on_change()
+
+    def add_text(self, text):
+        """Add every number in 'text' (a pasted column or list)."""
+        read_text(text, self.stats)
+        self.on_change()
+
+    def reset(self):
+        """Drop all data, and any file being loaded."""
+        self.cancel()
+        self.stats = RunningStats()
+        self.error = None
+        self.on_change()
+
+    def next_field(self):
+        self.field = (self.field + 1) % len(SUMMARY_FIELDS)
+        self.on_change()
+
+    def load(self, path, column=None):
+        """Read a file in the background; its values are added when it is done."""
+        self.cancel()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="calc-stats")
+        self.error = None
+        self._loading = RunningStats()
+        self._cancelled = threading.Event()
+        self._future = self._executor.submit(read_file, path, self._loading, column,
+                                             self._cancelled)
+        self._poll_id = self.master.after(POLL_INTERVAL_MS, self._poll)
+        self.on_change()
+
+    def cancel(self):
+        """Stop loading a file; nothing from it is added."""
+        if self._poll_id is not None:
+            self.master.after_cancel(self._poll_id)
+            self._poll_id = None
+        if self._future is not None:
+            self._cancelled.set()
+            self._future = self._loading = None
+
+    def _poll(self):
+        self._poll_id = None
+        future = self._future
+        if future is None:
+            return
+        if future.done():
+            self._future = None
+            try:
+                self.stats.merge(future.result())
+            except (OSError, ValueError, ArithmeticError, csv.Error) as exc:
+                self.error = str(exc)
+            self._loading = None
+        else:
+            self._poll_id = self.master.after(POLL_INTERVAL_MS, self._poll)
+        self.on_change()
+
+    def close(self):
+        self.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    # --- Display ---
+
+    def header(self):
+        """Top line: the count and the name of the field shown below it."""
+        if self._loading is not None:
+            return f"Loading… n={self._loading.count:,}"
+        if self.error is not None:
+            return f"Load failed: {self.error}"
+        name = SUMMARY_FIELDS[self.field][1]
+        return f"Stats n={self.stats.count:,} · {name}"
+
+    def value(self):
+        """The value of the field being shown, formatted like a result."""
+        value = self.stats.field(SUMMARY_FIELDS[self.field][0])
+        if isinstance(value, float) and math.isnan(value):
+            return ""
+        return format_result(value)
+
+
+def summarize(path, column=None):
+    """Summary of a file's values as a JSON-ready dict (nan becomes None)."""
+    stats = read_file(path, RunningStats(), column)
+    summary = {key: (None if isinstance(value, float) and math.isnan(value) else value)
+               for key, value in stats.summary().items()}
+    summary["skipped"] = stats.skipped
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize a data file in one pass.")
+    parser.add_argument("path", help="CSV/text file, or raw float64 (" +
+                        ", ".join(BINARY_SUFFIXES) + ")")
+    parser.add_argument("--column", help="CSV column, by index or header name")
+    args = parser.parse_args(argv)
+    print(json.dumps(summarize(args.path, args.column), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,439 @@
+"""
+User-defined variables and functions for PyCalc-Tk.
+
+Definitions are typed as text:
+
+    r = 3.2                      a variable
+    f(x) = x**2 + sin(x)         a function
+    memo g(x, y) = ...           a function whose results are memoized
+
+and 'ans' holds the calculator's last result. A variable's right-hand side is
+evaluated once and the variable keeps the value. A function's body is
+compiled once by the engine, like any expression, and the function joins the
+engine's names: using it costs a name lookup and a call, not a parse. Calls
+with constant arguments are folded at compile time when the body only calls
+pure functions.
+
+A dependency graph records which functions use which names. Redefining a
+name recompiles the functions that use it, directly or through another
+function, and drops only the compiled expressions and cached results that
+used one of them; everything else in the engine's caches stays. A function
+can't use itself, directly or not.
+
+SymbolStore keeps the definitions in a JSON file between sessions:
+~/.pycalc-tk/symbols.json, or the file named by PYCALC_SYMBOLS (':memory:'
+keeps them for the session only).
+"""
+import ast
+import atexit
+import json
+import keyword
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from calc_bignum import is_huge, scientific
+from calc_matrix import Matrix
+from calc_optimize import value_key
+
+# Environment variable overriding where definitions are saved
+SYMBOLS_ENV = "PYCALC_SYMBOLS"
+
+DEFAULT_SYMBOLS_PATH = os.path.join(os.path.expanduser("~"), ".pycalc-tk", "symbols.json")
+
+# The variable holding the last result
+ANSWER = "ans"
+
+# Results kept per memoized function
+MEMO_SIZE = 1024
+
+# [memo] name [(params)] = body
+_DEFINITION_RE = re.compile(
+    r"^\s*(?:(memo)\s+)?([A-Za-z_]\w*)\s*(?:\(([^()]*)\))?\s*=(?!=)(.*)$", re.S)
+
+_MISSING = object()
+
+
+def parse_definition(text):
+    """(memoize, name, params, body) for definition text, or None if it isn't one.
+
+    params is None for a variable, else a tuple of parameter names.
+    """
+    match = _DEFINITION_RE.match(text)
+    if match is None:
+        return None
+    memo, name, params, body = match.groups()
+    if params is not None:
+        params = tuple(param.strip() for param in params.split(",")) if params.strip() else ()
+    return bool(memo), name, params, body.strip()
+
+
+def value_source(value):
+    """Source text that evaluates back to 'value' (exactly, for floats).
+
+    Numbers too large to write out (see calc_bignum) get their scientific
+    notation instead, which does not.
+    """
+    if is_huge(value):
+        return scientific(value)
+    if isinstance(value, Matrix):
+        if len(value.shape) == 1:
+            return "[" + ", ".join(map(value_source, value.data)) + "]"
+        cols = value.shape[1]
+        return "[" + ", ".join(value_source(Matrix((cols,), value.data[start:start + cols]))
+                               for start in range(0, len(value.data), cols)) + "]"
+    if isinstance(value, float):
+        if math.isfinite(value):
+            return repr(value)
+        return "math.nan" if math.isnan(value) else ("-math.inf" if value < 0 else "math.inf")
+    return str(value)
+
+
+def memoized(function, size=MEMO_SIZE):
+    """'function' with an LRU memo of its results, keyed by the exact argument values.
+
+    Calls with an unhashable argument (a NumPy array) go straight through;
+    errors are not remembered. The memo may be used from several threads;
+    its lock is not held while 'function' runs, so recursive calls are fine.
+    """
+    cache = OrderedDict()
+    lock = threading.Lock()
+
+    def wrapper(*args):
+        try:
+            key = tuple(map(value_key, args))
+            with lock:
+                result = cache.get(key, _MISSING)
+                if result is not _MISSING:
+                    cache.move_to_end(key)
+                    return result
+        except TypeError:
+            return function(*args)
+        result = function(*args)
+        with lock:
+            cache[key] = result
+            if len(cache) > size:
+                cache.popitem(last=False)
+        return result
+
+    wrapper.cache = cache
+    return wrapper
+
+
+class Symbol:
+    """One definition: a variable (params is None) or a function."""
+
+    __slots__ = ("name", "params", "source", "value", "uses", "pure", "memoize", "_versions")
+
+    def __init__(self, name, params, source, value, uses=frozenset(), pure=True, memoize=False):
+        self.name = name
+        self.params = params
+        self.source = source  # the body, or for a variable its value as source text
+        self.value = value  # the value, or the compiled function
+        self.uses = uses  # user names the body refers to
+        self.pure = pure
+        self.memoize = memoize
+        self._versions = {}
+
+    @property
+    def is_function(self):
+        return self.params is not None
+
+    def version(self, engine, mode):
+        """The value to publish in the engine's "vector" or "float" namespace."""
+        found = self._versions.get(mode)
+        if found is not None:
+            return found
+        if self.is_function:
+            found = engine.compile(self.source, self.params, vectorized=mode == "vector",
+                                   floats=mode == "float").function
+            if self.pure:
+                engine._pure.add(found)
+        elif isinstance(self.value, Matrix):
+            found = self.value
+        else:
+            try:
+                found = float(self.value)
+            except OverflowError:  # an int too large for a float
+                found = math.copysign(math.inf, self.value)
+            except (TypeError, ValueError):  # complex
+                found = complex(self.value)
+        self._versions[mode] = found
+        return found
+
+    def text(self):
+        """The definition as it is typed."""
+        if not self.is_function:
+            return f"{self.name} = {self.source}"
+        memo = "memo " if self.memoize else ""
+        return f"{memo}{self.name}({', '.join(self.params)}) = {self.source}"
+
+    def definition(self):
+        """JSON-ready dict, as kept by SymbolStore; None for a variable too large to keep."""
+        if not self.is_function and is_huge(self.value):
+            return None
+        return {"name": self.name, "params": None if self.params is None else list(self.params),
+                "source": self.source, "memoize": self.memoize}
+
+    def __repr__(self):
+        return f"Symbol({self.text()!r})"
+
+
+class SymbolTable:
+    """The user definitions of one CalcEngine (CalcEngine.symbols).
+
+    Changes are made holding the engine's lock, so they are safe while other
+    threads evaluate with the same engine.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._symbols = {}  # name -> Symbol, in definition order
+        self._users = {}  # name -> names of the functions whose bodies use it
+        self.version = 0  # bumped by every change, so savers can tell
+
+    def __len__(self):
+        return len(self._symbols)
+
+    def __contains__(self, name):
+        return name in self._symbols
+
+    def __iter__(self):
+        return iter(list(self._symbols.values()))
+
+    def get(self, name):
+        return self._symbols.get(name)
+
+    def used_in(self, tree):
+        """The user names a parsed expression refers to."""
+        symbols = self._symbols
+        return frozenset(node.id for node in ast.walk(tree)
+                         if type(node) is ast.Name and node.id in symbols)
+
+    # --- Defining ---
+
+    def define(self, text):
+        """Define a variable or function from text such as 'f(x) = x**2'; returns the Symbol."""
+        # Imported here: the engine imports this module
+        from calc_engine import ExpressionError
+        parsed = parse_definition(text)
+        if parsed is None:
+            raise ExpressionError(f"not a definition: {text!r}")
+        memoize, name, params, body = parsed
+        if params is None:
+            if memoize:
+                raise ExpressionError("only functions can be memoized")
+            return self.set_variable(name, body)
+        return self.define_function(name, params, body, memoize)
+
+    def set_variable(self, name, source):
+        """Evaluate 'source' (display text) and keep the value as variable 'name'."""
+        from calc_engine import prepare_expression
+        self._check_name(name)
+        return self.assign(name, self.engine.evaluate(prepare_expression(source)))
+
+    def assign(self, name, value):
+        """Keep 'value' (a number or Matrix) as variable 'name'."""
+        self._check_name(name)
+        symbol = Symbol(name, None, value_source(value), value)
+        with self.engine.lock:
+            return self._install(symbol)
+
+    def define_function(self, name, params, source, memoize=False):
+        """Compile 'source' as a function of 'params' and publish it as 'name'."""
+        from calc_engine import ExpressionError, prepare_expression
+        self._check_name(name)
+        params = tuple(params)
+        for param in params:
+            if not param.isidentifier() or param.startswith("_") or keyword.iskeyword(param):
+                raise ExpressionError(f"invalid parameter: {param!r}")
+        if len(set(params)) != len(params):
+            raise ExpressionError(f"repeated parameter in {name}()")
+        with self.engine.lock:
+            symbol = self._compile_function(name, params, prepare_expression(source), memoize)
+            if name in symbol.uses or name in self._dependencies(symbol.uses):
+                raise ExpressionError(f"{name} can't be defined in terms of itself")
+            return self._install(symbol)
+
+    def remove(self, name):
+        """Forget a definition; fails while another function uses it."""
+        from calc_engine import ExpressionError
+        with self.engine.lock:
+            if name not in self._symbols:
+                raise ExpressionError(f"unknown name: {name}")
+            users = self._users.get(name)
+            if users:
+                raise ExpressionError(f"{name} is used by {', '.join(sorted(users))}")
+            symbol = self._symbols.pop(name)
+            self._link(symbol, add=False)
+            self.engine.invalidate((name,))
+            self.engine._unbind_symbol(symbol)
+            self.version += 1
+
+    def _check_name(self, name):
+        from calc_engine import ExpressionError
+        if not name.isidentifier() or name.startswith("_") or keyword.iskeyword(name):
+            raise ExpressionError(f"invalid name: {name!r}")
+        if name in self.engine._builtin_names:
+            raise ExpressionError(f"{name} is a built-in name")
+
+    def _compile_function(self, name, params, source, memoize):
+        engine = self.engine
+        compiled = engine.compile(source, params)
+        uses = compiled.uses - set(params)
+        # Pure when every function the body can call is: its folds are then safe
+        referenced = {node.id for node in ast.walk(ast.parse(source, mode="eval"))
+                      if type(node) is ast.Name and node.id not in params}
+        pure = True
+        for referenced_name in referenced:
+            symbol = self._symbols.get(referenced_name)
+            if symbol is not None:
+                pure = pure and symbol.pure
+                continue
+            value = engine._namespace.get(referenced_name)
+            if callable(value) and value not in engine._pure:
+                pure = False
+        function = compiled.function
+        if memoize:
+            function = memoized(function)
+        return Symbol(name, params, source, function, uses, pure, memoize)
+
+    def _install(self, symbol):
+        """Publish 'symbol', recompiling the functions that use an older definition."""
+        name = symbol.name
+        old = self._symbols.get(name)
+        if old is not None:
+            self._link(old, add=False)
+        self._link(symbol, add=True)
+        self._symbols[name] = symbol
+        self.engine._bind_symbol(symbol, old)
+        if old is None:
+            # Expressions that failed on the unknown name may work now
+            self.engine.invalidate((name,))
+            self.engine.result_cache.discard_errors()
+        else:
+            affected = self._dependents(name)
+            self.engine.invalidate((name,) + affected)
+            # Definition order puts every function after those it uses
+            for user in affected:
+                previous = self._symbols[user]
+                rebuilt = self._compile_function(user, previous.params, previous.source,
+                                                 previous.memoize)
+                self._link(previous, add=False)
+                self._link(rebuilt, add=True)
+                self._symbols[user] = rebuilt
+                self.engine._bind_symbol(rebuilt, previous)
+        self.version += 1
+        return symbol
+
+    # --- Dependency Graph ---
+
+    def _link(self, symbol, add):
+        for used in symbol.uses:
+            users = self._users.setdefault(used, set())
+            if add:
+                users.add(symbol.name)
+            else:
+                users.discard(symbol.name)
+
+    def _dependents(self, name):
+        """Names of the functions using 'name', directly or not, in definition order."""
+        found, pending = set(), [name]
+        while pending:
+            for user in self._users.get(pending.pop(), ()):
+                if user not in found:
+                    found.add(user)
+                    pending.append(user)
+        return tuple(user for user in self._symbols if user in found)
+
+    def _dependencies(self, names):
+        """Every user name the functions in 'names' use, directly or not."""
+        found, pending = set(), list(names)
+        while pending:
+            symbol = self._symbols.get(pending.pop())
+            for used in symbol.uses if symbol is not None else ():
+                if used not in found:
+                    found.add(used)
+                    pending.append(used)
+        return found
+
+    # --- Saving ---
+
+    def definitions(self):
+        """Every definition as a JSON-ready dict, in definition order."""
+        definitions = [symbol.definition() for symbol in self._symbols.values()]
+        return [definition for definition in definitions if definition is not None]
+
+    def load(self, definitions):
+        """Add definitions made by definitions(), skipping any that no longer work.
+
+        Returns the number loaded.
+        """
+        loaded = 0
+        for definition in definitions:
+            try:
+                if definition.get("params") is None:
+                    self.set_variable(definition["name"], definition["source"])
+                else:
+                    self.define_function(definition["name"], definition["params"],
+                                         definition["source"], definition.get("memoize", False))
+            except Exception:
+                continue
+            loaded += 1
+        return loaded
+
+    def sync(self, definitions):
+        """Make the table hold exactly 'definitions', redefining only what differs."""
+        wanted = {definition["name"]: definition for definition in definitions}
+        # Users go before the names they use
+        for name in reversed(list(self._symbols)):
+            if name not in wanted:
+                try:
+                    self.remove(name)
+                except ValueError:
+                    pass
+        current = {symbol.name: symbol.definition() for symbol in self._symbols.values()}
+        self.load([definition for definition in definitions
+                   if current.get(definition["name"]) != definition])
+
+
+class SymbolStore:
+    """Keeps a SymbolTable's definitions in a JSON file between sessions."""
+
+    def __init__(self, table, path=None):
+        path = path or os.environ.get(SYMBOLS_ENV) or DEFAULT_SYMBOLS_PATH
+        self.path = None if path == ":memory:" else path
+        self.table = table
+        self._saved = table.version
+        if self.path is not None:
+            # 'ans' changes on every '=', so it is only written out at exit
+            atexit.register(self.save)
+
+    def load(self):
+        """Add the saved definitions to the table; returns the number loaded."""
+        if self.path is None or not os.path.exists(self.path):
+            return 0
+        try:
+            with open(self.path, encoding="utf-8") as handle:
+                definitions = json.load(handle)
+        except (OSError, ValueError):
+            return 0
+        loaded = self.table.load(definitions if isinstance(definitions, list) else ())
+        self._saved = self.table.version
+        return loaded
+
+    def save(self):
+        """Write the definitions if they changed since the last load or save."""
+        if self.path is None or self._saved == self.table.version:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            temporary = self.path + ".tmp"
+            with open(temporary, "w", encoding="utf-8") as handle:
+                json.dump(self.table.definitions(), handle, indent=1)
+            os.replace(temporary, self.path)
+        except OSError:
+            return
+        self._saved = self.table.version
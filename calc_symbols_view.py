@@ -0,0 +1,110 @@
+"""
+Variables and functions window for PyCalc-Tk.
+
+Type a definition in the entry box and press Enter:
+
+    r = 3.2
+    f(x) = x**2 + sin(x)
+    memo g(n) = ...            (results memoized)
+
+Typing a name that is already defined replaces it. The list shows every
+definition; double-click or Enter puts the selected name into the
+calculator's expression, Delete removes it.
+"""
+from calc_ui import tk
+
+
+class SymbolsWindow:
+    """A Toplevel for defining, listing and removing user variables and functions."""
+
+    def __init__(self, master, table, on_pick, on_change, bg="#282c34", fg="#FFFFFF",
+                 font=("Arial", 14)):
+        self.table = table
+        self.on_pick = on_pick
+        self.on_change = on_change  # called after each definition or removal
+        self._shown = []
+
+        self.window = tk.Toplevel(master, bg=bg)
+        self.window.title("Variables & Functions")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        self.entry = tk.Entry(self.window, bg=bg, fg=fg, insertbackground=fg, font=font)
+        self.entry.pack(fill="x", padx=8, pady=(8, 4))
+        self.entry.bind("<Return>", self._define)
+
+        self.listbox = tk.Listbox(self.window, height=12, width=40, bg=bg, fg=fg, font=font,
+                                  activestyle="none", borderwidth=0, highlightthickness=0)
+        self.listbox.pack(expand=True, fill="both", padx=8)
+
+        self.status_label = tk.Label(self.window, text="", anchor=tk.W, bg=bg, fg=fg)
+        self.status_label.pack(fill="x", padx=8, pady=(4, 8))
+
+        self.listbox.bind("<Double-Button-1>", self._pick)
+        self.listbox.bind("<Return>", self._pick)
+        self.listbox.bind("<Delete>", self._remove)
+
+        self.refresh()
+        self.entry.focus_set()
+
+    def refresh(self):
+        """Re-read the definitions (e.g. after 'ans' changed)."""
+        self._shown = list(self.table)
+        self.listbox.delete(0, tk.END)
+        for symbol in self._shown:
+            self.listbox.insert(tk.END, symbol.text())
+        self.status_label.config(text=f"{len(self._shown)} definitions")
+
+    # --- Actions ---
+
+    def define(self, text):
+        """Define 'text' as typed in the entry; returns False (with a message) if it fails."""
+        try:
+            symbol = self.table.define(text)
+        except Exception as exc:
+            self.status_label.config(text=f"Error: {exc}")
+            return False
+        self.refresh()
+        self.status_label.config(text=f"Defined {symbol.name}")
+        self.on_change()
+        return True
+
+    def _define(self, event=None):
+        text = self.entry.get().strip()
+        if text and self.define(text):
+            self.entry.delete(0, tk.END)
+
+    def _selected(self):
+        selection = self.listbox.curselection()
+        if selection and selection[0] < len(self._shown):
+            return self._shown[selection[0]]
+        return None
+
+    def _pick(self, event=None):
+        symbol = self._selected()
+        if symbol is not None:
+            self.on_pick(symbol.name + "(" if symbol.is_function else symbol.name)
+
+    def _remove(self, event=None):
+        symbol = self._selected()
+        if symbol is None:
+            return
+        try:
+            self.table.remove(symbol.name)
+        except Exception as exc:
+            self.status_label.config(text=f"Error: {exc}")
+            return
+        self.refresh()
+        self.status_label.config(text=f"Removed {symbol.name}")
+        self.on_change()
+
+    def lift(self):
+        self.window.deiconify()
+        self.window.lift()
+        self.refresh()
+
+    def exists(self):
+        return self.window is not None
+
+    def close(self):
+        self.window.destroy()
+        self.window = None
@@ -0,0 +1,485 @@
+"""
+Tables of values for PyCalc-Tk.
+
+A Table is y = f(x) for any calculator expression in 'x', at x = start,
+start + step, ... up to stop. Nothing is stored. Row i is computed from
+x = start + i*step (not by adding up steps, so x doesn't drift), so any
+part of the table can be computed on its own:
+
+- TableView shows the table in place of the display labels. It has one
+  pair of labels for each visible row. Scrolling relabels them with the
+  rows now in view, which takes the same time at row 10 as at row 10
+  million.
+- Table.chunks() is a generator of rows, CHUNK_ROWS at a time, each chunk
+  evaluated in one vectorized pass (CalcEngine.evaluate_array). export()
+  streams those chunks to a file, so memory stays constant at any size.
+
+CSV files get an 'x,<expression>' header and one row per x. Files ending
+in one of calc_stats.BINARY_SUFFIXES get the y values only, as raw native
+float64, since x follows from the range. Either file can be loaded back in
+statistics mode ('o'). Undefined points are written as nan, including the
+ones NumPy computes as inf (1/x at 0).
+
+Usage:
+    python calc_table.py "sin(x)" --range 0,10,0.001             # CSV to stdout
+    python calc_table.py "x**2" --range 0,1e7,1 -o squares.f64
+"""
+import argparse
+import csv
+import math
+import os
+import re
+import sys
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from calc_engine import CalcEngine, format_result, load_numpy, prepare_expression
+from calc_stats import BINARY_SUFFIXES
+from calc_ui import tk
+
+# Rows evaluated (and written) at a time
+CHUNK_ROWS = 65536
+# Longest table; guards against a step typed too small
+MAX_ROWS = 10 ** 10
+
+# Range used until another is entered: start, stop, step
+DEFAULT_RANGE = (-10.0, 10.0, 1.0)
+# Rows (pairs of labels) in the view
+VISIBLE_ROWS = 6
+# How often the Tk thread checks on an export
+POLL_INTERVAL_MS = 50
+# Shown for x where the expression is undefined
+UNDEFINED_TEXT = "undefined"
+
+# Range items are separated by commas, semicolons or colons
+_RANGE_SEPARATOR_RE = re.compile(r"[,;:]")
+
+
+class TableError(ValueError):
+    """Raised when a table can't be built."""
+
+
+def parse_range(engine, text):
+    """'start, stop, step' as typed (each may be an expression, e.g. '2*π') -> floats."""
+    items = [item.strip() for item in _RANGE_SEPARATOR_RE.split(text)]
+    if len(items) != 3 or not all(items):
+        raise TableError("enter the range as start, stop, step")
+    try:
+        return tuple(float(engine.evaluate(prepare_expression(item))) for item in items)
+    except Exception as exc:
+        raise TableError(f"bad range: {exc}") from exc
+
+
+def range_text(start, stop, step):
+    return ", ".join(format_result(value) for value in (start, stop, step))
+
+
+class Table:
+    """y = f(x) at x = start, start + step, ... (stop included when the steps reach it)."""
+
+    def __init__(self, engine, expression, start, stop, step, variable="x"):
+        if not all(math.isfinite(value) for value in (start, stop, step)):
+            raise TableError("the range must be finite")
+        if step == 0 or (stop - start) / step < 0:
+            raise TableError("the step must go from start towards stop")
+        # The small allowance keeps stop in when rounding leaves it just out of reach
+        rows = math.floor((stop - start) / step + 1e-9) + 1
+        if rows > MAX_ROWS:
+            raise TableError(f"more than {MAX_ROWS:,} rows")
+        self.engine = engine
+        self.expression = expression
+        self.start, self.stop, self.step = start, stop, step
+        self.variable = variable
+        self.np = load_numpy()
+        self._rows = rows
+        # Fail now, with the expression's own error, rather than on every scroll
+        try:
+            self.values(0, 1)
+        except Exception as exc:
+            raise TableError(str(exc) or type(exc).__name__) from exc
+
+    def __len__(self):
+        return self._rows
+
+    def values(self, first, last):
+        """(xs, ys) for rows first..last-1: ndarrays with NumPy, otherwise lists."""
+        last = min(last, self._rows)
+        if self.np is not None:
+            xs = self.start + self.np.arange(first, last, dtype=float) * self.step
+        else:
+            xs = [self.start + index * self.step for index in range(first, last)]
+        return xs, self.engine.evaluate_array(self.expression, xs, self.variable)
+
+    def chunks(self, first=0, size=CHUNK_ROWS):
+        """Generate (xs, ys) for every row from 'first' on, 'size' rows at a time."""
+        for start in range(first, self._rows, size):
+            yield self.values(start, start + size)
+
+    def rows(self, first=0):
+        """Generate (x, y) float pairs for every row from 'first' on."""
+        for xs, ys in self.chunks(first):
+            if self.np is not None:
+                xs, ys = xs.tolist(), ys.tolist()
+            yield from zip(xs, ys)
+
+    def page(self, first, count):
+        """The (x, y) pairs of 'count' rows from 'first', e.g. the ones on screen."""
+        xs, ys = self.values(first, first + count)
+        if self.np is not None:
+            xs, ys = xs.tolist(), ys.tolist()
+        return list(zip(xs, ys))
+
+
+# --- Export ---
+
+def _finite_or_nan(table, ys):
+    """'ys' with every undefined point (inf as well as nan) as nan, like the view shows it."""
+    if table.np is not None:
+        ys[~table.np.isfinite(ys)] = table.np.nan
+        return ys
+    return [y if math.isfinite(y) else math.nan for y in ys]
+
+
+def write_csv(table, handle, cancelled=None, progress=None):
+    """Write 'x,<expression>' and every row to a text file; returns the rows written."""
+    csv.writer(handle, lineterminator="\n").writerow((table.variable, table.expression))
+    written = 0
+    for xs, ys in table.chunks():
+        if cancelled is not None and cancelled.is_set():
+            break
+        ys = _finite_or_nan(table, ys)
+        if table.np is not None:
+            xs, ys = xs.tolist(), ys.tolist()
+        # repr() round-trips every float, and no float repr contains a comma
+        handle.write("".join([f"{x!r},{y!r}\n" for x, y in zip(xs, ys)]))
+        written += len(xs)
+        if progress is not None:
+            progress(written)
+    return written
+
+
+def write_binary(table, handle, cancelled=None, progress=None):
+    """Write every y as raw native float64; returns the rows written."""
+    written = 0
+    for _, ys in table.chunks():
+        if cancelled is not None and cancelled.is_set():
+            break
+        ys = _finite_or_nan(table, ys)
+        handle.write(ys.tobytes() if table.np is not None else array("d", ys).tobytes())
+        written += len(ys)
+        if progress is not None:
+            progress(written)
+    return written
+
+
+def export(table, path, cancelled=None, progress=None):
+    """Stream the table to 'path', raw float64 for BINARY_SUFFIXES, else CSV.
+
+    The rows go to a '.part' file that replaces 'path' once complete; a
+    cancelled or failed export leaves 'path' untouched. Returns the rows
+    written, or None when cancelled.
+    """
+    binary = path.lower().endswith(BINARY_SUFFIXES)
+    partial = path + ".part"
+    try:
+        if binary:
+            with open(partial, "wb") as handle:
+                written = write_binary(table, handle, cancelled, progress)
+        else:
+            with open(partial, "w", newline="", encoding="utf-8") as handle:
+                written = write_csv(table, handle, cancelled, progress)
+        if cancelled is not None and cancelled.is_set():
+            os.remove(partial)
+            return None
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return written
+
+
+# --- Table Mode ---
+
+class TableView:
+    """The table in place of the calculator's display labels.
+
+    Only VISIBLE_ROWS rows have widgets; scrolling (scrollbar, mouse wheel,
+    arrow and page keys in the range box) relabels them, coalesced with
+    after_idle so a burst of wheel events computes one page. Type a new
+    range in the box and press Enter. Exports run on a background thread.
+    """
+
+    def __init__(self, master, engine, replaces=(), rows=VISIBLE_ROWS, bg="#282c34",
+                 fg="#abb2bf", accent="#FFFFFF", font=("Arial", 14)):
+        self.master = master
+        self.engine = engine
+        self.replaces = tuple(replaces)  # widgets hidden while the table is shown
+        self.visible = False
+        self.table = None
+        self.expression = ""
+        self.range = DEFAULT_RANGE
+        self.offset = 0
+        self.exported = 0  # rows written so far by the running export
+        self.notice = None  # how the last export ended, until the range changes
+        self._message = ""
+        self._draw_id = None
+        self._executor = None
+        self._future = None
+        self._exporting = None  # the Table being exported
+        self._cancelled = None
+        self._export_path = None
+        self._poll_id = None
+
+        self.frame = tk.Frame(master, bg=bg)
+        header = tk.Frame(self.frame, bg=bg)
+        header.pack(fill="x")
+        self.range_entry = tk.Entry(header, bg=bg, fg=accent, insertbackground=accent,
+                                    font=font, width=18)
+        self.range_entry.insert(0, range_text(*self.range))
+        # Keys typed here edit the range rather than reaching the calculator's bindings
+        self.range_entry.bindtags((str(self.range_entry), "Entry", "all"))
+        self.range_entry.bind("<Return>", self._on_range)
+        self.range_entry.bind("<Up>", lambda event: self.scroll(-1))
+        self.range_entry.bind("<Down>", lambda event: self.scroll(1))
+        self.range_entry.bind("<Prior>", lambda event: self.scroll(-self.rows))
+        self.range_entry.bind("<Next>", lambda event: self.scroll(self.rows))
+        self.range_entry.pack(side=tk.LEFT, padx=(4, 0))
+        self.export_button = tk.Button(header, text="Export…", command=self._on_export,
+                                       bg=bg, fg=accent, borderwidth=0)
+        self.export_button.pack(side=tk.RIGHT, padx=4)
+
+        body = tk.Frame(self.frame, bg=bg)
+        body.pack(expand=True, fill="both")
+        self.scrollbar = tk.Scrollbar(body, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill="y")
+        grid = tk.Frame(body, bg=bg)
+        grid.pack(side=tk.LEFT, expand=True, fill="both")
+        grid.columnconfigure(1, weight=1)
+        self.rows = rows
+        self._labels = []
+        for row in range(rows):
+            x_label = tk.Label(grid, text="", anchor=tk.E, bg=bg, fg=fg, font=font)
+            y_label = tk.Label(grid, text="", anchor=tk.E, bg=bg, fg=accent, font=font)
+            x_label.grid(row=row, column=0, sticky="e", padx=(4, 12))
+            y_label.grid(row=row, column=1, sticky="e", padx=(0, 4))
+            self._labels.append((x_label, y_label))
+
+        self.status_label = tk.Label(self.frame, text="", anchor=tk.W, bg=bg, fg=fg)
+        self.status_label.pack(fill="x", padx=4)
+
+        for widget in (self.frame, grid, *(label for pair in self._labels for label in pair)):
+            widget.bind("<MouseWheel>", self._on_wheel)
+            widget.bind("<Button-4>", lambda event: self.scroll(-3))
+            widget.bind("<Button-5>", lambda event: self.scroll(3))
+
+    # --- Showing ---
+
+    def show(self, expression):
+        """Tabulate 'expression' (in x) over the current range, replacing the labels."""
+        self.expression = expression
+        self._build()
+        if not self.visible:
+            for widget in self.replaces:
+                widget.pack_forget()
+            self.frame.pack(expand=True, fill="both")
+            self.visible = True
+        self.range_entry.focus_set()
+        self.draw()
+
+    def hide(self):
+        """Put the labels back; an export carries on in the background."""
+        if self._draw_id is not None:
+            self.master.after_cancel(self._draw_id)
+            self._draw_id = None
+        self.frame.pack_forget()
+        for widget in self.replaces:
+            widget.pack(expand=True, fill="both")
+        self.visible = False
+
+    def set_range(self, start, stop, step):
+        """Tabulate the same expression over a new range."""
+        self.range = (start, stop, step)
+        self._build()
+        self.draw()
+
+    def _build(self):
+        self.offset = 0
+        self.notice = None
+        try:
+            self.table = Table(self.engine, self.expression, *self.range)
+        except TableError as exc:
+            self.table = None
+            self._message = f"Can't tabulate: {exc}"
+        else:
+            self._message = f"y = {self.expression}"
+
+    def _on_range(self, event=None):
+        try:
+            self.set_range(*parse_range(self.engine, self.range_entry.get()))
+        except TableError as exc:
+            self.status_label.config(text=str(exc))
+        return "break"
+
+    # --- Scrolling ---
+
+    def scroll(self, rows):
+        """Move the visible rows by 'rows' (negative scrolls towards start)."""
+        self.offset += rows
+        self.schedule_draw()
+        return "break"
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.offset = int(float(amount) * len(self.table)) if self.table is not None else 0
+            self.schedule_draw()
+        elif action == "scroll":
+            self.scroll(int(amount) * (self.rows if unit == "pages" else 1))
+
+    def _on_wheel(self, event):
+        self.scroll(-3 if event.delta > 0 else 3)
+
+    # --- Drawing ---
+
+    def schedule_draw(self):
+        if self.visible and self._draw_id is None:
+            self._draw_id = self.master.after_idle(self.draw)
+
+    def draw(self):
+        """Label the visible rows now."""
+        self._draw_id = None
+        total = len(self.table) if self.table is not None else 0
+        self.offset = max(0, min(self.offset, total - self.rows))
+        shown = []
+        if self.table is not None:
+            try:
+                shown = self.table.page(self.offset, self.rows)
+            except Exception as exc:  # e.g. a user function removed meanwhile
+                self._message = f"Can't tabulate: {exc}"
+        for index, (x_label, y_label) in enumerate(self._labels):
+            if index < len(shown):
+                x, y = shown[index]
+                x_label.config(text=format_result(x))
+                y_label.config(text=format_result(y) if math.isfinite(y) else UNDEFINED_TEXT)
+            else:
+                x_label.config(text="")
+                y_label.config(text="")
+        if total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + len(shown)) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        self._show_status()
+
+    def _show_status(self):
+        if self._future is not None:
+            text = f"Exporting… {self.exported:,} of {len(self._exporting):,} rows"
+        elif self.notice is not None:
+            text = self.notice
+        elif self.table is not None:
+            text = f"{self._message}    {len(self.table):,} rows"
+        else:
+            text = self._message
+        self.status_label.config(text=text)
+
+    # --- Export ---
+
+    @property
+    def exporting(self):
+        return self._future is not None
+
+    def _on_export(self):
+        if self.exporting:
+            self.cancel_export()
+            self.notice = "Export cancelled"
+            self._show_status()
+            return
+        if self.table is None:
+            return
+        from tkinter import filedialog
+        path = filedialog.asksaveasfilename(
+            parent=self.master, title="Export table", defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("Raw float64", "*.f64 *.bin *.dat *.raw"),
+                       ("All files", "*")])
+        if path:
+            self.start_export(path)
+
+    def start_export(self, path):
+        """Write the current table to 'path' in the background."""
+        self.cancel_export()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="calc-table")
+        self.exported = 0
+        self.notice = None
+        self._exporting = self.table
+        self._export_path = path
+        self._cancelled = threading.Event()
+        self._future = self._executor.submit(export, self.table, path, self._cancelled,
+                                             self._on_progress)
+        self._poll_id = self.master.after(POLL_INTERVAL_MS, self._poll)
+        self.export_button.config(text="Cancel")
+        self._show_status()
+
+    def _on_progress(self, written):
+        # Called on the export thread; the Tk thread reads it when polling
+        self.exported = written
+
+    def cancel_export(self):
+        """Stop a running export; the file it was writing is not created."""
+        if self._poll_id is not None:
+            self.master.after_cancel(self._poll_id)
+            self._poll_id = None
+        if self._future is not None:
+            self._cancelled.set()
+            self._future = self._exporting = None
+            self.export_button.config(text="Export…")
+
+    def _poll(self):
+        self._poll_id = None
+        future = self._future
+        if future is None:
+            return
+        if future.done():
+            self._future = self._exporting = None
+            self.export_button.config(text="Export…")
+            try:
+                written = future.result()
+            except (OSError, ValueError) as exc:
+                self.notice = f"Export failed: {exc}"
+            else:
+                name = os.path.basename(self._export_path)
+                self.notice = f"Saved {written:,} rows to {name}"
+        else:
+            self._poll_id = self.master.after(POLL_INTERVAL_MS, self._poll)
+        self._show_status()
+
+    def close(self):
+        self.cancel_export()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tabulate an expression in x.")
+    parser.add_argument("expression", help="calculator expression in x, e.g. 'sin(x)*x'")
+    parser.add_argument("--range", default=range_text(*DEFAULT_RANGE),
+                        help="start, stop, step (default %(default)s)")
+    parser.add_argument("-o", "--output", help="CSV file, or raw float64 (" +
+                        ", ".join(BINARY_SUFFIXES) + "); default CSV to stdout")
+    args = parser.parse_args(argv)
+
+    engine = CalcEngine()
+    try:
+        table = Table(engine, args.expression, *parse_range(engine, args.range))
+    except TableError as exc:
+        parser.error(str(exc))
+    if args.output:
+        export(table, args.output)
+    else:
+        write_csv(table, sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+"""
+Shared Tk plumbing for the PyCalc-Tk windows.
+
+- 'tk' is tkinter behind importlib's LazyLoader. Importing a calculator (or
+  any helper that builds widgets) does not load Tcl/Tk; that only happens
+  when the first widget is created. The evaluation modules never touch it.
+- HoverStyles gives many buttons their hover colours through one class
+  binding, instead of an <Enter>/<Leave> pair of Python callbacks per button.
+- grid_rows places a keypad with one Tk call per row instead of one per
+  button.
+- RenderScheduler coalesces display updates: widgets are marked dirty as
+  the state changes and redrawn at most once per frame.
+- StartupTimer reports how long a cold start took, stage by stage, up to
+  the first frame on screen. Set PYCALC_STARTUP to a file path (or '-' for
+  stderr) to get a JSON report.
+"""
+import importlib.util
+import itertools
+import json
+import os
+import sys
+import time
+import types
+
+
+def lazy_import(name):
+    """Import module 'name' lazily: it is only executed on first attribute access.
+
+    If the module is not installed, the error is raised at that first access
+    too, so code that never builds a widget runs without it.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        return _MissingModule(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+class _MissingModule(types.ModuleType):
+    def __getattr__(self, attribute):
+        raise ModuleNotFoundError(f"No module named {self.__name__!r}", name=self.__name__)
+
+
+tk = lazy_import("tkinter")
+
+
+# --- Hover Effects ---
+
+class HoverStyles:
+    """Hover colours for many widgets, handled by a single class binding.
+
+    Each registered widget gets 'tag' prepended to its bindtags, so Tk runs
+    the one <Enter>/<Leave> handler for all of them before the widget's own
+    class bindings, exactly where per-widget bindings used to run. Class
+    bindings are per Tk interpreter, so each instance gets its own tag and
+    several calculators can share one root.
+    """
+
+    _instances = itertools.count()
+
+    def __init__(self, master, tag="CalcHover"):
+        self.tag = f"{tag}{next(self._instances)}"
+        self._styles = {}  # widget path -> (options on enter, options on leave)
+        master.bind_class(self.tag, "<Enter>", self._on_enter)
+        master.bind_class(self.tag, "<Leave>", self._on_leave)
+
+    def add(self, widget, enter, leave):
+        """Apply the 'enter' options while the pointer is over 'widget', 'leave' after."""
+        self._styles[str(widget)] = (enter, leave)
+        widget.bindtags((self.tag,) + tuple(widget.bindtags()))
+
+    def _on_enter(self, event):
+        style = self._styles.get(str(event.widget))
+        if style is not None:
+            event.widget.configure(**style[0])
+
+    def _on_leave(self, event):
+        style = self._styles.get(str(event.widget))
+        if style is not None:
+            event.widget.configure(**style[1])
+
+
+# --- Layout ---
+
+def grid_rows(cells, **options):
+    """Grid many widgets with one Tk call per row rather than one per widget.
+
+    'cells' holds (widget, row, column, columnspan) tuples; 'options' (sticky,
+    padx, ...) apply to all of them. Each row is one 'grid configure' in Tk's
+    relative syntax: 'x' skips a column and '-' widens the widget before it.
+    """
+    rows = {}
+    for widget, row, column, span in cells:
+        rows.setdefault(row, []).append((column, span, widget))
+    flags = [item for name, value in options.items() for item in ("-" + name, value)]
+    for row, placed in rows.items():
+        slaves, next_column = [], 0
+        for column, span, widget in sorted(placed, key=lambda cell: cell[0]):
+            slaves += ["x"] * (column - next_column) + [str(widget)] + ["-"] * (span - 1)
+            next_column = column + span
+        widget.tk.call("grid", "configure", *slaves, "-row", row, *flags)
+
+
+# --- Display Updates ---
+
+class RenderScheduler:
+    """Redraws dirty widgets once per frame instead of on every change.
+
+    invalidate(widget, render) only records that 'widget' needs redrawing;
+    the first call schedules flush() with after_idle, so any number of
+    changes made while handling one batch of events (key auto-repeat, a
+    paste, a scripted run) costs a single redraw. flush() asks each dirty
+    widget's 'render' function for its text once, and skips config() when
+    the text is what the widget already shows.
+
+    With a calc_profile.Profiler in 'profiler', each flush is timed as the
+    'redraw' stage. A redraw still pending when 'master' is destroyed is
+    dropped, as its widgets are gone.
+    """
+
+    def __init__(self, master):
+        self.master = master
+        self._dirty = {}  # widget -> render function, in invalidation order
+        self._shown = {}  # widget -> text it currently shows
+        self._after_id = None
+        self.redraws = 0
+        self.skipped = 0  # flushed widgets whose text had not changed
+        self.profiler = None
+        master.bind("<Destroy>", self._on_destroy, "+")
+
+    @property
+    def pending(self):
+        """Whether a redraw is scheduled."""
+        return self._after_id is not None
+
+    def invalidate(self, widget, render):
+        """Mark 'widget' for redrawing with the text 'render()' returns."""
+        self._dirty[widget] = render
+        if self._after_id is None:
+            self._after_id = self.master.after_idle(self._on_idle)
+
+    def cancel(self):
+        """Forget the pending redraw, if any, without drawing."""
+        if self._after_id is not None:
+            self.master.after_cancel(self._after_id)
+            self._after_id = None
+        self._dirty.clear()
+
+    def _on_destroy(self, event):
+        # <Destroy> reaches the toplevel once for each of its children too
+        if event.widget is self.master:
+            self.cancel()
+
+    def _on_idle(self):
+        self._after_id = None
+        self.flush()
+
+    def flush(self):
+        """Redraw every dirty widget now."""
+        if self._after_id is not None:
+            # Called directly: the idle callback is no longer needed
+            self.master.after_cancel(self._after_id)
+            self._after_id = None
+        profiler = self.profiler
+        if profiler is not None:
+            started = profiler.clock()
+        dirty, self._dirty = self._dirty, {}
+        for widget, render in dirty.items():
+            text = render()
+            if self._shown.get(widget) == text:
+                self.skipped += 1
+                continue
+            self._shown[widget] = text
+            widget.config(text=text)
+            self.redraws += 1
+        if profiler is not None:
+            profiler.record("redraw", profiler.clock() - started)
+            profiler.painted()
+
+
+# --- Startup Timing ---
+
+# Environment variable naming where to write the startup report ('-' = stderr)
+STARTUP_ENV = "PYCALC_STARTUP"
+# Set (to anything) to quit as soon as the first frame is up, for benchmarks
+STARTUP_EXIT_ENV = "PYCALC_STARTUP_EXIT"
+
+
+class NullStartupTimer:
+    """Stands in for a StartupTimer when no report was asked for."""
+
+    def mark(self, stage):
+        pass
+
+    def watch_first_frame(self, master):
+        pass
+
+
+class StartupTimer:
+    """Times the stages of a cold start, from 'started' to the first mapped frame."""
+
+    def __init__(self, started, variant=None, path="-"):
+        self.started = started
+        self.variant = variant
+        self.path = path
+        self.stages = []  # (stage, seconds since 'started')
+        self._frame_binding = None
+
+    def mark(self, stage):
+        """Record that 'stage' just finished."""
+        self.stages.append((stage, time.perf_counter() - self.started))
+
+    def watch_first_frame(self, master):
+        """Finish the report once 'master' is first mapped and drawn."""
+        self._frame_binding = master.bind("<Map>", lambda event: self._mapped(master), "+")
+
+    def _mapped(self, master):
+        if self._frame_binding is None:
+            return
+        master.unbind("<Map>", self._frame_binding)
+        self._frame_binding = None
+        # Let the pending redraws run, so the frame is actually on screen
+        master.update_idletasks()
+        self.mark("first_frame")
+        self.write()
+        if os.environ.get(STARTUP_EXIT_ENV):
+            master.after(0, master.destroy)
+
+    def report(self):
+        stages = {}
+        previous = 0.0
+        for stage, elapsed in self.stages:
+            stages[stage] = round((elapsed - previous) * 1000, 3)
+            previous = elapsed
+        return {
+            "variant": self.variant,
+            "stages_ms": stages,
+            "total_ms": round(previous * 1000, 3),
+            "modules": len(sys.modules),
+            "tkinter_loaded": "_tkinter" in sys.modules,
+            "numpy_loaded": "numpy" in sys.modules,
+        }
+
+    def write(self):
+        text = json.dumps(self.report(), sort_keys=True)
+        if self.path == "-":
+            print(text, file=sys.stderr)
+        else:
+            with open(self.path, "a", encoding="utf-8") as handle:
+                handle.write(text + "\n")
+
+
+def startup_timer(started, variant):
+    """The timer the calculators use: a StartupTimer if PYCALC_STARTUP is set."""
+    path = os.environ.get(STARTUP_ENV)
+    if not path:
+        return NullStartupTimer()
+    return StartupTimer(started, variant, path)
@@ -1,6 +1,27 @@
-import tkinter as tk
+import time
+
+# Taken before anything else is imported, for the startup report
+_STARTED = time.perf_counter()
+
 import math
 
+from calc_bignum import Abbreviated
+from calc_budget import BUDGET_ERROR_TEXT, BudgetExceeded
+from calc_engine import CalcEngine, prepare_expression
+from calc_history import HistoryStore
+from calc_matrix import MATRIX_FUNCTIONS
+from calc_preview import LivePreview
+from calc_profile import attach, profiler_from_env
+from calc_shared import PRIVATE_PATH, when_done
+from calc_session import (EVENT_ADD, EVENT_ADD_DATA, EVENT_ADD_DATA_TEXT, EVENT_BACKSPACE,
+                          EVENT_CLEAR, EVENT_EVALUATE, EVENT_FUNCTION, EVENT_OPERATOR,
+                          EVENT_SET_ENTRY, EVENT_SQUARE, EVENT_SYMBOLS, EVENT_TOGGLE_SIGN,
+                          EVENT_TOGGLE_STATS, session_recorder, symbols_text)
+from calc_solve import SOLVER_FUNCTIONS
+from calc_symbols import ANSWER, SymbolStore
+from calc_state import CLOSE, CONSTANT, DIGIT, ExpressionBuffer
+from calc_ui import HoverStyles, RenderScheduler, grid_rows, startup_timer, tk
+
 # --- Enhanced Constants for Styling (Modern Dark Theme) ---
 # Deep Dark Theme Palette
 DEEP_DARK = "#1a1a2e"       # Background
@@ -32,16 +53,22 @@ class ScientificCalculator:
     advanced mathematical functions, and a secure evaluation engine.
     """
 
-    def __init__(self, master):
-        """Initialize the calculator and its GUI components."""
+    def __init__(self, master, shared=None):
+        """Initialize the calculator and its GUI components.
+
+        With a calc_shared.SharedEngine, the engine shares its caches and
+        worker threads with every other pane built with it, '=' is evaluated
+        by a worker, and history and definitions are kept in memory only.
+        """
         self.master = master
+        self.shared = shared
         master.title("Scientific Calculator")
         master.geometry("500x700")  # Wider for more columns
         master.configure(bg=DEEP_DARK)
 
-        # Initialize expression strings
-        self.total_expression = ""
-        self.current_expression = ""
+        # Expression state, updated incrementally on every keystroke
+        self.total = ExpressionBuffer()
+        self.current = ExpressionBuffer()
 
         # Allowed names for the safe evaluation
         self.allowed_names = {
@@ -54,6 +81,15 @@ class ScientificCalculator:
             "cos": math.cos,
             "tan": math.tan
         }
+        # Vector and matrix functions for list literals such as [[1, 2], [3, 4]]
+        self.allowed_names.update(MATRIX_FUNCTIONS)
+        # Solvers taking a function of x: root(f, a[, b]), integrate(f, a, b), diff(f, x0)
+        self.allowed_names.update(SOLVER_FUNCTIONS)
+        # Compiled-expression engine built on the same whitelist
+        if shared is not None:
+            self.engine = shared.connect(self.allowed_names)
+        else:
+            self.engine = CalcEngine(self.allowed_names)
 
         # Create frames for display and buttons
         self.display_frame = self._create_display_frame()
@@ -64,6 +100,49 @@ class ScientificCalculator:
 
         # Create display labels
         self.total_label, self.label = self._create_display_labels()
+        self.preview_label = self._create_preview_label()
+        # Label changes are coalesced and drawn once per frame
+        self.renderer = RenderScheduler(master)
+
+        # Live result preview, computed off the Tk thread while typing (a
+        # shared pane's on its own engine, in the shared pool)
+        preview_pool = {} if shared is None else {"engine": self.engine,
+                                                  "executor": shared.executor}
+        self.preview = LivePreview(master, self.allowed_names,
+                                   lambda text: self.preview_label.config(text=text),
+                                   **preview_pool)
+
+        # Every evaluation is kept in a persistent, searchable history (a
+        # shared pane's in memory, so the next kiosk user doesn't see it)
+        self.history = HistoryStore(PRIVATE_PATH if shared is not None else None)
+        self.history_window = None
+        # User variables and functions ('v'), kept between sessions (except
+        # in shared panes); the preview's engine gets a copy of them
+        self.symbol_store = SymbolStore(self.engine.symbols,
+                                        PRIVATE_PATH if shared is not None else None)
+        self.symbol_store.load()
+        self.preview.set_symbols(self.engine.symbols.definitions())
+        self.symbols_window = None
+        # The text of the last result; an Abbreviated one can be copied in full
+        self.last_result = None
+        # The '=' a shared engine's worker is computing, if any
+        self._pending = None
+        # Graph of the expression in x, created the first time it is shown
+        self.plot_view = None
+        # Table of values of the expression in x, created the first time it is shown
+        self.table_view = None
+        # Statistics mode (see toggle_stats); None while calculating normally
+        self.stats_mode = None
+        # Keypress recording for audit replay (enabled by PYCALC_SESSION),
+        # starting from the definitions loaded above
+        self.session = session_recorder("v2")
+        self.session.record(EVENT_SYMBOLS, symbols_text(self.engine.symbols))
+        # Hot-path timings (see calc_profile): from startup with PYCALC_PROFILE,
+        # otherwise only while the overlay ('p') is shown
+        self.profiler = profiler_from_env("v2")
+        self.profile_overlay = None
+        if self.profiler is not None:
+            attach(self.profiler, master, self.engine, self.renderer)
 
         # Define the button layout (6 rows, 5 columns)
         # Format: 'Text': (row, col, colspan, style_tuple, key_binding_text)
@@ -86,6 +165,8 @@ class ScientificCalculator:
             'π': (6, 0, 1, STYLE_DIGIT, None), 'e': (6, 1, 1, STYLE_DIGIT, None), 
             '=': (6, 2, 3, STYLE_EQUALS, 'Return'), # = spans 3 columns
         }
+        # One class binding serves the hover effect of every button
+        self.hover = HoverStyles(master)
         self._create_buttons()
         self._bind_keys()
     
@@ -97,11 +178,10 @@ class ScientificCalculator:
         self.master.rowconfigure(1, weight=5)   # Buttons frame
         self.master.columnconfigure(0, weight=1)
 
-        # Configure button frame grid for 6 rows and 5 columns
-        for i in range(1, 7): 
-            self.buttons_frame.rowconfigure(i, weight=1)
-        for i in range(5):
-            self.buttons_frame.columnconfigure(i, weight=1)
+        # Configure button frame grid for 6 rows and 5 columns, one grid call
+        # per axis (Tk takes a list of indices)
+        self.buttons_frame.rowconfigure(tuple(range(1, 7)), weight=1)
+        self.buttons_frame.columnconfigure(tuple(range(5)), weight=1)
 
     def _create_display_frame(self):
         """Create the frame that holds the display labels."""
@@ -117,24 +197,33 @@ class ScientificCalculator:
 
     def _create_display_labels(self):
         """Create the labels for showing expressions and results."""
-        total_label = tk.Label(self.display_frame, text=self.total_expression, anchor=tk.E,
+        total_label = tk.Label(self.display_frame, text="", anchor=tk.E,
                                bg=DEEP_DARK, fg=LIGHT_TEXT, padx=15, font=(FONT_FAMILY, SMALL_FONT_SIZE))
         total_label.pack(expand=True, fill='both')
 
         # 'justify=tk.RIGHT' ensures text stays right-aligned if it wraps (less common in a calculator)
-        label = tk.Label(self.display_frame, text=self.current_expression, anchor=tk.E, justify=tk.RIGHT,
+        label = tk.Label(self.display_frame, text="", anchor=tk.E, justify=tk.RIGHT,
                          bg=DEEP_DARK, fg=WHITE_TEXT, padx=15, font=(FONT_FAMILY, LARGE_FONT_SIZE), wraplength=480)
         label.pack(expand=True, fill='both')
         return total_label, label
 
+    def _create_preview_label(self):
+        """Create the small label under the display that previews the result."""
+        preview_label = tk.Label(self.display_frame, text="", anchor=tk.E,
+                                 bg=DEEP_DARK, fg=LIGHT_TEXT, padx=15, font=(FONT_FAMILY, SMALL_FONT_SIZE))
+        preview_label.pack(expand=True, fill='both')
+        return preview_label
+
     def _create_buttons(self):
-        """Create and place all calculator buttons based on the defined layout."""
+        """Create all calculator buttons, then place them with one grid call per row."""
+        cells = []
         for btn_text, grid_info in self.buttons.items():
             row, col, colspan, style_tuple, _ = grid_info
-            self._add_button(btn_text, row, col, colspan, style_tuple)
+            cells.append((self._add_button(btn_text, style_tuple), row, col, colspan))
+        grid_rows(cells, sticky="nsew", padx=1, pady=1)
 
-    def _add_button(self, text, row, col, colspan, style_tuple):
-        """Helper method to create a single button."""
+    def _add_button(self, text, style_tuple):
+        """Helper method to create a single button (placed by _create_buttons)."""
         bg_color, fg_color, font_size, hover_color = style_tuple
         font_style = (FONT_FAMILY, font_size, "bold") if font_size > MEDIUM_FONT_SIZE else (FONT_FAMILY, font_size)
 
@@ -142,16 +231,15 @@ class ScientificCalculator:
         
         button = tk.Button(self.buttons_frame, text=text, bg=bg_color, fg=fg_color,
                            font=font_style, borderwidth=0, command=command, highlightthickness=0)
-        button.grid(row=row, column=col, columnspan=colspan, sticky="nsew", padx=1, pady=1)
 
         # Add a slightly different hover effect for the scientific buttons
         # The scientific buttons have a hover_color equal to their bg_color, but they change fg_color
         if style_tuple == STYLE_SCIENTIFIC:
-             button.bind("<Enter>", lambda event, h_color=ACCENT_GREEN, f_color=WHITE_TEXT: event.widget.config(bg=h_color, fg=DEEP_DARK))
-             button.bind("<Leave>", lambda event, b_color=bg_color, f_color=DEEP_DARK: event.widget.config(bg=b_color, fg=WHITE_TEXT))
+             self.hover.add(button, {"bg": ACCENT_GREEN, "fg": DEEP_DARK},
+                            {"bg": bg_color, "fg": WHITE_TEXT})
         else:
-             button.bind("<Enter>", lambda event, h_color=hover_color: event.widget.config(bg=h_color))
-             button.bind("<Leave>", lambda event, b_color=bg_color: event.widget.config(bg=b_color))
+             self.hover.add(button, {"bg": hover_color}, {"bg": bg_color})
+        return button
 
 
     # --- Command and Key Binding Methods ---
@@ -210,105 +298,171 @@ class ScientificCalculator:
         # Also bind parentheses keys explicitly
         self.master.bind("(", lambda event: self.add_to_expression("("))
         self.master.bind(")", lambda event: self.add_to_expression(")"))
+        self.master.bind("h", lambda event: self.show_history())
+        self.master.bind("H", lambda event: self.show_history())
+        self.master.bind("<Control-c>", lambda event: self.copy_result())
+        self.master.bind("v", lambda event: self.show_symbols())
+        self.master.bind("V", lambda event: self.show_symbols())
+        self.master.bind("a", lambda event: self.add_function(ANSWER))
+        self.master.bind("A", lambda event: self.add_function(ANSWER))
+        self.master.bind("x", lambda event: self.add_to_expression("x"))
+        self.master.bind("g", lambda event: self.toggle_plot())
+        self.master.bind("G", lambda event: self.toggle_plot())
+        self.master.bind("t", lambda event: self.toggle_table())
+        self.master.bind("T", lambda event: self.toggle_table())
+        self.master.bind("s", lambda event: self.toggle_stats())
+        self.master.bind("S", lambda event: self.toggle_stats())
+        self.master.bind(",", lambda event: self.add_comma())
+        self.master.bind("[", lambda event: self.add_to_expression("["))
+        self.master.bind("]", lambda event: self.add_to_expression("]"))
+        self.master.bind("@", lambda event: self.add_operator("@"))
+        self.master.bind("o", lambda event: self.open_data_file())
+        self.master.bind("O", lambda event: self.open_data_file())
+        self.master.bind("<<Paste>>", lambda event: self.paste_data())
+        self.master.bind("p", lambda event: self.toggle_profile())
+        self.master.bind("P", lambda event: self.toggle_profile())
+        for key, function in (("r", "root("), ("i", "integrate("), ("d", "diff(")):
+            self.master.bind(key, lambda event, text=function: self.add_function(text))
+            self.master.bind(key.upper(), lambda event, text=function: self.add_function(text))
+
+    # --- Expression State ---
+
+    @property
+    def current_expression(self):
+        """The entry being typed, as a string."""
+        return self.current.text
+
+    @current_expression.setter
+    def current_expression(self, text):
+        self.current.set(text)
+
+    @property
+    def total_expression(self):
+        """The finished part of the expression (shown on the top line), as a string."""
+        return self.total.text
+
+    @total_expression.setter
+    def total_expression(self, text):
+        self.total.set(text)
+
+    def _full_expression(self):
+        return self.total.text + self.current.text
 
     # --- Core Calculator Logic ---
 
     def add_to_expression(self, value):
         """Append a value (digit, '.', 'π', 'e') to the current expression, with smart multiplication."""
+        self.session.record(EVENT_ADD, value)
         # Smart multiplication for expressions like 5(3+1) or 5π
-        if (value == "(" and self.current_expression and self.current_expression[-1].isdigit()):
-            self.current_expression += "*"
+        if (value == "(" and self.current.last_kind == DIGIT):
+            self.current.append("*")
         
         # Smart multiplication for expressions like )3 or π3
-        elif value.isdigit() and self.current_expression and self.current_expression[-1] in ")πe":
-            self.current_expression += "*"
+        elif value.isdigit() and self.current.last_kind in (CLOSE, CONSTANT):
+            self.current.append("*")
 
-        # Check for 'π' or 'e' next to a digit (e.g., 5π)
-        if value in "πe" and self.current_expression and self.current_expression[-1].isdigit():
-             self.current_expression += "*"
+        # Check for 'π', 'e' or 'x' next to a digit (e.g., 5π, 2x)
+        if value in "πex" and self.current.last_kind == DIGIT:
+             self.current.append("*")
 
-        self.current_expression += str(value)
+        self.current.append(str(value))
         self.update_label()
+        self._update_preview()
 
     def add_function(self, function_str):
         """Adds a function (like sqrt(, sin() to the expression."""
+        self.session.record(EVENT_FUNCTION, function_str)
         # Smart multiplication if adding a function after a number (e.g., 5sin(30))
-        if self.current_expression and self.current_expression[-1].isdigit() and not function_str.startswith('('):
-            self.current_expression += "*"
+        if self.current.last_kind == DIGIT and not function_str.startswith('('):
+            self.current.append("*")
         
-        self.current_expression += function_str
+        self.current.append(function_str)
         self.update_label()
+        self._update_preview()
 
     def add_operator(self, operator):
         """Handle adding binary operators to the expression."""
-        if self.current_expression or self.total_expression:
-            if not self.current_expression and self.total_expression:
+        self.session.record(EVENT_OPERATOR, operator)
+        if self.current or self.total:
+            if not self.current and self.total:
                 # Allows changing the operator at the end of total_expression, e.g., 5+ becomes 5-
                 # Check for functions like 'sqrt(' before replacing the last character
-                if self.total_expression[-1] in "+-*/":
-                    self.total_expression = self.total_expression[:-1] + operator
+                if self.total.last_char in "+-*/":
+                    self.total.replace_last(operator)
                 # If it's not a simple operator, we don't allow changing it easily (e.g., '5sqrt' should not become '5-')
-                elif self.current_expression:
-                    self.total_expression += self.current_expression + operator
             else:
-                self.total_expression += self.current_expression + operator
+                self.total.extend(self.current)
+                self.total.append(operator)
             
-            self.current_expression = ""
+            self.current.clear()
             self.update_total_label()
             self.update_label()
+            self._update_preview()
         
     def clear(self):
         """Clear both expression fields."""
-        self.current_expression = ""
-        self.total_expression = ""
+        self.session.record(EVENT_CLEAR)
+        if self.stats_mode is not None and not self.current:
+            # Nothing typed: clear the data instead
+            self.stats_mode.reset()
+        self.current.clear()
+        self.total.clear()
+        self.preview.clear()
+        self._pending = None  # a result still computing is not shown
         self.update_label()
         self.update_total_label()
 
     def backspace(self):
         """Remove the last character from the current expression."""
-        self.current_expression = self.current_expression[:-1]
+        self.session.record(EVENT_BACKSPACE)
+        self.current.pop()
         self.update_label()
+        self._update_preview()
         
     def toggle_sign(self):
         """Toggle the sign of the current number."""
-        if self.current_expression:
+        self.session.record(EVENT_TOGGLE_SIGN)
+        if self.current:
             try:
                 # Try to find the last number/parentheses block to negate
-                if self.current_expression.endswith(')'):
+                if self.current.last_char == ')':
                     # Simple case: wrap with -()
                     # Need more robust parsing for advanced cases, but for simple number/result negation:
-                    if self.current_expression.startswith('-(') and self.current_expression.endswith(')'):
-                        self.current_expression = self.current_expression[2:-1] # Remove -()
+                    if self.current.startswith('-('):
+                        self.current.remove_prefix(2) # Remove -()
+                        self.current.pop()
                     else:
-                        self.current_expression = f"-({self.current_expression})"
-                elif self.current_expression.startswith('-'):
-                    self.current_expression = self.current_expression[1:]
+                        self.current.prepend("-(")
+                        self.current.append(")")
+                elif self.current.first_char == '-':
+                    self.current.remove_prefix(1)
                 else:
-                    self.current_expression = '-' + self.current_expression
+                    self.current.prepend('-')
                 self.update_label()
+                self._update_preview()
             except:
                 pass # Do nothing if complex expression is being built
 
     def square(self):
         """Square the current number/expression."""
-        if self.current_expression:
+        self.session.record(EVENT_SQUARE)
+        if self.current:
             # Wrap in parentheses to ensure correct order of operations (e.g., -5 squared is 25)
-            self.current_expression = f"({self.current_expression})**2"
+            self.current.prepend("(")
+            self.current.append(")**2")
             self.update_label()
+            self._update_preview()
 
     def handle_parentheses(self):
         """Smartly adds opening or closing parentheses."""
-        open_paren = self.current_expression.count("(")
-        close_paren = self.current_expression.count(")")
-        
         # Check if we should close the current parenthesis
-        if open_paren > close_paren and self.current_expression and self.current_expression[-1] not in "+-*/(":
+        if self.current.depth > 0 and self.current.last_char not in "+-*/(":
             self.add_to_expression(")")
         
         # Otherwise, add an opening parenthesis
         else:
             # If the last character is a digit or ')' or 'π', automatically add multiplication before '('
-            if self.current_expression and self.current_expression[-1] in "0123456789)πe":
+            if self.current.last_kind in (DIGIT, CLOSE, CONSTANT):
                 self.add_to_expression("*(")
             else:
                 self.add_to_expression("(")
@@ -316,61 +470,296 @@ class ScientificCalculator:
 
     def evaluate(self):
         """Evaluate the full expression and show the result."""
-        full_expression = self.total_expression + self.current_expression
+        if self.stats_mode is not None:
+            self.add_data_point()
+            return
+        full_expression = self._full_expression()
         if not full_expression:
+            self.session.record(EVENT_EVALUATE)
             return
-
-        # Ensure all open parentheses are closed for eval to work
-        open_paren_count = full_expression.count('(')
-        close_paren_count = full_expression.count(')')
-        if open_paren_count > close_paren_count:
-            full_expression += ')' * (open_paren_count - close_paren_count)
-
+        # The result replaces the preview
+        self.preview.clear()
+
+        start = time.perf_counter()
+
+        # Ensure all open parentheses are closed for eval to work (the buffers
+        # already know how many are open, so no rescan is needed)
+        missing = self.total.depth + self.current.depth
+        if missing > 0:
+            full_expression += ")" * missing
+
+        if self.shared is not None:
+            # A worker computes it, so this pane and the others keep
+            # responding; the result is shown when it arrives
+            future = self._pending = self.shared.submit(self.engine, full_expression)
+            when_done(self.master, future,
+                      lambda future: self._finish_evaluate(full_expression, start, future))
+            return
+        self._finish_evaluate(full_expression, start)
+
+    def _finish_evaluate(self, full_expression, start, future=None):
+        """Show the result of '=', computed here or by a shared worker ('future')."""
+        if future is not None:
+            if future is not self._pending:
+                return  # cleared or evaluated again meanwhile
+            self._pending = None
         try:
-            # Replace user-friendly symbols with Python-compatible ones
-            expression_to_eval = full_expression.replace('π', 'pi').replace('log', 'log10') # log is now log10
-
-            # Use a controlled eval for security
-            result = eval(expression_to_eval, {"__builtins__": {}}, self.allowed_names)
-
-            # Format result to remove unnecessary .0 and limit precision
-            if isinstance(result, (int, float)):
-                if abs(result) < 1e15: # Avoid sci-notation for large integers
-                    if result == int(result):
-                        result = int(result)
-                    else:
-                         # Round to 10 decimal places for clean display
-                         result = round(result, 10)
-                
-            self.current_expression = str(result)
-            self.total_expression = full_expression + " = "
-
+            # The engine replaces 'π'/'log', evaluates against the whitelist with a
+            # cached compiled expression, and rounds/collapses the result for display
+            if future is not None:
+                self.last_result = future.result()
+            else:
+                self.last_result = self.engine.calculate(full_expression)
+            self.current.set(self.last_result)
+            self._remember_answer()
+            self.total.set(full_expression + " = ")
+
+        except BudgetExceeded:
+            # Too large/deep/slow to evaluate: say so rather than a generic error
+            self.current.set(BUDGET_ERROR_TEXT)
+            self.total.clear()
         except Exception as e:
             # print(f"Error: {e}") # For debugging
-            self.current_expression = "Error"
-            self.total_expression = ""
+            self.current.set("Error")
+            self.total.clear()
         finally:
+            elapsed = time.perf_counter() - start
+            self.history.record(full_expression, self.current.text, elapsed)
+            if self.profiler is not None:
+                self.profiler.record("evaluate", elapsed)
+            self.session.record(EVENT_EVALUATE, self.current.text)
             self.update_label()
             self.update_total_label()
 
+    def show_history(self):
+        """Open the history browser (or bring it to the front)."""
+        if self.history_window is not None and self.history_window.exists():
+            self.history_window.lift()
+            return
+        # The browser's module is only loaded the first time it is opened
+        from calc_history_view import HistoryWindow
+        self.history_window = HistoryWindow(self.master, self.history, self.use_history,
+                                            bg=DEEP_DARK, fg=WHITE_TEXT)
+
+    def toggle_plot(self):
+        """Switch the display between the expression and a graph of it in x."""
+        if self.plot_view is not None and self.plot_view.visible:
+            self.plot_view.hide()
+            return
+        expression = self._full_expression()
+        if not expression:
+            return
+        expression += ")" * (self.total.depth + self.current.depth)
+        if self.table_view is not None and self.table_view.visible:
+            self.table_view.hide()
+        if self.plot_view is None:
+            # The plotting module (and NumPy) are only loaded the first time
+            from calc_plot import PlotView
+            self.plot_view = PlotView(self.display_frame, self.engine,
+                                      replaces=(self.total_label, self.label, self.preview_label),
+                                      bg=DEEP_DARK, fg=LIGHT_TEXT, line=ACCENT_GREEN)
+        self.plot_view.show(expression)
+
+    def toggle_table(self):
+        """Switch the display between the expression and a table of its values in x."""
+        if self.table_view is not None and self.table_view.visible:
+            self.table_view.hide()
+            return
+        expression = self._full_expression()
+        if not expression:
+            return
+        expression += ")" * (self.total.depth + self.current.depth)
+        if self.plot_view is not None and self.plot_view.visible:
+            self.plot_view.hide()
+        if self.table_view is None:
+            # The table module is only loaded the first time
+            from calc_table import TableView
+            self.table_view = TableView(self.display_frame, self.engine,
+                                        replaces=(self.total_label, self.label, self.preview_label),
+                                        bg=DEEP_DARK, fg=LIGHT_TEXT, accent=WHITE_TEXT)
+        self.table_view.show(expression)
+
+    def toggle_stats(self):
+        """Switch statistics mode on or off.
+
+        In statistics mode '=' (or ',') adds the entry to the data series and,
+        with nothing typed, steps through the statistics. Pasted numbers and
+        files ('o') are added in bulk, in one streaming pass.
+        """
+        self.session.record(EVENT_TOGGLE_STATS)
+        if self.stats_mode is not None:
+            self.stats_mode.close()
+            self.stats_mode = None
+        else:
+            # The statistics module is only loaded the first time it is used
+            from calc_stats import StatsMode
+            self.stats_mode = StatsMode(self.master, self._show_stats)
+        self.current.clear()
+        self.total.clear()
+        self.preview.clear()
+        self._show_stats()
+
+    def add_data_point(self):
+        """Statistics mode: add the entry to the data, or show the next statistic."""
+        if self.stats_mode is None:
+            return
+        self.session.record(EVENT_ADD_DATA)
+        if not self.current:
+            self.stats_mode.next_field()
+            return
+        try:
+            self.stats_mode.add(self.engine.evaluate(prepare_expression(self.current.text)))
+            self.current.clear()
+        except BudgetExceeded:
+            self.current.set(BUDGET_ERROR_TEXT)
+        except Exception:
+            self.current.set("Error")
+        self.update_label()
+
+    def add_comma(self):
+        """',' separates vector items; in statistics mode it adds the entry instead."""
+        if self.stats_mode is not None:
+            self.add_data_point()
+        else:
+            self.add_to_expression(",")
+
+    def paste_data(self):
+        """Statistics mode: add every number on the clipboard."""
+        if self.stats_mode is None:
+            return
+        try:
+            text = self.master.clipboard_get()
+        except tk.TclError:  # empty clipboard
+            return
+        self.add_data_text(text)
+
+    def add_data_text(self, text):
+        """Statistics mode: add every number in 'text'."""
+        if self.stats_mode is None:
+            return
+        self.session.record(EVENT_ADD_DATA_TEXT, text)
+        self.stats_mode.add_text(text)
+
+    def open_data_file(self):
+        """Statistics mode: pick a CSV or raw float64 file and add its values."""
+        if self.stats_mode is None:
+            return
+        from tkinter import filedialog
+        path = filedialog.askopenfilename(
+            parent=self.master, title="Load data",
+            filetypes=[("CSV or text", "*.csv *.txt"), ("Raw float64", "*.bin *.f64 *.dat *.raw"),
+                       ("All files", "*")])
+        if path:
+            self.stats_mode.load(path)
+
+    def _show_stats(self):
+        self.update_total_label()
+        self.update_label()
+
+    def toggle_profile(self):
+        """Show or hide the timing overlay; hot paths are only timed while it is shown."""
+        # The profiler's classes are only loaded the first time it is shown
+        from calc_profile import Profiler, ProfileOverlay
+        if self.profile_overlay is None:
+            self.profile_overlay = ProfileOverlay(self.master, self.display_frame,
+                                                  bg=DARK_MID, fg=WHITE_TEXT)
+        if self.profile_overlay.visible:
+            self.profile_overlay.hide()
+            if self.profiler.path is None:
+                # Not reporting at exit: stop timing as well
+                self.profiler = None
+                attach(None, self.master, self.engine, self.renderer)
+            return
+        if self.profiler is None:
+            self.profiler = Profiler("v2")
+            attach(self.profiler, self.master, self.engine, self.renderer)
+        self.profile_overlay.show(self.profiler)
+
+    def show_symbols(self):
+        """Open the variables and functions window (or bring it to the front)."""
+        if self.symbols_window is not None and self.symbols_window.exists():
+            self.symbols_window.lift()
+            return
+        from calc_symbols_view import SymbolsWindow
+        self.symbols_window = SymbolsWindow(self.master, self.engine.symbols, self.use_symbol,
+                                            self._symbols_changed, bg=DEEP_DARK, fg=WHITE_TEXT)
+
+    def use_symbol(self, text):
+        """Add a name picked in the symbols window ('f(' for a function) to the entry."""
+        self.add_function(text)
+
+    def _symbols_changed(self):
+        self.symbol_store.save()
+        self.session.record(EVENT_SYMBOLS, symbols_text(self.engine.symbols))
+        self.preview.set_symbols(self.engine.symbols.definitions())
+
+    def copy_result(self):
+        """Copy the entry to the clipboard, writing out an abbreviated result in full."""
+        text = self.current.text
+        if isinstance(self.last_result, Abbreviated) and text == self.last_result:
+            text = self.last_result.full()
+        self.master.clipboard_clear()
+        self.master.clipboard_append(text)
+
+    def _remember_answer(self):
+        """Keep the result just shown as 'ans'."""
+        try:
+            self.engine.symbols.assign(ANSWER, self.last_result.value)
+        except Exception:
+            return
+        self.preview.set_symbols(self.engine.symbols.definitions())
+        if self.symbols_window is not None and self.symbols_window.exists():
+            self.symbols_window.refresh()
+
+    def use_history(self, expression):
+        """Put an expression picked from the history back into the entry."""
+        self.session.record(EVENT_SET_ENTRY, expression)
+        self.current.set(expression)
+        self.update_label()
+        self._update_preview()
+
     # --- Display Update Methods ---
 
+    def _update_preview(self):
+        """Schedule a live preview of the expression being typed."""
+        if self.total or self.current:
+            # The full string is only built once typing pauses
+            self.preview.schedule(self._full_expression)
+        else:
+            self.preview.clear()
+
     def update_total_label(self):
-        """Update the top display label (expression history)."""
-        self.total_label.config(text=self.total_expression)
+        """Update the top display label (expression history) on the next redraw."""
+        self.renderer.invalidate(self.total_label, self._total_label_text)
 
     def update_label(self):
-        """Update the main display label (current entry/result)."""
-        # Truncate for display if it's getting too long
-        display_text = self.current_expression
+        """Update the main display label (current entry/result) on the next redraw."""
+        self.renderer.invalidate(self.label, self._label_text)
+
+    def _total_label_text(self):
+        if self.stats_mode is not None:
+            return self.stats_mode.header()
+        return self.total.text
+
+    def _label_text(self):
+        if self.stats_mode is not None and not self.current:
+            display_text = self.stats_mode.value()[:21]
+        else:
+            # Truncate for display if it's getting too long
+            # Only the visible head is built, however long the entry is
+            display_text = self.current.head(21)
         if len(display_text) > 20 and len(display_text.splitlines()) < 2: 
              display_text = display_text[:20] + "..."
-             
-        self.label.config(text=display_text)
+        return display_text
 
 
 # --- Main Execution --- 
 if __name__ == "__main__":
+    startup = startup_timer(_STARTED, "v2")
+    startup.mark("imports")
     window = tk.Tk()
+    startup.mark("tk")
     calculator = ScientificCalculator(window)
+    startup.mark("widgets")
+    startup.watch_first_frame(window)
     window.mainloop()
\ No newline at end of file
@@ -0,0 +1,113 @@
+"""Behaviour tests for calc_backends through the engine."""
+import math
+from decimal import Decimal
+from fractions import Fraction
+
+import pytest
+
+from calc_backends import DecimalBackend, FloatBackend, FractionBackend, make_backend, plain_number
+from calc_engine import CalcEngine
+
+
+def engine(name, precision=50):
+    return CalcEngine(backend=make_backend(name, precision))
+
+
+def test_make_backend():
+    assert isinstance(make_backend(), FloatBackend)
+    assert make_backend("decimal", 30).precision == 30
+    assert isinstance(make_backend("fraction"), FractionBackend)
+    with pytest.raises(ValueError):
+        make_backend("binary")
+
+
+def test_literals():
+    assert FloatBackend().literal("12") == 12 and type(FloatBackend().literal("12")) is int
+    assert FloatBackend().literal("0.1") == 0.1
+    assert FloatBackend().literal("1e3") == 1000.0
+    assert DecimalBackend().literal("0.1") == Decimal("0.1")
+    assert FractionBackend().literal("0.1") == Fraction(1, 10)
+
+
+def test_plain_number():
+    assert plain_number(Decimal("5")) == 5 and type(plain_number(Decimal("5.0"))) is int
+    assert plain_number(Decimal("2.5")) == 2.5
+    assert plain_number(Fraction(6, 3)) == 2 and type(plain_number(Fraction(6, 3))) is int
+    assert plain_number(Fraction(1, 4)) == 0.25
+    assert math.isinf(plain_number(Decimal("Infinity")))
+    assert plain_number(7.5) == 7.5
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("0.1+0.2", "0.3"),
+    ("1/3", "0." + "3" * 50),
+    ("2**0.5", "1.4142135623730950488016887242096980785696718753769"),
+    ("sqrt(2)", "1.4142135623730950488016887242096980785696718753769"),
+    ("pi", "3.1415926535897932384626433832795028841971693993751"),
+    ("sin(0)+cos(0)", "1"),
+    ("+".join(["0.1"] * 1000), "100"),
+    ("1e40+1", "1" + "0" * 39 + "1"),
+])
+def test_decimal(expression, expected):
+    assert engine("decimal").calculate(expression) == expected
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("0.1+0.2", "3/10"),
+    ("1/3+1/6", "1/2"),
+    ("(2/3)**3", "8/27"),
+    ("sqrt(9/4)", "3/2"),
+    ("+".join([f"1/{n}" for n in range(1, 11)]), "7381/2520"),
+    ("*".join([f"{n}/{n + 1}" for n in range(1, 100)]), "1/100"),
+    ("2**-3", "1/8"),
+])
+def test_fraction(expression, expected):
+    assert engine("fraction").calculate(expression) == expected
+
+
+@pytest.mark.parametrize("name", ["decimal", "fraction"])
+@pytest.mark.parametrize("expression, expected", [
+    ("math.factorial(5)", 120),
+    ("math.comb(5, 2)", 10),
+    ("math.gcd(12, 18)", 6),
+    ("math.isqrt(17)", 4),
+    ("math.floor(2.5)", 2),
+    ("math.pi+1", math.pi + 1),
+    ("math.cos(1)*2", math.cos(1) * 2),
+    ("math.e*2", math.e * 2),
+    ("det([[1, 2], [3, 4]])+1", -1.0),
+    ("dot([1, 2], [3, 4])/3", 11 / 3),
+    ("root(x**2-8, 0, 5)", math.sqrt(8)),
+    ("integrate(x, 0, 1)", 0.5),
+    ("diff(x**2, 3)", 6.0),
+])
+def test_float_functions_mix_with_exact_numbers(name, expression, expected):
+    value = engine(name).calculate(expression).value
+    assert float(value) == pytest.approx(expected, rel=1e-9)
+
+
+def test_fraction_keeps_approximations_as_floats():
+    # A solver's result is only approximate; it is not shown as an exact fraction
+    result = engine("fraction").calculate("root(x**2-8, 0, 5)")
+    assert isinstance(result.value, float)
+    assert result == "2.8284271247"
+
+
+def test_decimal_reads_floats_by_repr():
+    assert engine("decimal").calculate("math.atan(1)*1").value == Decimal(repr(math.atan(1)))
+    # The backend's own versions are used where it has them
+    assert engine("decimal").calculate("math.sqrt(2)") == engine("decimal").calculate("sqrt(2)")
+
+
+def test_backends_agree_on_simple_arithmetic():
+    expressions = ["1+2*3", "2**10", "7//2", "7%3", "(1+2)*(3-4)", "10/4", "-3**2"]
+    for expression in expressions:
+        results = {name: float(engine(name).calculate(expression).value)
+                   for name in ("float", "decimal", "fraction")}
+        assert len(set(results.values())) == 1, (expression, results)
+
+
+def test_division_by_zero_fails_in_every_backend():
+    for name in ("float", "decimal", "fraction"):
+        with pytest.raises(ArithmeticError):
+            engine(name).calculate("1/0")
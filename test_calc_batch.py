@@ -0,0 +1,48 @@
+"""Behaviour tests for calc_batch: results line up with the input."""
+import io
+
+import pytest
+
+from calc_batch import ParallelEvaluator, evaluate_chunk, init_worker, main, run_batch
+
+LINES = ["1+2\n", "\n", "  sqrt(16)\n", "1/0\n", "   \n", "9**9**9**9\n", "2*π"]
+EXPECTED = ["3", "", "4", "Error", "", "Too complex", "6.2831853072"]
+
+
+def test_results_line_up_with_the_input():
+    output = io.StringIO()
+    count, _ = run_batch(LINES, output)
+    assert count == len(LINES)
+    assert output.getvalue().split("\n")[:-1] == EXPECTED
+
+
+def test_echo():
+    output = io.StringIO()
+    run_batch(LINES[:3], output, echo=True)
+    assert output.getvalue() == "1+2\t3\n\nsqrt(16)\t4\n"
+
+
+def test_parallel_matches_serial():
+    lines = LINES * 50
+    with ParallelEvaluator(workers=2, chunk_size=7) as evaluator:
+        assert evaluator.evaluate(lines) == EXPECTED * 50
+
+
+def test_worker_functions_for_other_pools():
+    init_worker("fraction", 50)
+    assert evaluate_chunk(["1/3+1/6", "", "1/0"]) == ["1/2", "", "Error"]
+    init_worker("float", 50)
+    assert evaluate_chunk(["1/3+1/6"]) == ["0.5"]
+
+
+@pytest.mark.parametrize("options", [{"workers": -1}, {"chunk_size": 0}])
+def test_parallel_rejects_bad_sizes(options):
+    with pytest.raises(ValueError):
+        ParallelEvaluator(**options)
+
+
+@pytest.mark.parametrize("argv", [["--chunk-size", "0"], ["--workers", "-2"]])
+def test_command_line_rejects_bad_sizes(argv):
+    with pytest.raises(SystemExit) as exit_info:
+        main(argv)
+    assert exit_info.value.code == 2
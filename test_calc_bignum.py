@@ -0,0 +1,99 @@
+"""Behaviour tests for calc_bignum: the shortcuts must agree with str() at every size."""
+import random
+import sys
+from decimal import Context, Decimal
+from fractions import Fraction
+
+import pytest
+
+from calc_bignum import (EXACT_BITS, SIGNIFICANT_DIGITS, SUMMARY_WIDTH, Abbreviated,
+                         decimal_string, digit_count, full_text, is_huge, leading_digits,
+                         scientific)
+from calc_engine import CalcEngine
+
+_rng = random.Random(7)
+
+NUMBERS = [
+    0, 1, 9, 10, 12345,
+    # Either side of the abbreviation threshold
+    2 ** (EXACT_BITS - 1), 2 ** EXACT_BITS - 1, 2 ** EXACT_BITS, 2 ** EXACT_BITS + 1,
+    # Powers of ten and their neighbours, where the approximation can't decide
+    # (10**903 has 3000 bits, 10**904 is abbreviated)
+    10 ** 903, 10 ** 904 - 1, 10 ** 904, 10 ** 904 + 1,
+    10 ** 5000 - 1, 10 ** 5000, 10 ** 5000 + 1, 10 ** 40000, 10 ** 40000 - 1,
+    # Leading digits followed by a long run of 9s or 0s
+    10 ** 5000 - 10 ** 4980, 12345678909999999999 * 10 ** 5000 + 1,
+    1234567890 * 10 ** 6000 - 1, 9999999999 * 10 ** 7000,
+    2 ** 200000, 3 ** 60000,
+    _rng.getrandbits(50000), _rng.getrandbits(EXACT_BITS + 1),
+]
+
+
+@pytest.fixture(autouse=True)
+def any_int_size():
+    # str() is the reference, so it must accept ints of any size
+    limit = sys.get_int_max_str_digits()
+    sys.set_int_max_str_digits(0)
+    yield
+    sys.set_int_max_str_digits(limit)
+
+
+def expected_scientific(value, width=SUMMARY_WIDTH):
+    """scientific() computed from every digit, with Decimal's rounding."""
+    if isinstance(value, Fraction):
+        exact = Context(prec=60).divide(Decimal(value.numerator), Decimal(value.denominator))
+    else:
+        exact = Decimal(value)
+    sign = "-" if value < 0 else ""
+    exponent_text = f"e{exact.adjusted():+d}"
+    digits = max(1, min(SIGNIFICANT_DIGITS, width - len(sign) - len(exponent_text) - 1))
+    rounded = Context(prec=digits).plus(abs(exact))
+    mantissa = format(rounded.scaleb(-rounded.adjusted()), "f")
+    if "." in mantissa:
+        mantissa = mantissa.rstrip("0").rstrip(".")
+    return f"{sign}{mantissa}e{rounded.adjusted():+d}"
+
+
+@pytest.mark.parametrize("n", NUMBERS, ids=lambda n: f"{n.bit_length()}bits")
+def test_digits_match_str(n):
+    text = str(n)
+    assert digit_count(n) == digit_count(-n) == len(text)
+    for count in (1, SIGNIFICANT_DIGITS, 25):
+        assert leading_digits(n, count) == leading_digits(-n, count) == text[:count]
+    assert decimal_string(n) == text
+    assert decimal_string(-n) == str(-n)
+
+
+@pytest.mark.parametrize("n", [n for n in NUMBERS if n], ids=lambda n: f"{n.bit_length()}bits")
+def test_scientific_matches_the_exact_digits(n):
+    for value in (n, -n):
+        assert scientific(value) == expected_scientific(value)
+    assert scientific(n, width=12) == expected_scientific(n, width=12)
+
+
+def test_scientific_of_fractions():
+    for value in (Fraction(10 ** 5000, 3), Fraction(-1, 7 ** 4000),
+                  Fraction(2 ** 9000 + 1, 2 ** 9000)):
+        assert scientific(value) == expected_scientific(value)
+    assert scientific(0) == "0"
+
+
+def test_abbreviation_threshold():
+    assert not is_huge(2 ** EXACT_BITS - 1)
+    assert is_huge(2 ** EXACT_BITS) and is_huge(-(2 ** EXACT_BITS))
+    assert is_huge(Fraction(1, 2 ** EXACT_BITS))
+    assert not is_huge(float(2 ** 1000))
+    engine = CalcEngine()
+    assert engine.calculate(f"2**{EXACT_BITS - 1}") == str(2 ** (EXACT_BITS - 1))
+    shown = engine.calculate(f"2**{EXACT_BITS}")
+    assert isinstance(shown, Abbreviated)
+    assert shown == expected_scientific(2 ** EXACT_BITS)
+    assert shown.full() == str(2 ** EXACT_BITS)
+
+
+def test_full_text():
+    n = 3 ** 20000
+    assert Abbreviated(n).full() == full_text(n) == str(n)
+    assert full_text(Fraction(n, 2)) == f"{n}/2"
+    assert full_text(Fraction(n * 4, 2)) == str(n * 2)
+    assert len(Abbreviated(-n)) <= SUMMARY_WIDTH
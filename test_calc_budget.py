@@ -0,0 +1,115 @@
+"""Behaviour tests for calc_budget: pathological input fails fast instead of hanging."""
+import time
+
+import pytest
+
+from calc_backends import make_backend
+from calc_budget import BudgetExceeded, EvalBudget
+from calc_engine import CalcEngine
+
+OVER_BUDGET = [
+    "9**9**9**9",
+    "2**(2**40)",
+    "10**10**8",
+    "(10**100)**(10**6)",
+    "math.factorial(10**7)",
+    "math.comb(10**8, 5*10**7)",
+    "math.perm(10**7)",
+    "*".join(["(2**60000)"] * 100),
+    "2**4194304",
+    # Single C calls on big operands, refused from their estimated work
+    "math.lcm(2**4000000-1, 2**4000000-3)",
+    "math.gcd(2**4000000-1, 2**3000000-1)",
+    "math.isqrt(2**4194303)",
+    "(2**4000000)%(2**2000000+1)",
+    "(2**4000000)//(2**2000000+1)",
+]
+
+
+@pytest.mark.parametrize("expression", OVER_BUDGET)
+def test_huge_results_are_refused_quickly(expression):
+    engine = CalcEngine()
+    start = time.perf_counter()
+    with pytest.raises(BudgetExceeded):
+        engine.calculate(expression)
+    assert time.perf_counter() - start < 1.0
+
+
+def test_fraction_backend_is_guarded():
+    engine = CalcEngine(backend=make_backend("fraction"))
+    with pytest.raises(BudgetExceeded):
+        engine.calculate("9**9**9**9")
+    with pytest.raises(BudgetExceeded):
+        engine.calculate("(1/3)**(10**8)")
+    with pytest.raises(BudgetExceeded):
+        engine.calculate("math.factorial(10**7)")
+    start = time.perf_counter()
+    for expression in ("2**4000000/(2**3000000-1)", "1/(2**3000000-1)+1/(2**3000000+1)",
+                       "(1/(2**3000000-1))*(2**3000000+1)"):
+        with pytest.raises(BudgetExceeded):
+            engine.calculate(expression)
+    # Too large for an exact root: not a slow isqrt but a float overflow
+    with pytest.raises(OverflowError):
+        engine.calculate("sqrt(2**4000000)")
+    assert time.perf_counter() - start < 1.0
+
+
+def test_decimal_backend_fails_fast():
+    # Decimal results are bounded by the precision; too large ones overflow
+    engine = CalcEngine(backend=make_backend("decimal"))
+    start = time.perf_counter()
+    with pytest.raises(ArithmeticError):
+        engine.calculate("9**9**9**9")
+    with pytest.raises(BudgetExceeded):
+        engine.calculate("math.factorial(10**7)")
+    assert time.perf_counter() - start < 1.0
+
+
+def test_results_within_the_budget_are_exact():
+    engine = CalcEngine()
+    assert engine.calculate("2**64") == str(2 ** 64)
+    assert engine.calculate("math.factorial(20)") == "2432902008176640000"
+    assert engine.calculate("2**-1") == "0.5"
+    assert engine.calculate("math.gcd(2**1000-1, 2**600-1)") == str(2 ** 200 - 1)
+    assert engine.calculate("(10**50+7)%(10**20)") == "7"
+
+
+def test_depth_limit():
+    engine = CalcEngine(budget=EvalBudget(max_depth=50))
+    assert engine.calculate("(" * 20 + "1" + ")" * 20) == "1"
+    with pytest.raises(BudgetExceeded):
+        engine.calculate("sin(" * 60 + "1" + ")" * 60)
+
+
+def test_node_limit():
+    engine = CalcEngine(budget=EvalBudget(max_nodes=100))
+    with pytest.raises(BudgetExceeded):
+        engine.calculate("+".join(["sin(1)"] * 100))
+
+
+def test_length_limit():
+    engine = CalcEngine(budget=EvalBudget(max_length=100))
+    with pytest.raises(BudgetExceeded):
+        engine.calculate("1+" * 100 + "1")
+
+
+def test_bit_limit():
+    engine = CalcEngine(budget=EvalBudget(max_pow_bits=64))
+    assert engine.calculate("2**63") == str(2 ** 63)
+    with pytest.raises(BudgetExceeded):
+        engine.calculate("2**200")
+
+
+def test_time_limit():
+    engine = CalcEngine(budget=EvalBudget(time_limit=0.05, max_pow_bits=1 << 40))
+    start = time.perf_counter()
+    with pytest.raises(BudgetExceeded):
+        engine.calculate("math.factorial(200000)*math.factorial(200001)*math.factorial(200002)")
+    assert time.perf_counter() - start < 5.0
+
+
+def test_over_budget_results_are_not_cached_as_values():
+    engine = CalcEngine()
+    for _ in range(2):
+        with pytest.raises(BudgetExceeded):
+            engine.calculate("9**9**9**9")
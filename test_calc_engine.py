@@ -0,0 +1,222 @@
+"""Behaviour tests for calc_engine: compiled expressions must match eval()."""
+import math
+
+import pytest
+
+import calc_headless
+from calc_engine import (DEFAULT_NAMES, CalcEngine, ExpressionError, ResultCache,
+                         format_result, normalize_expression, prepare_expression)
+from calc_history import HISTORY_ENV
+from calc_profile import Profiler
+from calc_session import SESSION_ENV
+from calc_symbols import SYMBOLS_ENV
+
+# Evaluated by the engine and by the calculator's original eval() call
+EXPRESSIONS = [
+    "1+2*3",
+    "2**10",
+    "2**-1",
+    "7//2",
+    "-7%3",
+    "10/4",
+    "0.1+0.2",
+    "(1+2)*(3+4)",
+    "-(-3)",
+    "+5",
+    "sqrt(16)",
+    "log(1000)",
+    "π*2",
+    "sin(π/2)+cos(0)",
+    "tan(1)",
+    "math.factorial(10)",
+    "math.floor(2.7)+math.ceil(2.2)",
+    "e**2",
+    "1e300*1e10",
+    "2**0.5*2**0.5",
+    # Long chains, reduced by the backend in one call
+    "+".join(["0.1"] * 50),
+    "1-" + "-".join(["0.3"] * 20),
+    "*".join(["1.1"] * 30),
+    "1/" + "/".join(["3"] * 10),
+    # Repeated subexpressions and foldable calls
+    "sin(1)*sin(1)+sin(1)",
+    "(2+3)*(2+3)-(2+3)",
+    "sqrt(2)+sqrt(2)*sqrt(2)",
+    # Open parentheses are closed
+    "(1+2",
+    "sqrt(4+(5",
+]
+
+ERRORS = [
+    "1/0",
+    "2+",
+    "math.sqrt(-1)",
+    "__import__('os')",
+    "open('x')",
+    "(1).__class__",
+    "x",
+    "lambda: 1",
+    "[i for i in (1, 2)]",
+    "1 if 2 else 3",
+    "'text'",
+]
+
+
+def eval_result(expression):
+    """The result the original '=' button would show."""
+    return format_result(eval(prepare_expression(expression), {"__builtins__": {}}, DEFAULT_NAMES))
+
+
+@pytest.mark.parametrize("expression", EXPRESSIONS)
+def test_calculate_matches_eval(expression):
+    engine = CalcEngine()
+    expected = eval_result(expression)
+    assert engine.calculate(expression) == expected
+    # Served from the result cache the second time
+    assert engine.calculate(expression) == expected
+    assert engine.calculate(expression, use_cache=False) == expected
+
+
+@pytest.mark.parametrize("expression", ERRORS)
+def test_calculate_raises(expression):
+    engine = CalcEngine()
+    for _ in range(2):  # errors are cached too
+        with pytest.raises(Exception):
+            engine.calculate(expression)
+
+
+def test_disallowed_syntax_is_an_expression_error():
+    engine = CalcEngine()
+    for expression in ("__import__('os')", "(1).__class__", "lambda: 1", "'text'"):
+        with pytest.raises(ExpressionError):
+            engine.calculate(expression)
+
+
+def test_result_keeps_its_value():
+    engine = CalcEngine()
+    result = engine.calculate("1/3")
+    assert result == "0.3333333333"
+    assert result.value == 1 / 3
+    assert engine.calculate("1/3").value == 1 / 3
+
+
+# What both calculators show. v1 used to print str() of the raw result with
+# no rounding and without closing parentheses; it now shares v2's rules.
+SHOWN = [
+    ("1/3", "0.3333333333"),                 # rounded to 10 decimal places
+    ("0.1+0.2", "0.3"),
+    ("2.5*4", "10"),                         # integral floats lose the '.0'
+    ("123456789012345.678", "123456789012345.67"),
+    ("10.0**15", "1000000000000000.0"),      # from 1e15 on, floats are shown as is
+    ("1e16", "1e+16"),
+    ("2**60", "1152921504606846976"),        # ints are exact
+    ("math.inf", "inf"),                     # v1 used to show "Error"
+    ("sqrt(16", "4"),                        # open parentheses are closed
+    ("(1+2)*(3", "9"),
+]
+
+
+@pytest.mark.parametrize("variant", ["v1", "v2"])
+def test_calculators_show_results_alike(monkeypatch, variant):
+    monkeypatch.setenv(HISTORY_ENV, ":memory:")
+    monkeypatch.setenv(SYMBOLS_ENV, ":memory:")
+    monkeypatch.delenv(SESSION_ENV, raising=False)
+    calculator, _ = calc_headless.create_calculator(variant)
+    for expression, shown in SHOWN:
+        assert CalcEngine().calculate(expression) == shown
+        calculator.clear()
+        calculator.use_history(expression)
+        calculator.evaluate()
+        assert calculator.current.text == shown, expression
+
+
+def test_normalize_expression_keeps_tokens_apart():
+    assert normalize_expression(" 1 +  2 ") == "1+2"
+    assert normalize_expression("sin (1)") == "sin(1)"
+    assert normalize_expression("1 2") == "1 2"
+
+
+def test_result_cache_evicts_the_least_recently_used():
+    cache = ResultCache(capacity=3)
+    for key in "abc":
+        cache.put(key, key.upper())
+    assert cache.get("a") == (True, False, "A")  # 'a' is now the most recent
+    cache.put("d", "D")
+    assert len(cache) == 3
+    assert cache.get("b") == (False, False, None)
+    cache.put("e", "E")
+    assert [cache.get(key)[0] for key in "acde"] == [True, False, True, True]
+    assert cache.stats() == {"size": 3, "capacity": 3, "hits": 4, "misses": 2, "evictions": 2}
+
+
+def test_result_cache_updates_and_errors():
+    cache = ResultCache(capacity=2)
+    cache.put("a", "1")
+    cache.put("b", ZeroDivisionError(), is_error=True)
+    cache.put("a", "2")  # an update, not an eviction
+    assert cache.get("a") == (True, False, "2")
+    assert cache.get("b")[:2] == (True, True)
+    cache.discard_errors()
+    assert cache.get("b")[0] is False
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.stats()["hits"] == 2 and cache.stats()["evictions"] == 0
+
+
+def test_result_cache_of_size_zero_keeps_nothing():
+    cache = ResultCache(capacity=0)
+    cache.put("a", "1")
+    assert cache.get("a")[0] is False
+    assert cache.stats()["evictions"] == 0
+
+
+def test_engine_counts_cache_hits_and_misses():
+    engine = CalcEngine(result_cache_size=2)
+    for expression in ("1+1", "2+2", "1+1", "3+3", "2+2"):
+        engine.calculate(expression)
+    # 2+2 was evicted by 3+3, the least recently used by then
+    assert engine.result_cache.stats() == {"size": 2, "capacity": 2, "hits": 1, "misses": 4,
+                                           "evictions": 2}
+
+
+@pytest.mark.parametrize("profiled", [False, True])
+def test_uncached_calculate_skips_the_cache(profiled):
+    engine = CalcEngine()
+    if profiled:
+        engine.profiler = Profiler()
+    engine.calculate("1+1")
+    before = engine.result_cache.stats()
+    for _ in range(3):
+        assert engine.calculate("1+1", use_cache=False) == "2"
+        assert engine.calculate("5*5", use_cache=False) == "25"
+    # Neither looked up (no hits or misses) nor stored
+    assert engine.result_cache.stats() == before
+    assert engine.calculate("5*5") == "25"
+    assert engine.result_cache.stats()["misses"] == before["misses"] + 1
+
+
+def test_compile_reuses_compiled_expressions():
+    engine = CalcEngine()
+    first = engine.compile("x**2+1", ("x",))
+    assert engine.compile("x**2+1", ("x",)) is first
+    assert engine.call(first, 3) == 10
+
+
+def test_evaluate_array_matches_scalar():
+    engine = CalcEngine()
+    xs = [-2.0, -0.5, 0.0, 0.5, 3.0]
+    ys = engine.evaluate_array("x**3-2*x+sin(x)", xs)
+    assert list(ys) == pytest.approx([x ** 3 - 2 * x + math.sin(x) for x in xs])
+
+
+def test_evaluate_array_falls_back_for_scalar_functions():
+    engine = CalcEngine()
+    ys = engine.evaluate_array("math.factorial(x)+math.floor(x/2)", [3, 4, 2.5, -1])
+    assert list(ys[:2]) == [7.0, 26.0]
+    assert all(math.isnan(y) for y in ys[2:])
+
+
+def test_evaluate_array_undefined_points():
+    engine = CalcEngine()
+    ys = engine.evaluate_array("sqrt(x)", [-1.0, 4.0])
+    assert math.isnan(ys[0]) and ys[1] == 2.0
@@ -0,0 +1,85 @@
+"""Behaviour tests for calc_history: paging and search against a plain list."""
+import random
+
+import pytest
+
+from calc_history import HistoryStore
+
+
+def make_expressions(count, seed=0):
+    rng = random.Random(seed)
+    pieces = ["1", "2", "37", "+", "-", "*", "sin(", "sqrt(", "π", ")", "0.5"]
+    return ["".join(rng.choice(pieces) for _ in range(rng.randrange(1, 8))) for _ in range(count)]
+
+
+@pytest.fixture
+def store(tmp_path):
+    history = HistoryStore(str(tmp_path / "history.sqlite3"), batch_size=50)
+    yield history
+    history.close()
+
+
+def fill(store, expressions):
+    for index, expression in enumerate(expressions):
+        store.record(expression, str(index), 0.001, created=1000.0 + index)
+    store.flush()
+
+
+def test_record_and_page(store):
+    expressions = make_expressions(500)
+    fill(store, expressions)
+    assert store.dropped == 0
+    assert len(store) == 500
+    newest_first = expressions[::-1]
+    for offset, limit in ((0, 10), (5, 20), (490, 20), (499, 1), (600, 5)):
+        page = store.page(offset, limit)
+        assert [entry.expression for entry in page] == newest_first[offset:offset + limit]
+    latest = store.latest()[0]
+    assert (latest.expression, latest.result, latest.created) == (expressions[-1], "499", 1499.0)
+
+
+@pytest.mark.parametrize("text", ["sin(", "sqrt(2", "+", "37", "π)", "0.5*", "nothing"])
+def test_search_matches_a_scan(store, text):
+    expressions = make_expressions(800, seed=1)
+    fill(store, expressions)
+    newest_first = expressions[::-1]
+    found = [entry.expression for entry in store.search(text, limit=50)]
+    assert found == [expression for expression in newest_first if text in expression][:50]
+    found = [entry.expression for entry in store.search(text, prefix=True, limit=50)]
+    assert found == [expression for expression in newest_first if expression.startswith(text)][:50]
+
+
+def test_search_without_trigram_index(store):
+    expressions = make_expressions(300, seed=2)
+    fill(store, expressions)
+    with_index = store.search("sqrt(", limit=1000)
+    store.trigram = False
+    assert store.search("sqrt(", limit=1000) == with_index
+
+
+def test_empty_search_is_latest(store):
+    fill(store, make_expressions(30))
+    assert store.search("", limit=5) == store.latest(5)
+
+
+def test_clear(store):
+    fill(store, make_expressions(100))
+    store.clear()
+    assert len(store) == 0
+    assert store.page(0, 10) == []
+    assert store.search("sin(") == []
+    fill(store, ["1+1", "sin(1)"])
+    assert [entry.expression for entry in store.search("sin")] == ["sin(1)"]
+
+
+def test_history_persists(tmp_path):
+    path = str(tmp_path / "history.sqlite3")
+    first = HistoryStore(path)
+    fill(first, ["1+2", "3*4"])
+    first.close()
+    second = HistoryStore(path)
+    try:
+        assert [entry.expression for entry in second.latest(5)] == ["3*4", "1+2"]
+        assert [entry.expression for entry in second.search("3*")] == ["3*4"]
+    finally:
+        second.close()
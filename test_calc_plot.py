@@ -0,0 +1,104 @@
+"""Behaviour tests for calc_plot: tile refinement and tile reuse, without a display."""
+import math
+
+import pytest
+
+import calc_plot
+from calc_engine import CalcEngine
+from calc_headless import VirtualMaster, virtual_tk
+from calc_plot import REFINE_PASSES, SAMPLES_PER_TILE, CurveSampler, PlotView
+
+# Plotting needs NumPy
+np = pytest.importorskip("numpy")
+
+
+@pytest.fixture
+def engine():
+    return CalcEngine()
+
+
+def spacing(sampler, level, index):
+    """The tile's samples and the x step between neighbours."""
+    xs, ys = sampler.tile(level, index)
+    steps = np.diff(xs)
+    assert (steps > 0).all()
+    return xs, ys, steps
+
+
+@pytest.mark.parametrize("expression, level, index, edge", [
+    ("tan(x)", 1, 0, math.pi / 2),  # asymptote inside 0..2
+    ("1/(x-0.3)", 0, 0, 0.3),  # pole inside 0..1
+    ("sqrt(x-0.3)", 0, 0, 0.3),  # end of the domain inside 0..1
+])
+def test_tiles_are_refined_at_discontinuities(engine, expression, level, index, edge):
+    xs, _, steps = spacing(CurveSampler(engine, expression), level, index)
+    uniform = 2.0 ** level / SAMPLES_PER_TILE
+    assert xs[0] == index * 2.0 ** level and xs[-1] == (index + 1) * 2.0 ** level
+    # Bisected every pass next to the edge...
+    finest = steps == uniform / 2 ** REFINE_PASSES
+    assert finest.any()
+    assert np.abs(xs[:-1][finest] - edge).max() < 0.05
+    # ...and left on the uniform grid well away from it
+    far = np.abs(xs[:-1] - edge) > 0.25
+    assert (steps[far] == uniform).all()
+
+
+def test_smooth_tiles_are_not_refined(engine):
+    _, _, steps = spacing(CurveSampler(engine, "sin(x)*x"), 1, 3)
+    assert len(steps) == SAMPLES_PER_TILE
+    assert (steps == steps[0]).all()
+
+
+def test_panning_samples_only_new_tiles(engine):
+    sampler = CurveSampler(engine, "sin(x)")
+    sampler.samples(-10, 10)
+    # Tiles 2 wide, -10..10 touches eleven of them
+    assert sampler.sampled == 11
+    sampler.samples(-7.5, 12.5)
+    assert sampler.sampled == 12
+    sampler.samples(-10, 10)
+    sampler.samples(-7.5, 12.5)
+    assert sampler.sampled == 12
+
+
+def test_zooming_back_reuses_the_earlier_level(engine):
+    sampler = CurveSampler(engine, "sin(x)")
+    sampler.samples(-10, 10)
+    sampler.samples(-1, 1)
+    sampled = sampler.sampled
+    sampler.samples(-10, 10)
+    assert sampler.sampled == sampled
+
+
+def test_cache_is_bounded(engine):
+    sampler = CurveSampler(engine, "x", cache_size=3)
+    for index in range(5):
+        sampler.tile(0, index)
+    sampler.tile(0, 4)
+    sampler.tile(0, 0)
+    # Tile 4 was still cached, tile 0 had been dropped
+    assert sampler.sampled == 6
+
+
+@pytest.fixture
+def view(engine, monkeypatch):
+    monkeypatch.setattr(calc_plot, "tk", virtual_tk)
+    master = VirtualMaster()
+    view = PlotView(master, engine, width=400, height=200)
+    view.show("sin(x)")
+    return view, master
+
+
+def test_dragging_redraws_once_and_reuses_tiles(view):
+    view, master = view
+    sampler = view.sampler
+    sampled = sampler.sampled
+    # A burst of motion events: 40 pixels at 400 wide is 2 along x, one tile
+    for _ in range(4):
+        view.pan(-10, 0)
+    assert master.run_pending() == 1
+    assert (view.x0, view.x1) == pytest.approx((-8.0, 12.0))
+    assert sampler.sampled == sampled + 1
+    view.pan(40, 0)
+    master.run_pending()
+    assert sampler.sampled == sampled + 1
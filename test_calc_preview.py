@@ -0,0 +1,118 @@
+"""Behaviour tests for calc_preview: debouncing, cancelling and stale results."""
+import threading
+import time
+from concurrent.futures import wait
+
+import pytest
+
+from calc_budget import EvaluationCancelled
+from calc_engine import DEFAULT_NAMES, CalcEngine
+from calc_headless import VirtualMaster
+from calc_preview import LivePreview
+
+# Twelve steps of about 0.2s each, every one checked by the guards first
+SLOW = "+".join(f"math.factorial({60000 + index})%7" for index in range(12))
+
+
+@pytest.fixture
+def master():
+    return VirtualMaster()
+
+
+@pytest.fixture
+def shown():
+    return []
+
+
+@pytest.fixture
+def preview(master, shown):
+    preview = LivePreview(master, DEFAULT_NAMES, shown.append)
+    yield preview
+    preview.cancel()
+    preview._executor.shutdown(wait=True)
+
+
+def run(master, preview):
+    """Run the Tk side until the preview has nothing left to do."""
+    while master.run_pending(limit=1):
+        if preview._future is not None:
+            wait([preview._future], timeout=10)
+
+
+def test_typing_is_debounced(master, preview, shown):
+    computed = []
+    compute = preview._compute
+
+    def counted(expression, cancelled):
+        computed.append(expression)
+        return compute(expression, cancelled)
+
+    preview._compute = counted
+    for text in ("1", "1+", "1+2", "1+2*", "1+2*3"):
+        preview.schedule(text)
+    run(master, preview)
+    assert computed == ["1+2*3"]
+    assert shown == ["7"]
+
+
+def test_the_text_is_built_only_when_the_delay_expires(master, preview, shown):
+    built = []
+    preview.schedule(lambda: built.append(1) or "2**10")
+    preview.schedule(lambda: built.append(2) or "2**11")
+    assert built == []
+    run(master, preview)
+    assert built == [2] and shown == ["2048"]
+
+
+def test_a_bare_number_and_an_error_show_nothing(master, preview, shown):
+    for text in ("5*2", "42", "1/0", "2+"):
+        preview.schedule(text)
+        run(master, preview)
+    assert shown == ["10", ""]
+
+
+def test_stale_results_are_not_shown(master, preview, shown):
+    preview.schedule("1+1")
+    master.run_pending(limit=1)  # the delay expires: the job starts
+    wait([preview._future], timeout=10)
+    # Finished but not yet delivered when the next keystroke arrives
+    preview.schedule("1+1+1")
+    run(master, preview)
+    assert shown == ["3"]
+
+
+def test_clear_blanks_the_preview(master, preview, shown):
+    preview.schedule("6*7")
+    run(master, preview)
+    preview.schedule("6*8")
+    preview.clear()
+    run(master, preview)
+    assert shown == ["42", ""]
+
+
+def test_cancel_stops_a_running_job(master, preview, shown):
+    preview.schedule(SLOW)
+    master.run_pending(limit=1)
+    future = preview._future
+    while not future.running():
+        time.sleep(0.001)
+    time.sleep(0.05)
+    start = time.perf_counter()
+    preview.schedule("2+2")
+    wait([future], timeout=10)
+    # Stopped at the next step rather than after all twelve
+    assert time.perf_counter() - start < 0.75
+    assert future.result() == ""
+    run(master, preview)
+    assert shown == ["4"]
+
+
+def test_guard_stops_cancelled_evaluations():
+    engine = CalcEngine()
+    cancelled = threading.Event()
+    cancelled.set()
+    with engine.guard.cancellable(cancelled):
+        with pytest.raises(EvaluationCancelled):
+            engine.calculate("math.factorial(10)", use_cache=False)
+    # Only inside the block, and the result isn't cached as an error
+    assert engine.calculate("math.factorial(10)") == "3628800"
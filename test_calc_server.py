@@ -0,0 +1,127 @@
+"""Behaviour tests for calc_server's line protocol."""
+import asyncio
+import json
+import socket
+
+import pytest
+
+from calc_batch import ERROR_TEXT, evaluate_line
+from calc_budget import BUDGET_ERROR_TEXT
+from calc_engine import CalcEngine
+from calc_server import CalcServer
+
+
+def serve(client, workers=0, unix_path=None, **options):
+    """Run 'client(server, reader, writer)' against a fresh server; returns what it returns."""
+    async def run():
+        server = CalcServer(workers, **options)
+        try:
+            if unix_path is not None:
+                await server.start_unix(unix_path)
+                reader, writer = await asyncio.open_unix_connection(unix_path)
+            else:
+                port = await server.start_tcp(0)
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            try:
+                return await client(server, reader, writer)
+            finally:
+                writer.close()
+        finally:
+            await server.close()
+    return asyncio.run(run())
+
+
+def ask(lines):
+    """A client sending 'lines' at once (pipelined) and reading one reply per request."""
+    async def client(server, reader, writer):
+        writer.write("".join(line + "\n" for line in lines).encode("utf-8"))
+        await writer.drain()
+        expected = sum(1 for line in lines if line.strip())
+        return [(await reader.readline()).decode("utf-8").rstrip("\n") for _ in range(expected)]
+    return client
+
+
+def test_plain_requests_match_the_engine():
+    expressions = ["1+2", "π*2", "sqrt(2)", "2**100", "1/0", "2+", "9**9**9**9", "log(1000"]
+    engine = CalcEngine()
+    replies = serve(ask(expressions))
+    assert replies == [evaluate_line(engine, expression) for expression in expressions]
+    assert replies[4:7] == [ERROR_TEXT, ERROR_TEXT, BUDGET_ERROR_TEXT]
+
+
+def test_json_requests():
+    lines = [json.dumps({"id": 1, "expr": "6*7"}),
+             json.dumps({"id": "b", "expr": "1/0"}),
+             json.dumps({"expr": "2**3"}),
+             '{"id": 4}',
+             '{"id": 5, "expr": 12}',
+             "{not json"]
+    replies = [json.loads(reply) for reply in serve(ask(lines))]
+    assert replies[0] == {"id": 1, "result": "42", "ok": True}
+    assert replies[1] == {"id": "b", "result": "Error", "ok": False}
+    assert replies[2] == {"id": None, "result": "8", "ok": True}
+    for reply in replies[3:]:
+        assert reply["ok"] is False and reply["id"] is None and "bad request" in reply["error"]
+
+
+def test_blank_lines_get_no_reply():
+    assert serve(ask(["1+1", "", "   ", "2+2"])) == ["2", "4"]
+
+
+def test_pipelined_replies_stay_in_order():
+    expressions = [f"{n}*{n}" for n in range(500)]
+    replies = serve(ask(expressions), max_pipeline=8)
+    assert replies == [str(n * n) for n in range(500)]
+
+
+def test_repeated_requests_are_cached():
+    async def client(server, reader, writer):
+        for _ in range(3):
+            writer.write(b"sin(1)+cos(1)\n")
+            await writer.drain()
+            await reader.readline()
+        return server.cache.stats()["hits"]
+    assert serve(client) == 2
+
+
+def test_worker_processes():
+    assert serve(ask(["1+2", "math.factorial(20)", "1/0"]), workers=1) == [
+        "3", "2432902008176640000", "Error"]
+
+
+def test_a_batch_is_spread_over_the_workers():
+    async def client(server, reader, writer):
+        sizes = []
+        loop = asyncio.get_running_loop()
+        original = loop.run_in_executor
+
+        def counted(executor, function, expressions):
+            sizes.append(len(expressions))
+            return original(executor, function, expressions)
+
+        loop.run_in_executor = counted
+        try:
+            replies = await ask([f"{n}+1" for n in range(10)])(server, reader, writer)
+        finally:
+            del loop.run_in_executor
+        return replies, sizes
+    replies, sizes = serve(client, workers=2)
+    assert replies == [str(n + 1) for n in range(10)]
+    assert sorted(sizes) == [5, 5]
+
+
+def test_unix_socket(tmp_path):
+    path = str(tmp_path / "calc.sock")
+    # A stale socket from an earlier run is replaced
+    stale = socket.socket(socket.AF_UNIX)
+    stale.bind(path)
+    stale.close()
+    assert serve(ask(["3*3"]), unix_path=path) == ["9"]
+
+
+def test_unix_socket_never_replaces_a_file(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("keep me")
+    with pytest.raises(FileExistsError):
+        serve(ask(["1"]), unix_path=str(path))
+    assert path.read_text() == "keep me"
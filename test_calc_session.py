@@ -0,0 +1,151 @@
+"""Behaviour tests for calc_session: recording a headless session and replaying it."""
+import json
+
+import pytest
+
+import calc_headless
+from calc_history import HISTORY_ENV
+from calc_session import (EVENT_ADD, EVENT_EVALUATE, EVENT_OPERATOR, SESSION_ENV, Session,
+                          SessionFormatError, SessionRecorder, replay)
+from calc_symbols import SYMBOLS_ENV
+
+
+@pytest.fixture(autouse=True)
+def private_state(monkeypatch):
+    # Keep history and definitions of the calculators built here in memory
+    monkeypatch.setenv(HISTORY_ENV, ":memory:")
+    monkeypatch.setenv(SYMBOLS_ENV, ":memory:")
+    monkeypatch.delenv(SESSION_ENV, raising=False)
+
+
+def type_keys(calculator, keys):
+    for key in keys:
+        if key == "=":
+            calculator.evaluate()
+        elif key == "S":
+            calculator.toggle_stats()
+        elif key == ",":
+            calculator.add_comma()
+        elif key == "<":
+            calculator.backspace()
+        elif key == "C":
+            calculator.clear()
+        elif key in "+-*/":
+            calculator.add_operator(key)
+        else:
+            calculator.add_to_expression(key)
+
+
+def record(monkeypatch, path, variant, keys, pasted=None):
+    """Record a calculator session typing 'keys' (and pasting 'pasted' in statistics mode)."""
+    monkeypatch.setenv(SESSION_ENV, str(path))
+    calculator, _ = calc_headless.create_calculator(variant)
+    monkeypatch.delenv(SESSION_ENV)
+    type_keys(calculator, keys)
+    if pasted is not None:
+        calculator.add_data_text(pasted)
+    calculator.session.close()
+    calculator.history.close()
+    return calculator
+
+
+def test_recorder_round_trip(tmp_path):
+    path = tmp_path / "session.pcs"
+    with SessionRecorder(str(path), "v1") as recorder:
+        recorder.record(EVENT_ADD, "12")
+        recorder.record(EVENT_OPERATOR, "+")
+        recorder.record(EVENT_ADD, "12")
+        recorder.record(EVENT_EVALUATE, "24")
+    with Session(str(path)) as session:
+        assert session.variant == "v1"
+        assert session.count == 4
+        events = [(event, session.strings[index]) for event, index in session.events()]
+    assert events == [(EVENT_ADD, "12"), (EVENT_OPERATOR, "+"), (EVENT_ADD, "12"),
+                      (EVENT_EVALUATE, "24")]
+    # Repeated text is stored once
+    assert path.read_bytes().count(b"12") == 1
+
+
+@pytest.mark.parametrize("variant", ["v1", "v2"])
+def test_replay_reproduces_results(monkeypatch, tmp_path, variant):
+    path = tmp_path / "session.pcs"
+    record(monkeypatch, path, variant, "12+3=C7*6=C(2+3)*4<5=C1/0=")
+    result = replay(str(path), variant)
+    assert result.ok
+    assert result.evaluations == 4
+    assert result.errors == 0
+
+
+@pytest.mark.parametrize("variant", ["v1", "v2"])
+def test_replay_covers_statistics_mode(monkeypatch, tmp_path, variant):
+    path = tmp_path / "session.pcs"
+    record(monkeypatch, path, variant, "12+3=S5=7=,", pasted="1 2 3")
+    result = replay(str(path), variant)
+    assert result.ok, result.mismatches
+    assert result.errors == 0
+    # Leaving statistics mode and evaluating again must also replay
+    path = tmp_path / "again.pcs"
+    record(monkeypatch, path, variant, "S5=7=S2*4=")
+    result = replay(str(path), variant)
+    assert result.ok, result.mismatches
+    assert result.evaluations == 1
+
+
+@pytest.mark.parametrize("variant", ["v1", "v2"])
+def test_replay_uses_the_recorded_definitions(monkeypatch, tmp_path, variant):
+    saved = tmp_path / "symbols.json"
+    saved.write_text(json.dumps([{"name": "r", "params": None, "source": "3"}]))
+    monkeypatch.setenv(SYMBOLS_ENV, str(saved))
+    path = tmp_path / "session.pcs"
+    monkeypatch.setenv(SESSION_ENV, str(path))
+    calculator, _ = calc_headless.create_calculator(variant)
+    monkeypatch.delenv(SESSION_ENV)
+    type_keys(calculator, "r*2=C")
+    # Defined in the symbols window, which then reports the change
+    calculator.engine.symbols.define("f(x) = x*r+1")
+    calculator._symbols_changed()
+    type_keys(calculator, "f(2)=")
+    calculator.engine.symbols.remove("f")
+    calculator._symbols_changed()
+    type_keys(calculator, "Cf(2)=")
+    calculator.session.close()
+    calculator.history.close()
+    assert calculator.current.text == "Error"
+
+    # Replayed where nothing is saved, with the same results
+    monkeypatch.setenv(SYMBOLS_ENV, ":memory:")
+    result = replay(str(path), variant)
+    assert result.ok, result.mismatches
+    assert result.evaluations == 3
+
+
+def test_replay_reports_a_changed_result(tmp_path):
+    path = tmp_path / "session.pcs"
+    with SessionRecorder(str(path), "v2") as recorder:
+        recorder.record(EVENT_ADD, "2")
+        recorder.record(EVENT_OPERATOR, "+")
+        recorder.record(EVENT_ADD, "2")
+        recorder.record(EVENT_EVALUATE, "5")
+    result = replay(str(path))
+    assert not result.ok
+    assert result.mismatches == [(3, "5", "4")]
+
+
+def test_bad_files_are_rejected(tmp_path):
+    short = tmp_path / "short.pcs"
+    short.write_bytes(b"PCSN")
+    with pytest.raises(SessionFormatError):
+        Session(str(short))
+    other = tmp_path / "other.pcs"
+    other.write_bytes(b"x" * 64)
+    with pytest.raises(SessionFormatError):
+        Session(str(other))
+    unclosed = tmp_path / "unclosed.pcs"
+    recorder = SessionRecorder(str(unclosed))
+    recorder.record(EVENT_ADD, "1")
+    recorder._file.flush()
+    try:
+        with pytest.raises(SessionFormatError):
+            Session(str(unclosed))
+    finally:
+        recorder.close()
@@ -0,0 +1,71 @@
+"""Behaviour tests for calc_shared: what panes share and what stays with each pane."""
+from concurrent.futures import wait
+
+import pytest
+
+from calc_headless import VirtualMaster, load_calculator
+from calc_shared import SharedEngine
+
+
+@pytest.fixture
+def shared():
+    shared = SharedEngine(workers=2)
+    yield shared
+    shared.shutdown()
+
+
+def open_pane(shared, variant="v2"):
+    master = VirtualMaster()
+    return load_calculator(variant).ScientificCalculator(master, shared=shared), master
+
+
+def evaluate(pane, master, expression):
+    """Type 'expression', press '=' and wait for the worker; returns the display."""
+    pane.clear()
+    pane.use_history(expression)
+    pane.evaluate()
+    if pane._pending is not None:
+        wait([pane._pending], timeout=10)
+    master.run_pending()
+    return pane.current.text
+
+
+def test_panes_share_results_without_user_names(shared):
+    (first, first_master), (second, second_master) = open_pane(shared), open_pane(shared)
+    assert first.engine is not second.engine
+    assert first.engine.shared_cache is second.engine.shared_cache
+    results = first.engine.shared_cache.results
+
+    assert evaluate(first, first_master, "2**0.5") == "1.4142135624"
+    hits = results.stats()["hits"]
+    assert evaluate(second, second_master, "2**0.5") == "1.4142135624"
+    assert results.stats()["hits"] == hits + 1
+
+
+def test_only_panes_with_the_same_whitelist_share(shared):
+    v1, _ = open_pane(shared, "v1")
+    v2, _ = open_pane(shared, "v2")
+    assert v1.engine.shared_cache is v2.engine.shared_cache
+    other = shared.connect({"sqrt": abs})
+    assert other.shared_cache is not v1.engine.shared_cache
+
+
+def test_answers_stay_with_their_pane(shared):
+    (first, first_master), (second, second_master) = open_pane(shared), open_pane(shared)
+    assert evaluate(first, first_master, "6*7") == "42"
+    assert evaluate(second, second_master, "5") == "5"
+    assert evaluate(first, first_master, "ans+1") == "43"
+    assert evaluate(second, second_master, "ans+1") == "6"
+
+
+def test_definitions_stay_with_their_pane(shared):
+    (first, first_master), (second, second_master) = open_pane(shared), open_pane(shared)
+    first.engine.symbols.define("r = 3")
+    first.engine.symbols.define("f(x) = x*r")
+    second.engine.symbols.define("r = 10")
+    assert evaluate(first, first_master, "f(2)") == "6"
+    assert evaluate(second, second_master, "r*2") == "20"
+    assert evaluate(second, second_master, "f(2)") == "Error"
+    # A result using a user name is never shared, though the text matches
+    assert evaluate(first, first_master, "r*2") == "6"
+    assert "f" not in second.engine.symbols.definitions()
@@ -0,0 +1,87 @@
+"""Behaviour tests for calc_solve, called directly and through the engine."""
+import math
+
+import pytest
+
+from calc_engine import CalcEngine
+from calc_solve import diff, integrate, root
+
+
+@pytest.mark.parametrize("function, a, b, expected", [
+    (lambda x: x ** 2 - 2, 0, 2, math.sqrt(2)),
+    (lambda x: math.cos(x) - x, 0, 1, 0.7390851332151607),
+    (lambda x: x ** 3 - 2 * x - 5, 2, None, 2.0945514815423265),
+    (lambda x: math.exp(x) - 10, 0, None, math.log(10)),
+    (lambda x: x, -1, 1, 0.0),
+    (lambda x: math.tan(x) - 1, 0, 1, math.pi / 4),
+])
+def test_root(function, a, b, expected):
+    found = root(function, a, b)
+    assert found == pytest.approx(expected, rel=1e-12, abs=1e-15)
+
+
+def test_root_failures():
+    with pytest.raises(ValueError):
+        root(lambda x: x * x + 1, 0)
+    with pytest.raises((ValueError, ArithmeticError)):
+        root(lambda x: x * x + 1, -1, 1)
+
+
+@pytest.mark.parametrize("function, a, b, expected", [
+    (math.sin, 0, math.pi, 2.0),
+    (lambda x: x ** 2, 0, 3, 9.0),
+    (lambda x: 1 / (1 + x * x), -math.inf, math.inf, math.pi),
+    (lambda x: math.exp(-x), 0, math.inf, 1.0),
+    (lambda x: math.exp(x), -math.inf, 0, 1.0),
+    (lambda x: 1 / math.sqrt(x), 0, 1, 2.0),
+    (lambda x: math.sin(x) / x if x else 1.0, 0, 100, 1.5622254668890563),
+    (lambda x: x, 2, 1, -1.5),
+    (lambda x: x, 1, 1, 0.0),
+])
+def test_integrate(function, a, b, expected):
+    assert integrate(function, a, b) == pytest.approx(expected, rel=1e-8)
+
+
+def test_integrate_divergent():
+    with pytest.raises(ValueError):
+        integrate(lambda x: 1 / x, 0, 1)
+
+
+@pytest.mark.parametrize("function, x, expected", [
+    (lambda x: x ** 3, 2, 12.0),
+    (math.sin, 1, math.cos(1)),
+    (math.exp, 0, 1.0),
+    (lambda x: 5.0, 3, 0.0),
+    (lambda x: math.sqrt(x) * x, 4, 3.0),  # real-only: Ridders
+])
+def test_diff(function, x, expected):
+    assert diff(function, x) == pytest.approx(expected, rel=1e-7, abs=1e-9)
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("root(x**2-2, 0, 2)", math.sqrt(2)),
+    ("root(cos(x)-x, 0, 1)", 0.7390851332151607),
+    ("integrate(sin(x), 0, π)", 2.0),
+    ("integrate(1/(1+x**2), -math.inf, math.inf)", math.pi),
+    ("diff(x**3, 2)", 12.0),
+    ("diff(sin(x), 0)", 1.0),
+    ("root(x**2-a, 0, a)", math.sqrt(5)),
+    ("integrate(x*a, 0, 1)", 2.5),
+    ("integrate(diff(x**2, x), 0, 1)", 1.0),
+])
+def test_solvers_in_expressions(expression, expected):
+    engine = CalcEngine()
+    engine.symbols.assign("a", 5)
+    assert float(engine.calculate(expression).value) == pytest.approx(expected, rel=1e-9)
+
+
+def test_solvers_over_arrays():
+    engine = CalcEngine()
+    ys = engine.evaluate_array("diff(x**2, x)", [0.0, 1.0, 2.5])
+    assert list(ys) == pytest.approx([0.0, 2.0, 5.0])
+
+
+def test_user_function_in_a_solver():
+    engine = CalcEngine()
+    engine.symbols.define("f(t) = t**2 - 3")
+    assert float(engine.calculate("root(f(x), 0, 3)").value) == pytest.approx(math.sqrt(3))
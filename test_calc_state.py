@@ -0,0 +1,91 @@
+"""Behaviour tests for calc_state: ExpressionBuffer must match plain string editing."""
+import random
+
+import pytest
+
+from calc_state import (CLOSE, CONSTANT, DIGIT, EMPTY, NAME, OPEN, OPERATOR, POINT,
+                        ExpressionBuffer, char_kind)
+
+PIECES = ["1", "23", "4.5", ".", "+", "-", "*", "/", "(", ")", "sin(", "π", "e", "**2", "sqrt(", ""]
+
+
+def check(buffer, text):
+    """Every query of 'buffer' against the same query on the string 'text'."""
+    assert buffer.text == text
+    assert str(buffer) == text
+    assert len(buffer) == len(text)
+    assert bool(buffer) == bool(text)
+    assert buffer.depth == text.count("(") - text.count(")")
+    assert buffer.last_char == text[-1:]
+    assert buffer.first_char == text[:1]
+    assert buffer.last_kind == char_kind(text[-1:])
+    for size in (0, 1, 3, 10, len(text) + 1):
+        assert buffer.head(size) == text[:size]
+    for size in (0, 1, 2, 5):
+        assert buffer.startswith(text[:size])
+        assert buffer.endswith(text[len(text) - size:] if size else "")
+    assert not buffer.endswith("@" + text)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_edits_match_string_logic(seed):
+    rng = random.Random(seed)
+    buffer, text = ExpressionBuffer(), ""
+    for _ in range(400):
+        action = rng.random()
+        if action < 0.45:
+            piece = rng.choice(PIECES)
+            buffer.append(piece)
+            text += piece
+        elif action < 0.65:
+            assert buffer.pop() == text[-1:]
+            text = text[:-1]
+        elif action < 0.72 and text:
+            piece = rng.choice(PIECES[4:8])
+            buffer.replace_last(piece)
+            text = text[:-1] + piece
+        elif action < 0.78:
+            piece = rng.choice(("-", "(", "sqrt("))
+            buffer.prepend(piece)
+            text = piece + text
+        elif action < 0.84:
+            size = rng.randrange(len(text) + 2)
+            buffer.remove_prefix(size)
+            text = text[size:]
+        elif action < 0.90:
+            other = ExpressionBuffer(rng.choice(PIECES) + rng.choice(PIECES))
+            buffer.extend(other)
+            text += other.text
+        elif action < 0.95:
+            # Interleave queries with edits, so the cached text and head are exercised
+            buffer.text
+            buffer.head(rng.randrange(8))
+        elif action < 0.98:
+            new = "".join(rng.choice(PIECES) for _ in range(rng.randrange(5)))
+            buffer.set(new)
+            text = new
+        else:
+            buffer.clear()
+            text = ""
+        check(buffer, text)
+
+
+def test_parentheses_depth_matches_counting():
+    buffer = ExpressionBuffer("sin((1+2)*(3")
+    assert buffer.depth == 2
+    buffer.append("))")
+    assert buffer.depth == 0
+    buffer.pop()
+    assert buffer.depth == 1
+
+
+def test_char_kinds():
+    assert [char_kind(char) for char in ("", "7", ".", "+", "(", ")", "π", "s")] == [
+        EMPTY, DIGIT, POINT, OPERATOR, OPEN, CLOSE, CONSTANT, NAME]
+
+
+def test_extend_keeps_the_other_buffer():
+    first, second = ExpressionBuffer("1+"), ExpressionBuffer("(2")
+    first.extend(second)
+    assert first.text == "1+(2" and first.depth == 1
+    assert second.text == "(2"
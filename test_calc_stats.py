@@ -0,0 +1,149 @@
+"""Behaviour tests for calc_stats: t-digest accuracy and the running aggregates."""
+import bisect
+import math
+import random
+import statistics
+from array import array
+
+import pytest
+
+from calc_stats import RunningStats, TDigest, read_binary, read_csv, read_text
+
+QUANTILES = (0.001, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 0.999)
+
+
+def samples(kind, count, seed=0):
+    rng = random.Random(seed)
+    if kind == "uniform":
+        return [rng.random() for _ in range(count)]
+    if kind == "normal":
+        return [rng.gauss(0, 1) for _ in range(count)]
+    if kind == "exponential":
+        return [rng.expovariate(1) for _ in range(count)]
+    # Heavy-tailed, with many repeated values
+    return [float(int(rng.paretovariate(1.2))) for _ in range(count)]
+
+
+def rank_error(ordered, estimate, p):
+    """How far (as a fraction of the data) 'estimate' is from quantile 'p'."""
+    low = bisect.bisect_left(ordered, estimate) / len(ordered)
+    high = bisect.bisect_right(ordered, estimate) / len(ordered)
+    return 0.0 if low <= p <= high else min(abs(low - p), abs(high - p))
+
+
+@pytest.mark.parametrize("kind", ["uniform", "normal", "exponential", "pareto"])
+def test_digest_quantiles_are_accurate(kind):
+    values = samples(kind, 100_000)
+    digest = TDigest()
+    for start in range(0, len(values), 3000):
+        digest.update(values[start:start + 3000])
+    ordered = sorted(values)
+    for p in QUANTILES:
+        # Tighter at the tails, as the scale function promises
+        allowed = 0.005 if 0.05 < p < 0.95 else 0.001
+        assert rank_error(ordered, digest.quantile(p), p) <= allowed, p
+    assert digest.quantile(0) == ordered[0]
+    assert digest.quantile(1) == ordered[-1]
+    # Bounded memory
+    assert len(digest) <= digest.compression
+
+
+def test_digest_is_exact_for_few_values():
+    values = list(range(51))
+    random.Random(1).shuffle(values)
+    digest = TDigest()
+    for value in values:
+        digest.add(float(value))
+    assert digest.quantile(0.5) == 25
+    assert digest.quantile(0) == 0 and digest.quantile(1) == 50
+
+
+def test_merged_digests_match_one_digest():
+    values = samples("normal", 50_000, seed=2)
+    whole, parts = TDigest(), [TDigest() for _ in range(4)]
+    whole.update(values)
+    for index, part in enumerate(parts):
+        part.update(values[index::4])
+    merged = TDigest()
+    for part in parts:
+        merged.merge(part)
+    assert merged.count == whole.count
+    ordered = sorted(values)
+    for p in QUANTILES:
+        assert rank_error(ordered, merged.quantile(p), p) <= 0.005
+
+
+def test_empty_digest():
+    assert math.isnan(TDigest().quantile(0.5))
+
+
+def check_against_statistics(stats, values):
+    assert stats.count == len(values)
+    assert stats.sum == math.fsum(values)
+    assert stats.mean == pytest.approx(statistics.fmean(values), rel=1e-12)
+    assert stats.variance == pytest.approx(statistics.variance(values), rel=1e-9)
+    assert stats.min == min(values) and stats.max == max(values)
+
+
+def test_running_stats_one_value_at_a_time():
+    values = samples("normal", 5000, seed=3)
+    stats = RunningStats()
+    for value in values:
+        stats.add(value)
+    check_against_statistics(stats, values)
+
+
+def test_running_stats_in_chunks_and_merged():
+    values = [1e8 + value for value in samples("uniform", 20_000, seed=4)]
+    chunked, merged = RunningStats(), RunningStats()
+    for start in range(0, len(values), 777):
+        chunked.update(values[start:start + 777])
+        part = RunningStats()
+        part.update(values[start:start + 777])
+        merged.merge(part)
+    check_against_statistics(chunked, values)
+    check_against_statistics(merged, values)
+
+
+def test_compensated_sum():
+    stats = RunningStats()
+    for _ in range(1000):
+        stats.update([0.1] * 1000)
+    assert stats.sum == math.fsum([0.1] * 1_000_000)
+
+
+def test_overflowing_values():
+    stats = RunningStats()
+    stats.update([1.7e308, 1.7e308, -1e308])
+    assert stats.sum == math.inf
+    assert stats.mean == pytest.approx(8e307)
+    # The true variance is past the float range too: inf, not nan
+    assert stats.variance == math.inf
+    stats.update([1e308])
+    assert stats.mean == pytest.approx(8.5e307)
+
+
+def test_summary_without_data():
+    summary = RunningStats().summary()
+    assert summary["count"] == 0
+    assert all(math.isnan(summary[key]) for key in ("mean", "min", "max", "median"))
+
+
+def test_readers(tmp_path):
+    stats = read_text("1, 2;3\n4 x nan inf 5", RunningStats())
+    assert (stats.count, stats.skipped, stats.sum) == (5, 3, 15.0)
+
+    path = tmp_path / "data.csv"
+    path.write_text("id,price\n1,2.5\n2,3.5\n3,oops\n")
+    stats = read_csv(str(path), RunningStats(), column="price")
+    assert (stats.count, stats.skipped, stats.mean) == (2, 1, 3.0)
+    stats = read_csv(str(path), RunningStats())
+    assert stats.count == 2
+
+    path = tmp_path / "data.f64"
+    path.write_bytes(array("d", [1.0, 2.0, math.nan, 6.0]).tobytes())
+    stats = read_binary(str(path), RunningStats())
+    assert (stats.count, stats.skipped, stats.mean) == (3, 1, 3.0)
+    path.write_bytes(b"\0" * 12)
+    with pytest.raises(ValueError):
+        read_binary(str(path), RunningStats())
@@ -0,0 +1,151 @@
+"""Behaviour tests for calc_symbols: dependencies, memoization and saved definitions."""
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from calc_engine import CalcEngine, ExpressionError
+from calc_symbols import SymbolStore, memoized
+
+
+@pytest.fixture
+def engine():
+    return CalcEngine()
+
+
+def test_redefining_a_variable_updates_its_users(engine):
+    symbols = engine.symbols
+    symbols.define("r = 2")
+    symbols.define("f(x) = x*r")
+    symbols.define("g(x) = f(x)+1")
+    assert engine.calculate("g(3)") == "7"
+    assert engine.calculate("sin(0)+1") == "1"
+    hits = engine.result_cache.stats()["hits"]
+
+    symbols.define("r = 5")
+    # Recompiled through f, not served from the cache
+    assert engine.calculate("g(3)") == "16"
+    assert engine.calculate("f(1)") == "5"
+    # A result that used none of them is still cached
+    assert engine.calculate("sin(0)+1") == "1"
+    assert engine.result_cache.stats()["hits"] == hits + 1
+
+
+def test_an_unknown_name_works_once_defined(engine):
+    with pytest.raises(ExpressionError):
+        engine.calculate("k*2")
+    engine.symbols.define("k = 4")
+    assert engine.calculate("k*2") == "8"
+
+
+def test_a_used_name_cannot_be_removed(engine):
+    engine.symbols.define("r = 2")
+    engine.symbols.define("f(x) = x*r")
+    with pytest.raises(ExpressionError):
+        engine.symbols.remove("r")
+    engine.symbols.remove("f")
+    engine.symbols.remove("r")
+    assert len(engine.symbols) == 0
+    with pytest.raises(ExpressionError):
+        engine.calculate("r")
+
+
+@pytest.mark.parametrize("definitions", [
+    ["f(x) = f(x-1)+1"],
+    ["f(x) = x", "g(x) = f(x)*2", "f(x) = g(x)"],
+    ["a(x) = x", "b(x) = a(x)", "c(x) = b(x)", "a(x) = c(x)+1"],
+])
+def test_functions_cannot_use_themselves(engine, definitions):
+    for text in definitions[:-1]:
+        engine.symbols.define(text)
+    before = engine.symbols.definitions()
+    with pytest.raises(ExpressionError):
+        engine.symbols.define(definitions[-1])
+    # The table is left as it was
+    assert engine.symbols.definitions() == before
+
+
+def test_memoized_user_function(engine):
+    engine.symbols.define("memo g(x, y) = x**y + 1")
+    function = engine.symbols.get("g").value
+    assert engine.calculate("g(2, 10)") == "1025"
+    assert engine.calculate("g(2, 10)+g(3, 2)", use_cache=False) == "1035"
+    assert len(function.cache) == 2
+    assert engine.symbols.get("g").text() == "memo g(x, y) = x**y + 1"
+    with pytest.raises(ExpressionError):
+        engine.symbols.define("memo r = 3")
+
+
+def test_memo_is_bounded_and_keeps_recent_calls():
+    calls = []
+    square = memoized(lambda x: calls.append(x) or x * x, size=2)
+    assert [square(1), square(2), square(1), square(3)] == [1, 4, 1, 9]
+    # 2 was the least recently used
+    assert list(square.cache) == [((int, 1),), ((int, 3),)]
+    square(2)
+    assert calls == [1, 2, 3, 2]
+
+
+def test_memo_lock_is_not_held_during_the_call():
+    # A recursive memoized function would deadlock if it were
+    @memoized
+    def fib(n):
+        return n if n < 2 else fib(n - 1) + fib(n - 2)
+
+    assert fib(200) == 280571172992510140037611932413038677189525
+
+
+def test_memo_from_several_threads():
+    calls = []
+    lock = threading.Lock()
+
+    def counted_square(x):
+        with lock:
+            calls.append(x)
+        return x * x
+
+    square = memoized(counted_square, size=64)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(square, [n % 50 for n in range(5000)]))
+    assert results == [(n % 50) ** 2 for n in range(5000)]
+    assert len(square.cache) == 50
+    # Each of the 8 threads may miss a value once at most
+    assert len(calls) <= 50 * 8
+
+
+def test_store_round_trip(tmp_path):
+    path = tmp_path / "symbols.json"
+    engine = CalcEngine()
+    store = SymbolStore(engine.symbols, str(path))
+    engine.symbols.define("r = 0.1+0.2")
+    engine.symbols.define("m = [[1, 2], [3, 4]]")
+    engine.symbols.define("memo f(x, y) = x*r + y")
+    engine.symbols.assign("big", 10 ** 5000)
+    store.save()
+    saved = json.loads(path.read_text(encoding="utf-8"))
+    # Too large to write out: kept for the session only
+    assert [definition["name"] for definition in saved] == ["r", "m", "f"]
+
+    restored = CalcEngine()
+    assert SymbolStore(restored.symbols, str(path)).load() == 3
+    assert restored.symbols.definitions() == engine.symbols.definitions()[:3]
+    assert restored.symbols.get("r").value == 0.1 + 0.2
+    assert restored.symbols.get("f").memoize
+    assert restored.calculate("f(10, 1)") == engine.calculate("f(10, 1)")
+    assert restored.calculate("m") == engine.calculate("m")
+
+
+def test_store_skips_bad_files_and_definitions(tmp_path):
+    path = tmp_path / "symbols.json"
+    engine = CalcEngine()
+    path.write_text("{not json")
+    assert SymbolStore(engine.symbols, str(path)).load() == 0
+    path.write_text(json.dumps([
+        {"name": "g", "params": ["x"], "source": "x*missing"},
+        {"name": "r", "params": None, "source": "3"},
+        {"name": "sin", "params": None, "source": "1"},
+    ]))
+    assert SymbolStore(engine.symbols, str(path)).load() == 1
+    assert [definition["name"] for definition in engine.symbols.definitions()] == ["r"]
+    assert SymbolStore(engine.symbols, ":memory:").load() == 0
@@ -0,0 +1,98 @@
+"""Behaviour tests for calc_table: rows, ranges and streaming export."""
+import csv
+import math
+import threading
+from array import array
+
+import pytest
+
+from calc_engine import CalcEngine
+from calc_stats import RunningStats, read_file
+from calc_table import CHUNK_ROWS, Table, TableError, export, parse_range
+
+
+@pytest.fixture
+def engine():
+    return CalcEngine()
+
+
+def test_parse_range(engine):
+    assert parse_range(engine, "0, 10, 0.5") == (0.0, 10.0, 0.5)
+    assert parse_range(engine, "-π; π: π/4") == (-math.pi, math.pi, math.pi / 4)
+    for text in ("1, 2", "1,,2", "a, 1, 2"):
+        with pytest.raises(TableError):
+            parse_range(engine, text)
+
+
+def test_rows_are_computed_from_the_index(engine):
+    table = Table(engine, "x**2", 0, 1, 0.1)
+    assert len(table) == 11  # stop is included although 10 * 0.1 rounds past it
+    rows = list(table.rows())
+    assert [x for x, _ in rows] == [index * 0.1 for index in range(11)]
+    assert [y for _, y in rows] == pytest.approx([(index * 0.1) ** 2 for index in range(11)])
+    assert table.page(3, 2) == rows[3:5]
+    assert Table(engine, "x", 10, 0, -2.5).page(0, 10) == [
+        (10.0, 10.0), (7.5, 7.5), (5.0, 5.0), (2.5, 2.5), (0.0, 0.0)]
+
+
+def test_bad_tables(engine):
+    for args in (("x", 0, 1, 0), ("x", 0, 1, -1), ("x", 0, math.inf, 1), ("x", 0, 1e12, 1e-3)):
+        with pytest.raises(TableError):
+            Table(engine, *args)
+    with pytest.raises(TableError):
+        Table(engine, "y+", 0, 1, 1)
+
+
+def test_csv_export(engine, tmp_path):
+    path = str(tmp_path / "table.csv")
+    table = Table(engine, "1/x", -2, 2, 0.5)
+    assert export(table, path) == len(table) == 9
+    with open(path, newline="") as handle:
+        rows = list(csv.reader(handle))
+    assert rows[0] == ["x", "1/x"]
+    xs = [float(x) for x, _ in rows[1:]]
+    ys = [float(y) for _, y in rows[1:]]
+    assert xs == [-2 + index * 0.5 for index in range(9)]
+    # Undefined points are nan, even where NumPy computes inf
+    assert math.isnan(ys[4])
+    assert [y for index, y in enumerate(ys) if index != 4] == [1 / x for x in xs if x]
+
+
+def test_binary_export_crosses_chunks(engine, tmp_path):
+    path = str(tmp_path / "table.f64")
+    table = Table(engine, "math.sin(x)+math.floor(x)", 0, CHUNK_ROWS * 1.5, 1)
+    progress = []
+    assert export(table, path, progress=progress.append) == len(table)
+    assert progress[-1] == len(table) and len(progress) == 2
+    values = array("d")
+    with open(path, "rb") as handle:
+        values.frombytes(handle.read())
+    assert len(values) == len(table)
+    for index in (0, 1, CHUNK_ROWS - 1, CHUNK_ROWS, len(table) - 1):
+        assert values[index] == pytest.approx(math.sin(index) + index)
+
+
+def test_exports_load_in_statistics_mode(engine, tmp_path):
+    table = Table(engine, "x/2", 1, 100, 1)
+    for name in ("table.csv", "table.f64"):
+        path = str(tmp_path / name)
+        export(table, path)
+        stats = read_file(path, RunningStats())
+        assert (stats.count, stats.mean) == (100, 25.25)
+
+
+def test_undefined_points_are_skipped_by_statistics(engine, tmp_path):
+    path = str(tmp_path / "table.f64")
+    export(Table(engine, "1/x", -1, 1, 1), path)
+    stats = read_file(path, RunningStats())
+    assert (stats.count, stats.skipped) == (2, 1)
+
+
+def test_cancelled_export_leaves_the_file(engine, tmp_path):
+    path = tmp_path / "table.csv"
+    path.write_text("earlier export\n")
+    cancelled = threading.Event()
+    cancelled.set()
+    assert export(Table(engine, "x", 0, 10, 1), str(path), cancelled) is None
+    assert path.read_text() == "earlier export\n"
+    assert not (tmp_path / "table.csv.part").exists()
@@ -0,0 +1,98 @@
+"""Behaviour tests for calc_ui: keypad layout and redraw scheduling."""
+from calc_headless import VirtualMaster, VirtualWidget, load_calculator
+from calc_ui import RenderScheduler, grid_rows
+
+
+def test_grid_rows_places_a_row_per_call():
+    master = VirtualMaster()
+    a, b, c, d = (VirtualWidget(master) for _ in range(4))
+    # Out of order, with a gap in row 0 and a span in row 1
+    grid_rows([(b, 0, 2, 1), (a, 0, 0, 1), (c, 1, 0, 2), (d, 1, 2, 1)], sticky="nsew", padx=1)
+    assert master.tk.calls == [
+        ("grid", "configure", str(a), "x", str(b), "-row", 0, "-sticky", "nsew", "-padx", 1),
+        ("grid", "configure", str(c), "-", str(d), "-row", 1, "-sticky", "nsew", "-padx", 1),
+    ]
+
+
+def test_calculators_grid_their_keypad_by_row():
+    for variant in ("v1", "v2"):
+        module = load_calculator(variant)
+        master = VirtualMaster()
+        calculator = module.ScientificCalculator(master)
+        calls = [call for call in master.tk.calls if call[:2] == ("grid", "configure")]
+        rows = {grid_info[0] for grid_info in calculator.buttons.values()}
+        assert len(calls) == len(rows)
+        placed = [name for call in calls for name in call[2:call.index("-row")]
+                  if name not in ("x", "-")]
+        assert len(placed) == len(calculator.buttons)
+
+
+def test_changes_in_one_frame_redraw_once():
+    master = VirtualMaster()
+    renderer = RenderScheduler(master)
+    label, other = VirtualWidget(master), VirtualWidget(master)
+    rendered = []
+
+    def text():
+        rendered.append(1)
+        return str(len(rendered))
+
+    for _ in range(5):
+        renderer.invalidate(label, text)
+    renderer.invalidate(other, lambda: "x")
+    assert renderer.pending and label.config_calls == 0
+    # One idle callback draws both, each once, with the text as it is by then
+    assert master.run_pending() == 1
+    assert not renderer.pending
+    assert len(rendered) == 1 and label.text == "1" and other.text == "x"
+    assert (label.config_calls, other.config_calls, renderer.redraws) == (1, 1, 2)
+
+
+def test_unchanged_text_is_not_configured():
+    master = VirtualMaster()
+    renderer = RenderScheduler(master)
+    label = VirtualWidget(master)
+    renderer.invalidate(label, lambda: "7")
+    master.run_pending()
+    renderer.invalidate(label, lambda: "7")
+    master.run_pending()
+    assert label.config_calls == 1 and renderer.skipped == 1
+
+
+def test_flush_draws_now_and_drops_the_idle_callback():
+    master = VirtualMaster()
+    renderer = RenderScheduler(master)
+    label = VirtualWidget(master)
+    renderer.invalidate(label, lambda: "3")
+    renderer.flush()
+    assert label.text == "3" and not renderer.pending
+    assert master.run_pending() == 0
+
+
+def test_pending_redraw_is_dropped_on_destroy():
+    master = VirtualMaster()
+    renderer = RenderScheduler(master)
+    label = VirtualWidget(master)
+    renderer.invalidate(label, lambda: "3")
+    # A child going away leaves the redraw in place
+    label.destroy()
+    VirtualWidget(master).destroy()
+    assert renderer.pending
+    master.destroy()
+    assert not renderer.pending
+    assert master.run_pending() == 0 and label.config_calls == 0
+    renderer.flush()
+    assert label.config_calls == 0
+
+
+def test_calculator_redraws_once_per_frame():
+    for variant in ("v1", "v2"):
+        master = VirtualMaster()
+        calculator = load_calculator(variant).ScientificCalculator(master)
+        master.run_pending()
+        configured = calculator.label.config_calls
+        for digit in "12345":
+            calculator.add_to_expression(digit)
+        master.run_pending()
+        assert calculator.label.config_calls == configured + 1
+        assert calculator.label.text.endswith("12345")